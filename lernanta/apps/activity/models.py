@@ -52,10 +52,8 @@ class ActivityManager(ManagerBase):
         """
         Given a user, return a list of activities to show on their dashboard.
         """
-        projects_following = user.following(model='Project')
-        users_following = user.following()
-        project_ids = [p.pk for p in projects_following]
-        user_ids = [u.pk for u in users_following]
+        project_ids = user.get_following_ids(model='Project')
+        user_ids = user.get_following_ids()
         from projects.models import Project
         return Activity.objects.filter(deleted=False).select_related(
             'actor', 'target_object', 'scope_object').filter(
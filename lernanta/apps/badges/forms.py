@@ -58,7 +58,7 @@ class PeerAssessmentForm(forms.ModelForm):
         except UserProfile.DoesNotExist:
             raise forms.ValidationError(
                 _('There is no user with username: %s.') % username)
-        if not self.badge.get_peers(self.profile).filter(id=user.id).exists():
+        if not self.badge.is_peer(self.profile, user):
             raise forms.ValidationError(
                 _('User %s needs to be your peer.') % username)
         if not self.badge.is_eligible(user):
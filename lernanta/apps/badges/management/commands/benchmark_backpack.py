@@ -0,0 +1,82 @@
+import time
+from optparse import make_option
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from badges.models import Award, Badge, Logic, build_backpack
+from badges.models import get_awarded_badges, BACKPACK_CACHE_KEY
+from users.models import create_profile
+
+
+def legacy_local_badges(profile):
+    """Local part of the backpack as built before the grouped query."""
+    badges = {}
+    badges_ids = Award.objects.filter(user=profile).values(
+        'badge_id').distinct()
+    for badge in Badge.objects.filter(id__in=badges_ids):
+        badges[badge.slug] = {
+            'name': badge.name,
+            'count': Award.objects.filter(user=profile,
+                badge=badge).count(),
+        }
+    return badges
+
+
+class Command(BaseCommand):
+    help = ('Compare queries and time needed to build the awarded badges '
+            'backpack for a user with many awards. Test data is created '
+            'in a transaction that is rolled back.')
+    option_list = BaseCommand.option_list + (
+        make_option('--awards', type='int', dest='awards', default=200,
+            help='Number of awards given to the test user.'),
+        make_option('--badges', type='int', dest='badges', default=50,
+            help='Number of distinct badges awarded.'),
+    )
+
+    def _measure(self, func, *args):
+        start_queries = len(connection.queries)
+        start = time.time()
+        func(*args)
+        elapsed = time.time() - start
+        return len(connection.queries) - start_queries, elapsed
+
+    @transaction.commit_manually
+    def handle(self, *args, **options):
+        debug = settings.DEBUG
+        settings.DEBUG = True
+        try:
+            profile = create_profile(User(username='backpack-benchmark',
+                email='backpack-benchmark@example.com'))
+            logic = Logic.objects.create(name='backpack-benchmark')
+            badges = []
+            for i in range(options['badges']):
+                badge = Badge(name='Backpack benchmark %s' % i,
+                    description='Benchmark badge', logic=logic)
+                badge.save()
+                badges.append(badge)
+            for i in range(options['awards']):
+                Award.objects.create(user=profile,
+                    badge=badges[i % len(badges)])
+            cache.delete(BACKPACK_CACHE_KEY % profile.id)
+
+            results = [
+                ('per badge counts', legacy_local_badges, profile),
+                ('grouped query', build_backpack, profile),
+                ('cold cache', get_awarded_badges, profile.user),
+                ('warm cache', get_awarded_badges, profile.user),
+            ]
+            self.stdout.write('%d awards of %d badges\n' % (
+                options['awards'], options['badges']))
+            for name, func, arg in results:
+                queries, elapsed = self._measure(func, arg)
+                self.stdout.write('%-18s %4d queries %8.2f ms\n' % (
+                    name, queries, elapsed * 1000))
+            # The test user is rolled back, do not leave it cached.
+            cache.delete(BACKPACK_CACHE_KEY % profile.id)
+        finally:
+            transaction.rollback()
+            settings.DEBUG = debug
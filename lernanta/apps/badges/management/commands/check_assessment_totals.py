@@ -0,0 +1,76 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from badges.models import Assessment, Rating, Submission
+
+# Float sums are compared with some tolerance.
+EPSILON = 1e-6
+
+
+class Command(BaseCommand):
+    help = ('Recompute the running rating totals of assessments and '
+            'submissions from scratch and report (or fix) mismatches.')
+
+    option_list = BaseCommand.option_list + (
+        make_option('--fix', action='store_true', dest='fix',
+            default=False, help='Store the recomputed totals.'),
+    )
+
+    def handle(self, *args, **options):
+        fix = options['fix']
+        mismatches = self.check_assessments(fix)
+        mismatches += self.check_submissions(fix)
+        if fix:
+            transaction.commit_unless_managed()
+        self.stdout.write('%d mismatch(es) found%s.\n' % (mismatches,
+            ', fixed' if fix and mismatches else ''))
+
+    def check_assessments(self, fix):
+        ratings = Rating.objects.values('assessment_id').annotate(
+            ratings_sum=Sum('score'), ratings_count=Count('id')).order_by()
+        totals = dict((rating['assessment_id'],
+            (rating['ratings_sum'], rating['ratings_count']))
+            for rating in ratings)
+        mismatches = 0
+        assessments = Assessment.objects.no_cache().values_list('id',
+            'ratings_sum', 'ratings_count')
+        for assessment_id, ratings_sum, ratings_count in assessments:
+            expected = totals.get(assessment_id, (0, 0))
+            if (ratings_sum, ratings_count) == expected:
+                continue
+            mismatches += 1
+            self.stdout.write('Assessment %d: %r, expected %r.\n' % (
+                assessment_id, (ratings_sum, ratings_count), expected))
+            if fix:
+                Assessment.objects.filter(id=assessment_id).update(
+                    ratings_sum=expected[0], ratings_count=expected[1])
+        return mismatches
+
+    def check_submissions(self, fix):
+        votes = Assessment.objects.filter(ready=True,
+            submission__isnull=False).values('submission_id').annotate(
+            votes_count=Count('id'), votes_rating_sum=Sum('final_rating'),
+            votes_weight_sum=Sum('weight')).order_by()
+        totals = dict((vote['submission_id'], (vote['votes_count'],
+            vote['votes_rating_sum'], vote['votes_weight_sum']))
+            for vote in votes)
+        mismatches = 0
+        submissions = Submission.objects.no_cache().values_list('id',
+            'votes_count', 'votes_rating_sum', 'votes_weight_sum')
+        for submission_id, count, rating_sum, weight_sum in submissions:
+            expected = totals.get(submission_id, (0, 0, 0))
+            if (count == expected[0]
+                    and abs(rating_sum - expected[1]) < EPSILON
+                    and abs(weight_sum - expected[2]) < EPSILON):
+                continue
+            mismatches += 1
+            self.stdout.write('Submission %d: %r, expected %r.\n' % (
+                submission_id, (count, rating_sum, weight_sum), expected))
+            if fix:
+                Submission.objects.filter(id=submission_id).update(
+                    votes_count=expected[0], votes_rating_sum=expected[1],
+                    votes_weight_sum=expected[2])
+        return mismatches
@@ -2,14 +2,16 @@ import datetime
 
 from django.db import models
 from django.conf import settings
-from django.db.models import Avg, Q
+from django.core.cache import cache
+from django.db.models import Count, F, Sum
 from django.utils.translation import ugettext_lazy as _
 from django.template.defaultfilters import slugify
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.contrib.sites.models import Site
 
 from drumbeat import storage
 from drumbeat.utils import get_partition_id, safe_filename, MultiQuerySet
+from drumbeat.utils import save_with_unique_slug
 from drumbeat.models import ModelBase
 from richtext.models import RichTextField
 from notifications.models import send_notifications_i18n
@@ -24,29 +26,82 @@ def determine_upload_path(instance, filename):
     }
 
 
-def get_awarded_badges(user):
+PREREQUISITES_CACHE_KEY = 'badges_prerequisites'
+AWARDED_BADGES_CACHE_KEY = 'badges_awarded_%s'
+BADGES_CACHE_TIMEOUT = 60 * 60 * 24
+BACKPACK_CACHE_KEY = 'badges_backpack_%s'
+BACKPACK_CACHE_TIMEOUT = 60 * 60
+BADGE_GROUPS_CACHE_KEY = 'badges_groups_%s'
+# Adopters are notified in chunks of this many profiles.
+ADOPTERS_CHUNK_SIZE = 500
+
+
+def build_backpack(profile):
+    """Return the badges awarded to ``profile`` keyed by slug.
+
+    Merges the legacy pilot badges with the local ones. Award counts
+    come from a single grouped query."""
     from pilot import get_awarded_badges as get_pilot_badges
-    badges = get_pilot_badges(user)
-    profile = user.get_profile()
-    badges_ids = Award.objects.filter(user=profile).values(
-        'badge_id').distinct()
-    for badge in Badge.objects.filter(id__in=badges_ids):
+    badges = get_pilot_badges(profile.username)
+    awards = Award.objects.filter(user=profile).values(
+        'badge_id').annotate(count=Count('id')).order_by()
+    counts = dict((award['badge_id'], award['count']) for award in awards)
+    for badge in Badge.objects.filter(id__in=counts.keys()):
         evidence = reverse('user_awards_show',
             kwargs= dict(slug=badge.slug, username=profile.username))
-        awards_count = Award.objects.filter(user=profile,
-             badge=badge).count()
         data = {
             'name': badge.name,
             'description': badge.description,
             'image': badge.get_image_url(),
             'evidence': evidence,
             'criteria': badge.get_absolute_url(),
-            'count': awards_count,
+            'count': counts[badge.id],
         }
         badges[badge.slug] = data
     return badges
 
 
+def get_awarded_badges(user):
+    profile = user.get_profile()
+    key = BACKPACK_CACHE_KEY % profile.id
+    badges = cache.get(key)
+    if badges is None:
+        badges = build_backpack(profile)
+        # Pilot badges are not invalidated, so expire them regularly.
+        cache.set(key, badges, BACKPACK_CACHE_TIMEOUT)
+    return badges
+
+
+def get_prerequisites_map():
+    """Return a dict mapping badge ids to the set of ids of their
+    prerequisite badges.
+
+    Loaded with one query and cached until a prerequisite changes."""
+    prerequisites = cache.get(PREREQUISITES_CACHE_KEY)
+    if prerequisites is None:
+        prerequisites = {}
+        edges = Badge.prerequisites.through.objects.values_list(
+            'from_badge_id', 'to_badge_id')
+        for badge_id, prerequisite_id in edges:
+            prerequisites.setdefault(badge_id, set()).add(prerequisite_id)
+        cache.set(PREREQUISITES_CACHE_KEY, prerequisites,
+            BADGES_CACHE_TIMEOUT)
+    return prerequisites
+
+
+def get_awarded_badge_ids(profile):
+    """Return the set of ids of the badges awarded to ``profile``.
+
+    Cached per user until one of their awards changes."""
+    key = AWARDED_BADGES_CACHE_KEY % profile.id
+    badge_ids = cache.get(key)
+    if badge_ids is None:
+        badge_ids = set(Award.objects.filter(user=profile).values_list(
+            'badge_id', flat=True))
+        cache.set(key, badge_ids, BADGES_CACHE_TIMEOUT)
+    return badge_ids
+
+
 class Badge(ModelBase):
     """ Representation of a Badge """
     name = models.CharField(max_length=225, blank=False)
@@ -87,31 +142,23 @@ class Badge(ModelBase):
 
     def save(self):
         """Make sure each badge has a unique slug."""
-        count = 1
-        if not self.slug:
-            slug = slugify(self.name)
-            self.slug = slug
-            while True:
-                existing = Badge.objects.filter(slug=self.slug)
-                if len(existing) == 0:
-                    break
-                self.slug = "%s-%s" % (slug, count + 1)
-                count += 1
-        super(Badge, self).save()
+        save_with_unique_slug(self, slugify(self.name), Badge.objects,
+            super(Badge, self).save)
+
+    def get_prerequisite_ids(self):
+        return get_prerequisites_map().get(self.id, set())
 
     def is_eligible(self, user):
         """Check if the user eligible for the badge.
 
         If some prerequisite badges have not been
         awarded returns False."""
-        awarded_badges = Award.objects.filter(
-            user=user).values('badge_id')
-        return not self.prerequisites.exclude(
-            id__in=awarded_badges).exists()
+        missing = self.get_prerequisite_ids() - get_awarded_badge_ids(user)
+        return not missing
 
     def is_awarded_to(self, user):
         """Does the user have the badge?"""
-        return Award.objects.filter(user=user, badge=self).count() > 0
+        return self.id in get_awarded_badge_ids(user)
 
     def award_to(self, user, submission=None):
         """Award the badge to the user.
@@ -144,18 +191,24 @@ class Badge(ModelBase):
     def pending_peer_reviews(self, user, submission):
         if not self.logic.min_votes:
             return False
-        assessments = Assessment.objects.filter(badge=self,
-            assessed=user, ready=True)
         if submission:
-            assessments = assessments.filter(submission=submission)
+            # Submissions keep running totals of their ready assessments.
+            votes_count = submission.votes_count
+            avg_rating = submission.get_average_rating()
         else:
-            assessments = assessments.filter(submission__isnull=True)
-        if assessments.count() < self.logic.min_votes:
+            totals = Assessment.objects.filter(badge=self, assessed=user,
+                ready=True, submission__isnull=True).aggregate(
+                votes_count=Count('id'), rating_sum=Sum('final_rating'),
+                weight_sum=Sum('weight'))
+            votes_count = totals['votes_count']
+            weight_sum = totals['weight_sum'] or 0
+            avg_rating = (totals['rating_sum'] or 0) / weight_sum \
+                if weight_sum > 0 else 0
+        if votes_count < self.logic.min_votes:
             # More votes needed.
             return True
         if not self.logic.min_avg_rating:
             return False
-        avg_rating = Assessment.compute_average_rating(assessments)
         if avg_rating < self.logic.min_avg_rating:
             # Rating too low.
             return True
@@ -164,19 +217,34 @@ class Badge(ModelBase):
         """Submissions of users who haven't received the award yet"""
         return Submission.objects.filter(badge=self, pending=True)
 
+    def get_group_ids(self):
+        key = BADGE_GROUPS_CACHE_KEY % self.id
+        group_ids = cache.get(key)
+        if group_ids is None:
+            group_ids = set(self.groups.values_list('id', flat=True))
+            cache.set(key, group_ids, BADGES_CACHE_TIMEOUT)
+        return group_ids
+
+    def get_peer_ids(self, profile):
+        """Ids of the users who share one of the badge's groups (or any
+        group if the badge applies to all of them) with ``profile``."""
+        from projects.models import get_project_members, get_user_project_ids
+        project_ids = get_user_project_ids(profile.id)
+        if not self.all_groups:
+            project_ids = project_ids & self.get_group_ids()
+        peer_ids = set()
+        for entry in get_project_members(project_ids).itervalues():
+            peer_ids |= entry['members']
+        peer_ids.discard(profile.id)
+        return peer_ids
+
+    def is_peer(self, profile, peer):
+        return not peer.deleted and peer.id in self.get_peer_ids(profile)
+
     def get_peers(self, profile):
-        from projects.models import Participation
         from users.models import UserProfile
-        user_projects = Participation.objects.filter(
-            user=profile).values('project__id')
-        peers = Participation.objects.filter(
-            project__in=user_projects)
-        if not self.all_groups:
-            badge_projects = self.groups.values('id')
-            peers = peers.filter(project__in=badge_projects)
         return UserProfile.objects.filter(deleted=False,
-            id__in=peers.values('user__id')).exclude(
-            id=profile.id)
+            id__in=self.get_peer_ids(profile))
 
     def other_badges_can_apply_for(self):
         badges = Badge.objects.exclude(
@@ -198,8 +266,7 @@ class Badge(ModelBase):
                 return False
             if not self.is_eligible(profile):
                 return False
-            awards = Award.objects.filter(user=profile, badge=self)
-            if self.logic.unique and awards.exists():
+            if self.logic.unique and self.is_awarded_to(profile):
                 return False
             return True
         else:
@@ -236,15 +303,27 @@ class Badge(ModelBase):
 
         return True
 
+    def get_adopter_ids(self):
+        """Ids of the current organizers and adopters of the badge's
+        groups, sorted."""
+        from projects.models import get_project_members
+        adopter_ids = set()
+        index = get_project_members(self.get_group_ids())
+        for entry in index.itervalues():
+            adopter_ids |= entry['adopters']
+        return sorted(adopter_ids)
+
     def get_adopters(self):
-        from projects.models import Participation
         from users.models import UserProfile
-        adopters = Participation.objects.filter(
-            project__in=self.groups.values('id'),
-            left_on__isnull=True).filter(
-            Q(adopter=True) | Q(organizing=True)).values(
-            'user_id').distinct()
-        return UserProfile.objects.filter(id__in=adopters)
+        return UserProfile.objects.filter(id__in=self.get_adopter_ids())
+
+    def iter_adopters(self, chunk_size=ADOPTERS_CHUNK_SIZE):
+        """Yield the adopters' profiles in lists of ``chunk_size``."""
+        from users.models import UserProfile
+        adopter_ids = self.get_adopter_ids()
+        for i in xrange(0, len(adopter_ids), chunk_size):
+            yield list(UserProfile.objects.filter(
+                id__in=adopter_ids[i:i + chunk_size]))
 
 
 class Rubric(ModelBase):
@@ -294,11 +373,40 @@ class Submission(ModelBase):
     created_on = models.DateTimeField(auto_now_add=True,
         default=datetime.datetime.now)
     pending = models.BooleanField(default=True)
+    # Running totals of the ready assessments, maintained by
+    # Assessment.update_final_rating.
+    votes_count = models.PositiveIntegerField(default=0)
+    votes_rating_sum = models.FloatField(default=0)
+    votes_weight_sum = models.FloatField(default=0)
 
     def __unicode__(self):
         return _('%(author)s\'s application for %(badge)s') % {
             'author': self.author, 'badge': self.badge}
 
+    def get_average_rating(self):
+        if self.votes_weight_sum > 0:
+            return self.votes_rating_sum / self.votes_weight_sum
+        return 0
+
+    def add_vote(self, assessment):
+        """Add a ready assessment to the running totals."""
+        self._change_votes(1, assessment.final_rating, assessment.weight)
+
+    def remove_vote(self, assessment):
+        self._change_votes(-1, -assessment.final_rating, -assessment.weight)
+
+    def _change_votes(self, count, rating, weight):
+        submissions = Submission.objects.filter(id=self.id)
+        if not submissions.update(votes_count=F('votes_count') + count,
+                votes_rating_sum=F('votes_rating_sum') + rating,
+                votes_weight_sum=F('votes_weight_sum') + weight):
+            return
+        # The instance may come from the cache; reload the totals so a
+        # later save() does not overwrite them.
+        self.__dict__.update(submissions.no_cache().values('votes_count',
+            'votes_rating_sum', 'votes_weight_sum')[0])
+        Submission.objects.invalidate(self)
+
     @models.permalink
     def get_absolute_url(self):
         return ('submission_show', (), {
@@ -314,11 +422,11 @@ class Submission(ModelBase):
             'submission': self,
             'domain': Site.objects.get_current().domain,
         }
-        profiles = self.badge.get_adopters()
-        send_notifications_i18n(
-            profiles, subject_template, body_template, context,
-            notification_category=u'badge-submission.badge-{0}'.format(self.badge.slug)
-        )
+        for profiles in self.badge.iter_adopters():
+            send_notifications_i18n(
+                profiles, subject_template, body_template, context,
+                notification_category=u'badge-submission.badge-{0}'.format(self.badge.slug)
+            )
 
 
 class Assessment(ModelBase):
@@ -340,6 +448,9 @@ class Assessment(ModelBase):
         'peer awarded assessment or superuser granted'))
     ready = models.BooleanField(default=False,
         help_text=_("If all rubric ratings were provided."))
+    # Running totals of the ratings, maintained by Rating.save.
+    ratings_sum = models.PositiveIntegerField(default=0)
+    ratings_count = models.PositiveIntegerField(default=0)
 
     def __unicode__(self):
         return _('%(assessor)s for %(assessed)s for %(badge)s') % {
@@ -371,21 +482,34 @@ class Assessment(ModelBase):
         return Rating.RATING_CHOICES[rating_position][1]
 
     def update_final_rating(self):
-        """Used on Rating save signal to update the final
-        rating for the assessment"""
+        """Called once the ratings are saved to update the final
+        rating for the assessment from the running totals."""
         if self.ready:
             return
-        ratings = Rating.objects.filter(assessment=self)
-        self.final_rating = ratings.aggregate(
-            final_rating=Avg('score'))['final_rating'] or 0
-        if ratings.count() == self.badge.rubrics.count():
+        if self.ratings_count:
+            self.final_rating = float(self.ratings_sum) / self.ratings_count
+        else:
+            self.final_rating = 0
+        if self.ratings_count == self.badge.rubrics.count():
             self.ready = True
         self.save()
+        if self.ready and self.submission:
+            self.submission.add_vote(self)
         if self.submission and not self.submission.pending:
             return
         if self.ready:
             self.badge.award_to(self.assessed, self.submission)
 
+    def change_ratings(self, score, count):
+        assessments = Assessment.objects.filter(id=self.id)
+        if not assessments.update(ratings_sum=F('ratings_sum') + score,
+                ratings_count=F('ratings_count') + count):
+            # Already deleted, the instance may come from the cache.
+            return
+        self.__dict__.update(assessments.no_cache().values('ratings_sum',
+            'ratings_count')[0])
+        Assessment.objects.invalidate(self)
+
     @classmethod
     def compute_average_rating(cls, assessments):
         ratings_sum = 0
@@ -421,6 +545,17 @@ class Rating(ModelBase):
             'rubric': self.rubric
         }
 
+    def save(self, *args, **kwargs):
+        """Keep the assessment's running totals up to date."""
+        if self.id:
+            previous = Rating.objects.no_cache().get(id=self.id).score
+            super(Rating, self).save(*args, **kwargs)
+            if previous != self.score:
+                self.assessment.change_ratings(self.score - previous, 0)
+        else:
+            super(Rating, self).save(*args, **kwargs)
+            self.assessment.change_ratings(self.score, 1)
+
     def score_as_percentage(self):
         """Return the score as a percentage for
         styling of assessment view. Max number of ratings
@@ -461,3 +596,84 @@ def post_submission_save(sender, **kwargs):
 
 post_save.connect(post_submission_save, sender=Submission,
     dispatch_uid='badges_post_submission_save')
+
+
+def invalidate_awarded_badges(sender, **kwargs):
+    instance = kwargs.get('instance', None)
+    if isinstance(instance, Award):
+        cache.delete_many([AWARDED_BADGES_CACHE_KEY % instance.user_id,
+            BACKPACK_CACHE_KEY % instance.user_id])
+
+post_save.connect(invalidate_awarded_badges, sender=Award,
+    dispatch_uid='badges_post_save_invalidate_awarded_badges')
+post_delete.connect(invalidate_awarded_badges, sender=Award,
+    dispatch_uid='badges_post_delete_invalidate_awarded_badges')
+
+
+def invalidate_badge_backpacks(sender, **kwargs):
+    # The backpacks copy the name, description and image of the badge.
+    instance = kwargs.get('instance', None)
+    if isinstance(instance, Badge):
+        user_ids = Award.objects.filter(badge=instance).values_list(
+            'user_id', flat=True).distinct()
+        cache.delete_many([BACKPACK_CACHE_KEY % user_id
+            for user_id in user_ids])
+
+post_save.connect(invalidate_badge_backpacks, sender=Badge,
+    dispatch_uid='badges_post_save_invalidate_badge_backpacks')
+
+
+def post_rating_delete(sender, **kwargs):
+    instance = kwargs.get('instance', None)
+    if isinstance(instance, Rating):
+        try:
+            assessment = instance.assessment
+        except Assessment.DoesNotExist:
+            # Deleted along with its assessment.
+            return
+        assessment.change_ratings(-instance.score, -1)
+
+post_delete.connect(post_rating_delete, sender=Rating,
+    dispatch_uid='badges_post_rating_delete')
+
+
+def post_assessment_delete(sender, **kwargs):
+    instance = kwargs.get('instance', None)
+    if isinstance(instance, Assessment) and instance.ready:
+        try:
+            submission = instance.submission
+        except Submission.DoesNotExist:
+            return
+        if submission:
+            submission.remove_vote(instance)
+
+post_delete.connect(post_assessment_delete, sender=Assessment,
+    dispatch_uid='badges_post_assessment_delete')
+
+
+def invalidate_prerequisites(sender, **kwargs):
+    cache.delete(PREREQUISITES_CACHE_KEY)
+
+m2m_changed.connect(invalidate_prerequisites,
+    sender=Badge.prerequisites.through,
+    dispatch_uid='badges_m2m_changed_invalidate_prerequisites')
+post_delete.connect(invalidate_prerequisites, sender=Badge,
+    dispatch_uid='badges_post_delete_invalidate_prerequisites')
+
+
+def invalidate_badge_groups(sender, **kwargs):
+    instance = kwargs.get('instance', None)
+    if isinstance(instance, Badge):
+        cache.delete(BADGE_GROUPS_CACHE_KEY % instance.id)
+    else:
+        # Changed from the project side, pk_set holds the badges.
+        badge_ids = kwargs.get('pk_set', None)
+        if badge_ids is None:
+            badge_ids = Badge.objects.values_list('id', flat=True)
+        cache.delete_many([BADGE_GROUPS_CACHE_KEY % badge_id
+            for badge_id in badge_ids])
+
+m2m_changed.connect(invalidate_badge_groups, sender=Badge.groups.through,
+    dispatch_uid='badges_m2m_changed_invalidate_badge_groups')
+post_delete.connect(invalidate_badge_groups, sender=Badge,
+    dispatch_uid='badges_post_delete_invalidate_badge_groups')
@@ -56,35 +56,51 @@ def get_awarded_badges(username):
         return badges
     try:
         user = User.objects.using(BADGES_DB).get(username=username)
-        awards = ForumAward.objects.using(BADGES_DB).filter(user_id=user.id)
-        for award in awards:
-            badge = ForumBadge.objects.using(BADGES_DB).get(id=award.badge_id)
-            if badge.type in [SAPPHIRE, EMERALD, RUBY]:
-                custom_badge = ForumCustombadge.objects.using(BADGES_DB).get(
-                    ondb_id=badge.id)
-                tag = ForumTag.objects.using(BADGES_DB).get(
-                    id=custom_badge.tag_id)
-                if tag.name in badges:
-                    badges[tag.name]['count'] += 1
-                else:
-                    url = settings.BADGE_EVIDENCE_URL % dict(badge_id=badge.id,
-                        badge_tag=tag.name, username=username)
-                    image_url = pilot_image(tag, badge)
-                    description_url = reverse('badges_show',
-                         kwargs=dict(slug=tag.name))
-                    data = {
-                        'name': custom_badge.name,
-                        'type': badge.type,
-                        'id': badge.id,
-                        'evidence': url,
-                        'image': image_url,
-                        'count': 1,
-                        'description': custom_badge.description,
-                        'criteria': description_url,
-                    }
-                    badges[tag.name] = data
     except User.DoesNotExist:
-        pass
+        return badges
+    # Load the awards and the related pilot rows with one query per table.
+    award_badge_ids = ForumAward.objects.using(BADGES_DB).filter(
+        user_id=user.id).values_list('badge_id', flat=True)
+    award_badge_ids = list(award_badge_ids)
+    forum_badges = ForumBadge.objects.using(BADGES_DB).filter(
+        id__in=set(award_badge_ids), type__in=[SAPPHIRE, EMERALD, RUBY])
+    forum_badges = dict((badge.id, badge) for badge in forum_badges)
+    custom_badges = ForumCustombadge.objects.using(BADGES_DB).filter(
+        ondb_id__in=forum_badges.keys())
+    custom_badges = dict((custom_badge.ondb_id, custom_badge)
+        for custom_badge in custom_badges)
+    tag_ids = [custom_badge.tag_id for custom_badge in custom_badges.values()]
+    tags = ForumTag.objects.using(BADGES_DB).filter(id__in=tag_ids)
+    tags = dict((tag.id, tag) for tag in tags)
+    for badge_id in award_badge_ids:
+        badge = forum_badges.get(badge_id)
+        if not badge:
+            continue
+        try:
+            custom_badge = custom_badges[badge.id]
+            tag = tags[custom_badge.tag_id]
+        except KeyError:
+            log.warn('Incomplete pilot badge data for badge %s' % badge.id)
+            continue
+        if tag.name in badges:
+            badges[tag.name]['count'] += 1
+        else:
+            url = settings.BADGE_EVIDENCE_URL % dict(badge_id=badge.id,
+                badge_tag=tag.name, username=username)
+            image_url = pilot_image(tag, badge)
+            description_url = reverse('badges_show',
+                 kwargs=dict(slug=tag.name))
+            data = {
+                'name': custom_badge.name,
+                'type': badge.type,
+                'id': badge.id,
+                'evidence': url,
+                'image': image_url,
+                'count': 1,
+                'description': custom_badge.description,
+                'criteria': description_url,
+            }
+            badges[tag.name] = data
     return badges
 
 
@@ -0,0 +1,257 @@
+from StringIO import StringIO
+
+from django.contrib.auth.models import User
+from django.core.cache import get_cache
+from django.core.management import call_command
+
+from mock import patch
+
+from test_utils import TestCase
+
+from users.models import create_profile
+from badges.models import Assessment, Award, Badge, Logic, Rating, Rubric, \
+    Submission
+from badges.models import build_backpack, get_awarded_badges, \
+    get_awarded_badge_ids, get_prerequisites_map
+
+
+class BadgeTests(TestCase):
+
+    test_username = 'testuser'
+    test_email = 'test@mail.org'
+
+    test_username2 = 'bob'
+    test_email2 = 'bob@mail.org'
+
+    def setUp(self):
+        self.user = create_profile(User(username=self.test_username,
+            email=self.test_email))
+        self.user.save()
+        self.user2 = create_profile(User(username=self.test_username2,
+            email=self.test_email2))
+        self.user2.save()
+        # More votes than given in the tests, so no badge is awarded.
+        self.logic = Logic.objects.create(name='Peer reviewed', min_votes=3)
+        self.badge = Badge(name='Test Badge', description='A test badge',
+            logic=self.logic)
+        self.badge.save()
+        self.rubrics = [Rubric.objects.create(question='Question %d' % i)
+            for i in range(2)]
+        for rubric in self.rubrics:
+            self.badge.rubrics.add(rubric)
+        self.submission = Submission.objects.create(
+            url='http://example.com/work', content='My work',
+            author=self.user, badge=self.badge)
+
+    def create_assessment(self, assessor, scores, weight=1):
+        assessment = Assessment.objects.create(assessor=assessor,
+            assessed=self.user, badge=self.badge, comment='Comment',
+            submission=self.submission, weight=weight)
+        for rubric, score in zip(self.rubrics, scores):
+            Rating(assessment=assessment, rubric=rubric, score=score).save()
+        assessment.update_final_rating()
+        return assessment
+
+    def get_assessment_totals(self, assessment):
+        return Assessment.objects.no_cache().filter(
+            id=assessment.id).values_list('ratings_sum', 'ratings_count')[0]
+
+    def get_submission_totals(self):
+        return Submission.objects.no_cache().filter(
+            id=self.submission.id).values_list('votes_count',
+            'votes_rating_sum', 'votes_weight_sum')[0]
+
+    def check_totals(self, fix=False):
+        out = StringIO()
+        call_command('check_assessment_totals', fix=fix, stdout=out)
+        return out.getvalue()
+
+    def test_rating_totals(self):
+        assessment = Assessment.objects.create(assessor=self.user2,
+            assessed=self.user, badge=self.badge, comment='Comment',
+            submission=self.submission)
+        rating = Rating(assessment=assessment, rubric=self.rubrics[0],
+            score=Rating.MOST_OF_THE_TIME)
+        rating.save()
+        self.assertEqual(self.get_assessment_totals(assessment), (3, 1))
+
+        # Re-rating changes the sum, not the count.
+        rating.score = Rating.NEVER
+        rating.save()
+        self.assertEqual(self.get_assessment_totals(assessment), (1, 1))
+        rating.save()
+        self.assertEqual(self.get_assessment_totals(assessment), (1, 1))
+
+        rating2 = Rating(assessment=assessment, rubric=self.rubrics[1],
+            score=Rating.ALWAYS)
+        rating2.save()
+        self.assertEqual(self.get_assessment_totals(assessment), (5, 2))
+        self.assertEqual((assessment.ratings_sum, assessment.ratings_count),
+            (5, 2))
+
+        rating2.delete()
+        self.assertEqual(self.get_assessment_totals(assessment), (1, 1))
+
+        assessment = Assessment.objects.get(id=assessment.id)
+        assessment.update_final_rating()
+        self.assertEqual(assessment.final_rating, 1)
+        self.assertFalse(assessment.ready)
+
+    def test_change_ratings(self):
+        assessment = Assessment.objects.create(assessor=self.user2,
+            assessed=self.user, badge=self.badge, comment='Comment')
+        stale = Assessment.objects.get(id=assessment.id)
+        assessment.change_ratings(4, 1)
+        stale.change_ratings(2, 1)
+        # Both updates are applied in the database, and the instance is
+        # reloaded with the totals.
+        self.assertEqual((stale.ratings_sum, stale.ratings_count), (6, 2))
+        self.assertEqual(self.get_assessment_totals(assessment), (6, 2))
+
+    def test_submission_votes(self):
+        first = self.create_assessment(self.user2,
+            [Rating.ALWAYS, Rating.SOMETIMES])
+        self.assertTrue(first.ready)
+        self.assertEqual(first.final_rating, 3)
+        self.assertEqual(self.get_submission_totals(), (1, 3, 1))
+
+        second = self.create_assessment(self.user2,
+            [Rating.NEVER, Rating.NEVER], weight=2)
+        self.assertEqual(self.get_submission_totals(), (2, 4, 3))
+        submission = Submission.objects.get(id=self.submission.id)
+        self.assertAlmostEqual(submission.get_average_rating(), 4 / 3.0)
+        self.assertTrue(submission.pending)
+
+        # A deleted vote and its ratings leave the totals.
+        first.delete()
+        self.assertEqual(self.get_submission_totals(), (1, 1, 2))
+        self.assertEqual(Rating.objects.filter(assessment=first.id).count(), 0)
+
+        self.submission._change_votes(-1, -second.final_rating,
+            -second.weight)
+        self.assertEqual(self.get_submission_totals(), (0, 0, 0))
+        self.assertEqual(self.submission.votes_count, 0)
+
+    def test_check_assessment_totals(self):
+        assessment = self.create_assessment(self.user2,
+            [Rating.ALWAYS, Rating.SOMETIMES])
+        self.assertTrue(self.check_totals().startswith('0 mismatch(es)'))
+
+        Assessment.objects.filter(id=assessment.id).update(ratings_sum=1)
+        Submission.objects.filter(id=self.submission.id).update(
+            votes_count=5)
+        output = self.check_totals()
+        self.assertIn('2 mismatch(es) found.', output)
+        self.assertEqual(self.get_assessment_totals(assessment), (1, 2))
+
+        output = self.check_totals(fix=True)
+        self.assertIn('2 mismatch(es) found, fixed.', output)
+        self.assertEqual(self.get_assessment_totals(assessment), (6, 2))
+        self.assertEqual(self.get_submission_totals(), (1, 3, 1))
+        self.assertTrue(self.check_totals().startswith('0 mismatch(es)'))
+
+    def test_change_deleted_totals(self):
+        assessment = self.create_assessment(self.user2,
+            [Rating.ALWAYS, Rating.SOMETIMES])
+        stale = Assessment.objects.get(id=assessment.id)
+        submission = Submission.objects.get(id=self.submission.id)
+        assessment.delete()
+        # Instances of deleted rows, as the cache can return them after
+        # the cascade, are left as they are.
+        stale.change_ratings(-Rating.ALWAYS, -1)
+        self.assertEqual((stale.ratings_sum, stale.ratings_count), (6, 2))
+        self.submission.delete()
+        submission._change_votes(-1, -3, -1)
+        self.assertEqual(submission.votes_count, 1)
+
+
+class BadgeCacheTests(TestCase):
+
+    def setUp(self):
+        # The dummy cache backend would not keep anything.
+        self.cache_patch = patch('badges.models.cache',
+            get_cache('locmem://'))
+        self.cache_patch.start()
+        self.user = create_profile(User(username='testuser',
+            email='test@mail.org'))
+        # Awarded without reviews.
+        self.logic = Logic.objects.create(name='Self awarded')
+        self.badge = self.create_badge('First Badge')
+        self.next_badge = self.create_badge('Next Badge')
+        self.next_badge.prerequisites.add(self.badge)
+
+    def tearDown(self):
+        self.cache_patch.stop()
+
+    def create_badge(self, name):
+        badge = Badge(name=name, description=name, logic=self.logic)
+        badge.save()
+        return badge
+
+    def test_prerequisites_map(self):
+        self.assertEqual(get_prerequisites_map(),
+            {self.next_badge.id: set([self.badge.id])})
+        self.assertNumQueries(0, get_prerequisites_map)
+
+        other = self.create_badge('Other Badge')
+        self.next_badge.prerequisites.add(other)
+        self.assertEqual(self.next_badge.get_prerequisite_ids(),
+            set([self.badge.id, other.id]))
+        self.next_badge.prerequisites.remove(self.badge)
+        self.assertEqual(self.next_badge.get_prerequisite_ids(),
+            set([other.id]))
+        other.delete()
+        self.assertEqual(get_prerequisites_map(), {})
+
+    def test_awarded_badge_ids(self):
+        self.assertEqual(get_awarded_badge_ids(self.user), set())
+        self.assertFalse(self.next_badge.is_eligible(self.user))
+        self.assertEqual(self.next_badge.award_to(self.user), None)
+
+        award = self.badge.award_to(self.user)
+        self.assertEqual(get_awarded_badge_ids(self.user),
+            set([self.badge.id]))
+        self.assertNumQueries(0, get_awarded_badge_ids, self.user)
+        self.assertTrue(self.next_badge.is_eligible(self.user))
+        self.assertTrue(self.next_badge.award_to(self.user))
+        self.assertTrue(self.next_badge.is_awarded_to(self.user))
+
+        award.delete()
+        self.assertFalse(self.badge.is_awarded_to(self.user))
+        self.assertEqual(Award.objects.filter(user=self.user).count(), 1)
+
+    def get_backpack(self):
+        with patch('badges.pilot.get_awarded_badges') as get_pilot_badges:
+            get_pilot_badges.return_value = {}
+            return get_awarded_badges(self.user.user)
+
+    def test_backpack(self):
+        self.badge.award_to(self.user)
+        self.badge.award_to(self.user)
+        self.next_badge.award_to(self.user)
+        backpack = self.get_backpack()
+        # The same entries as counting the awards of each badge.
+        for badge in (self.badge, self.next_badge):
+            entry = backpack[badge.slug]
+            self.assertEqual(entry['count'], Award.objects.filter(
+                user=self.user, badge=badge).count())
+            self.assertEqual(entry['name'], badge.name)
+            self.assertEqual(entry['criteria'], badge.get_absolute_url())
+        self.assertEqual(backpack[self.badge.slug]['count'], 2)
+        self.assertEqual(set(backpack.keys()),
+            set([self.badge.slug, self.next_badge.slug]))
+
+        other = self.create_badge('Other Badge')
+        other.award_to(self.user)
+        self.assertEqual(self.get_backpack()[other.slug]['count'], 1)
+
+        self.badge.name = 'Renamed Badge'
+        self.badge.save()
+        self.assertEqual(self.get_backpack()[self.badge.slug]['name'],
+            'Renamed Badge')
+
+    def test_build_backpack(self):
+        with patch('badges.pilot.get_awarded_badges') as get_pilot_badges:
+            get_pilot_badges.return_value = {'pilot': {'count': 1}}
+            self.assertEqual(build_backpack(self.user),
+                {'pilot': {'count': 1}})
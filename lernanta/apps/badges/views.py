@@ -5,6 +5,7 @@ from django.utils.translation import ugettext as _
 from django.conf import settings
 from django.shortcuts import render_to_response
 from django.shortcuts import get_object_or_404
+from django.db import transaction
 from django.template import RequestContext
 from django.template.loader import render_to_string
 from django.utils import simplejson
@@ -138,7 +139,7 @@ def show_submission(request, slug, submission_id):
     badge = submission.badge
     assessments = Assessment.objects.filter(submission=submission,
         ready=True)
-    avg_rating = Assessment.compute_average_rating(assessments)
+    avg_rating = submission.get_average_rating()
     can_review_submission = badge.can_review_submission(submission, request.user)
 
     context = {
@@ -206,6 +207,7 @@ def mine_matching_submissions(request, slug):
 
 
 @login_required
+@transaction.commit_on_success
 def assess_submission(request, slug, submission_id):
     submission = get_object_or_404(Submission, id=submission_id,
         badge__slug=slug)
@@ -289,6 +291,7 @@ def show_assessment(request, slug, assessment_id):
 
 
 @login_required
+@transaction.commit_on_success
 def create_assessment(request, slug):
     badge = get_object_or_404(Badge, slug=slug)
     if not badge.can_give_to_peer(request.user):
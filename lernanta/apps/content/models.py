@@ -3,7 +3,7 @@ import datetime
 
 from django.db import models
 from django.template.defaultfilters import slugify
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, pre_delete
 from django.utils.translation import ugettext_lazy as _
 from django.db.models import Max
 from django.contrib.sites.models import Site
@@ -11,12 +11,15 @@ from django.contrib.contenttypes import generic
 from django.conf import settings
 
 from drumbeat.models import ModelBase
+from drumbeat.utils import save_with_unique_slug
+from drumbeat import versions
 from activity.models import Activity
 from activity.schema import verbs, object_types
 from notifications.models import send_notifications_i18n
 from richtext.models import RichTextField
+from richtext import clean_html
 from replies.models import PageComment
-from badges.models import Submission, Award
+from badges.models import Submission, get_awarded_badge_ids
 
 
 log = logging.getLogger(__name__)
@@ -65,18 +68,11 @@ class Page(ModelBase):
             return _('added')
 
     def save(self):
-        """Make sure each page has a unique url."""
-        count = 1
-        if not self.slug:
-            slug = slugify(self.title)
-            self.slug = slug
-            while True:
-                existing = Page.objects.filter(
-                    project__slug=self.project.slug, slug=self.slug)
-                if len(existing) == 0:
-                    break
-                self.slug = "%s-%s" % (slug, count + 1)
-                count += 1
+        """Make sure each page has a unique url.
+
+        Page slugs have no unique index, so two pages with the same
+        title created at the same time in a project can still share a
+        slug."""
         if not self.index:
             if self.listed:
                 max_index = Page.objects.filter(project=self.project,
@@ -84,7 +80,9 @@ class Page(ModelBase):
                 self.index = max_index + 1 if max_index else 1
             else:
                 self.index = 0
-        super(Page, self).save()
+        save_with_unique_slug(self, slugify(self.title),
+            Page.objects.filter(project=self.project_id),
+            super(Page, self).save)
 
     def get_next_page(self):
         if self.listed and not self.deleted:
@@ -97,15 +95,16 @@ class Page(ModelBase):
         return None
 
     def get_next_badge_can_apply(self, profile):
-        next_badges = self.badges_to_apply.order_by('id')
+        next_badges = list(self.badges_to_apply.order_by('id'))
+        awarded = get_awarded_badge_ids(profile)
+        applied = set(Submission.objects.filter(author=profile,
+            badge__in=[badge.id for badge in next_badges]).values_list(
+            'badge_id', flat=True))
         next_badges_can_apply = []
         for badge in next_badges:
-            awarded = Award.objects.filter(user=profile,
-                badge=badge).exists()
-            applied = Submission.objects.filter(author=profile,
-                badge=badge).exists()
-            elegible = badge.is_eligible(profile)
-            if not awarded and not applied and elegible:
+            if badge.id in awarded or badge.id in applied:
+                continue
+            if badge.is_eligible(profile):
                 next_badges_can_apply.append(badge)
             if len(next_badges_can_apply) > 1:
                 break
@@ -204,6 +203,26 @@ class PageVersion(ModelBase):
     page = models.ForeignKey('content.Page', related_name='page_versions')
     deleted = models.BooleanField(default=False)
     minor_update = models.BooleanField(default=True)
+    # Set when the content is stored as a delta, see drumbeat.versions.
+    base = models.ForeignKey('self', related_name='+', null=True,
+        blank=True, on_delete=models.SET_NULL)
+    delta = models.TextField(blank=True, default='')
+
+    def save(self):
+        """Store new versions as a delta against the page's latest
+        snapshot when it is small enough."""
+        if not self.id and not self.base_id:
+            self.content = clean_html(
+                self._meta.get_field('content').config_name, self.content)
+            versions.encode_version(self, PageVersion.objects.filter(
+                page=self.page_id))
+        super(PageVersion, self).save()
+
+    def get_content(self):
+        """The full content of the version."""
+        if not hasattr(self, '_full_content'):
+            self._full_content = versions.decode_version(self)
+        return self._full_content
 
     @models.permalink
     def get_absolute_url(self):
@@ -261,3 +280,12 @@ def fire_activity(sender, **kwargs):
 
 post_save.connect(fire_activity, sender=Page,
     dispatch_uid='content_page_fire_activity')
+
+
+def release_page_version_snapshot(sender, **kwargs):
+    instance = kwargs.get('instance', None)
+    if isinstance(instance, PageVersion) and instance.base_id is None:
+        versions.release_snapshot(PageVersion, instance)
+
+pre_delete.connect(release_page_version_snapshot, sender=PageVersion,
+    dispatch_uid='content_pageversion_release_snapshot')
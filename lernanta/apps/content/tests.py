@@ -3,7 +3,9 @@ from django.contrib.auth.models import User
 
 from users.models import create_profile
 from projects.models import Project, Participation
-from content.models import Page
+import datetime
+
+from content.models import Page, PageVersion
 
 from test_utils import TestCase
 
@@ -63,3 +65,25 @@ class PageTests(TestCase):
 
         self.assertTrue(page1.index < page3.index)
         self.assertTrue(page3.index < page2.index)
+
+    def test_delete_snapshot_version(self):
+        page = self.project.pages.all()[0]
+        paragraphs = ['<p>Paragraph %d of the page.</p>\n' % i
+            for i in range(10)]
+        texts = []
+        for i in range(3):
+            paragraphs[i] = '<p>Edit %d.</p>\n' % i
+            texts.append(''.join(paragraphs))
+            PageVersion(title=page.title, content=texts[-1], author=self.user,
+                date=datetime.datetime.now(), page=page).save()
+        snapshot, first, second = PageVersion.objects.filter(
+            page=page).order_by('id')
+        self.assertEqual(snapshot.base_id, None)
+        self.assertEqual(first.base_id, snapshot.id)
+
+        snapshot.delete()
+        versions = PageVersion.objects.filter(page=page).order_by('id')
+        self.assertEqual([version.get_content() for version in versions],
+            texts[1:])
+        self.assertEqual([version.base_id for version in versions],
+            [None, None])
@@ -287,7 +287,7 @@ def restore_version(request, slug, page_slug, version_id):
             messages.error(request, _('Please correct errors below.'))
     else:
         page.title = version.title
-        page.content = version.content
+        page.content = version.get_content()
         form = form_cls(instance=page, initial={'minor_update': True})
     return render_to_response('content/restore_version.html', {
         'form': form,
@@ -1,6 +1,8 @@
 from django.db import models
+from django.db.models.signals import pre_delete
 
 from drumbeat.models import ModelBase
+from drumbeat import versions
 
 
 class Content(ModelBase):
@@ -17,3 +19,21 @@ class ContentVersion(ModelBase):
     date = models.DateTimeField(auto_now_add=True)
     comment = models.CharField(max_length = 100)
     author_uri = models.CharField(max_length=256)
+    # Set when the content is stored as a delta, see drumbeat.versions.
+    # The latest version of a content always keeps its full content.
+    base = models.ForeignKey('content2.ContentVersion', related_name='+', null=True, blank=True, on_delete=models.SET_NULL)
+    delta = models.TextField(blank=True, default='')
+
+
+###########
+# Signals #
+###########
+
+
+def release_content_version_snapshot(sender, **kwargs):
+    instance = kwargs.get('instance', None)
+    if isinstance(instance, ContentVersion) and instance.base_id is None:
+        versions.release_snapshot(ContentVersion, instance)
+
+pre_delete.connect(release_content_version_snapshot, sender=ContentVersion,
+    dispatch_uid='content2_contentversion_release_snapshot')
@@ -0,0 +1,64 @@
+# encoding: utf-8
+import datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import connection, models
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        
+        # The tables were created by syncdb before the app had migrations.
+        if 'content2_content' in connection.introspection.table_names():
+            return
+
+        # Adding model 'Content'
+        db.create_table('content2_content', (
+            ('id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('latest', self.gf('django.db.models.fields.related.ForeignKey')(blank=True, related_name='+', null=True, to=orm['content2.ContentVersion'])),
+            ('based_on', self.gf('django.db.models.fields.related.ForeignKey')(blank=True, related_name='derived_content', null=True, to=orm['content2.Content'])),
+        ))
+        db.send_create_signal('content2', ['Content'])
+
+        # Adding model 'ContentVersion'
+        db.create_table('content2_contentversion', (
+            ('id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('container', self.gf('django.db.models.fields.related.ForeignKey')(related_name='versions', to=orm['content2.Content'])),
+            ('title', self.gf('django.db.models.fields.CharField')(max_length=100)),
+            ('content', self.gf('django.db.models.fields.TextField')()),
+            ('date', self.gf('django.db.models.fields.DateTimeField')(auto_now_add=True, blank=True)),
+            ('comment', self.gf('django.db.models.fields.CharField')(max_length=100)),
+            ('author_uri', self.gf('django.db.models.fields.CharField')(max_length=256)),
+        ))
+        db.send_create_signal('content2', ['ContentVersion'])
+
+
+    def backwards(self, orm):
+        
+        # Deleting model 'Content'
+        db.delete_table('content2_content')
+
+        # Deleting model 'ContentVersion'
+        db.delete_table('content2_contentversion')
+
+
+    models = {
+        'content2.content': {
+            'Meta': {'object_name': 'Content'},
+            'based_on': ('django.db.models.fields.related.ForeignKey', [], {'blank': 'True', 'related_name': "'derived_content'", 'null': 'True', 'to': "orm['content2.Content']"}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'latest': ('django.db.models.fields.related.ForeignKey', [], {'blank': 'True', 'related_name': "'+'", 'null': 'True', 'to': "orm['content2.ContentVersion']"})
+        },
+        'content2.contentversion': {
+            'Meta': {'object_name': 'ContentVersion'},
+            'author_uri': ('django.db.models.fields.CharField', [], {'max_length': '256'}),
+            'comment': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'container': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'versions'", 'to': "orm['content2.Content']"}),
+            'content': ('django.db.models.fields.TextField', [], {}),
+            'date': ('django.db.models.fields.DateTimeField', [], {'auto_now_add': 'True', 'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'title': ('django.db.models.fields.CharField', [], {'max_length': '100'})
+        }
+    }
+
+    complete_apps = ['content2']
@@ -0,0 +1,48 @@
+# encoding: utf-8
+import datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        
+        # Adding field 'ContentVersion.base'
+        db.add_column('content2_contentversion', 'base', self.gf('django.db.models.fields.related.ForeignKey')(blank=True, related_name='+', null=True, to=orm['content2.ContentVersion']), keep_default=False)
+
+        # Adding field 'ContentVersion.delta'
+        db.add_column('content2_contentversion', 'delta', self.gf('django.db.models.fields.TextField')(default='', blank=True), keep_default=False)
+
+
+    def backwards(self, orm):
+        
+        # Deleting field 'ContentVersion.base'
+        db.delete_column('content2_contentversion', 'base_id')
+
+        # Deleting field 'ContentVersion.delta'
+        db.delete_column('content2_contentversion', 'delta')
+
+
+    models = {
+        'content2.content': {
+            'Meta': {'object_name': 'Content'},
+            'based_on': ('django.db.models.fields.related.ForeignKey', [], {'blank': 'True', 'related_name': "'derived_content'", 'null': 'True', 'to': "orm['content2.Content']"}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'latest': ('django.db.models.fields.related.ForeignKey', [], {'blank': 'True', 'related_name': "'+'", 'null': 'True', 'to': "orm['content2.ContentVersion']"})
+        },
+        'content2.contentversion': {
+            'Meta': {'object_name': 'ContentVersion'},
+            'author_uri': ('django.db.models.fields.CharField', [], {'max_length': '256'}),
+            'comment': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'container': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'versions'", 'to': "orm['content2.Content']"}),
+            'base': ('django.db.models.fields.related.ForeignKey', [], {'blank': 'True', 'related_name': "'+'", 'null': 'True', 'to': "orm['content2.ContentVersion']"}),
+            'content': ('django.db.models.fields.TextField', [], {}),
+            'date': ('django.db.models.fields.DateTimeField', [], {'auto_now_add': 'True', 'blank': 'True'}),
+            'delta': ('django.db.models.fields.TextField', [], {'default': "''", 'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'title': ('django.db.models.fields.CharField', [], {'max_length': '100'})
+        }
+    }
+
+    complete_apps = ['content2']
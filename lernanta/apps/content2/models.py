@@ -1,12 +1,21 @@
 import simplejson as json
+import datetime
+
+from django.db import connection, transaction
 
 from content2 import db
 from drumbeat.utils import slugify
+from drumbeat import versions
 from django.utils.translation import ugettext as _
 
 import logging
 log = logging.getLogger(__name__)
 
+# Rows written per INSERT batch by the bulk functions.
+BULK_INSERT_SIZE = 500
+
+HISTORY_PAGE_SIZE = 20
+
 
 def content_uri2id(content_uri):
     return content_uri.strip('/').split('/')[-1]
@@ -29,18 +38,115 @@ def get_content(content_uri, fields=[]):
         "content": latest_db.content,
     }
     if "history" in fields:
-        content["history"] = []
-        for version in wrapper_db.versions.sort_by("date"):
-            content['history'] += {
-                "date": version.date,
-                "author_uri": version.author_uri,
-                "title": version.title,
-                "comment": version.comment,
-            }
+        content["history"] = [_get_version_data(version_db)
+            for version_db in wrapper_db.versions.order_by('date', 'id')]
 
     return content
 
 
+def _get_version_data(version_db, with_content=False):
+    version = {
+        "id": version_db.id,
+        "date": version_db.date,
+        "author_uri": version_db.author_uri,
+        "title": version_db.title,
+        "comment": version_db.comment,
+    }
+    if with_content:
+        version["content"] = versions.decode_version(version_db)
+    return version
+
+
+def get_content_history(content_uri, page=1, per_page=HISTORY_PAGE_SIZE, with_content=False):
+    """ return one page of the versions of a content, newest first, and
+        whether there are older ones. The full content of every version
+        is only rebuilt with_content """
+    content_id = content_uri2id(content_uri)
+    versions_db = db.ContentVersion.objects.filter(
+        container=content_id).order_by('-date', '-id')
+    if with_content:
+        versions_db = versions_db.select_related('base')
+    start = (page - 1) * per_page
+    versions_db = list(versions_db[start:start + per_page + 1])
+    return {
+        "page": page,
+        "versions": [_get_version_data(version_db, with_content)
+            for version_db in versions_db[:per_page]],
+        "has_next": len(versions_db) > per_page,
+    }
+
+
+def _compact_version(version_db):
+    """ store a version that is no longer the latest as a delta, if that
+        is worth it """
+    older_db = db.ContentVersion.objects.no_cache().filter(
+        container=version_db.container_id, id__lt=version_db.id)
+    if versions.encode_version(version_db, older_db):
+        db.ContentVersion.objects.filter(id=version_db.id).update(
+            base=version_db.base, delta=version_db.delta, content='')
+        db.ContentVersion.objects.invalidate(version_db)
+
+
+def get_contents(content_uris):
+    """ return the latest version of several contents keyed by uri, using
+        one query """
+    ids = dict((int(content_uri2id(uri)), uri) for uri in content_uris)
+    contents = {}
+    for wrapper_db in db.Content.objects.filter(
+            id__in=ids.keys()).select_related('latest'):
+        contents[ids[wrapper_db.id]] = {
+            "id": wrapper_db.id,
+            "uri": "/uri/content/{0}".format(wrapper_db.id),
+            "title": wrapper_db.latest.title,
+            "content": wrapper_db.latest.content,
+        }
+    return contents
+
+
+def create_contents(contents):
+    """ create several contents at once and return their uris in order
+
+        every item is a dict with title, content and author_uri, and
+        optionally the id of the content it is based_on. The versions are
+        inserted in batches and all the latest pointers set with a single
+        UPDATE. """
+    containers = []
+    for item in contents:
+        container_db = db.Content(based_on_id=item.get('based_on'))
+        container_db.save()
+        containers.append(container_db)
+    if not containers:
+        return []
+
+    qn = connection.ops.quote_name
+    version_table = qn(db.ContentVersion._meta.db_table)
+    columns = ('container_id', 'title', 'content', 'date', 'comment',
+        'author_uri', 'delta')
+    sql = 'INSERT INTO %s (%s) VALUES (%s)' % (version_table,
+        ', '.join([qn(column) for column in columns]),
+        ', '.join(['%s'] * len(columns)))
+    now = datetime.datetime.now()
+    rows = [(container_db.id, item['title'], item['content'], now, '',
+        item['author_uri'], '') for container_db, item in zip(containers, contents)]
+    cursor = connection.cursor()
+    for start in range(0, len(rows), BULK_INSERT_SIZE):
+        cursor.executemany(sql, rows[start:start + BULK_INSERT_SIZE])
+
+    container_ids = [container_db.id for container_db in containers]
+    content_table = qn(db.Content._meta.db_table)
+    for start in range(0, len(container_ids), BULK_INSERT_SIZE):
+        chunk = container_ids[start:start + BULK_INSERT_SIZE]
+        cursor.execute('UPDATE %s SET %s = (SELECT MAX(%s) FROM %s WHERE '
+            '%s = %s.%s) WHERE %s IN (%s)' % (content_table, qn('latest_id'),
+            qn('id'), version_table, qn('container_id'), content_table,
+            qn('id'), qn('id'), ', '.join(['%s'] * len(chunk))), chunk)
+    transaction.commit_unless_managed()
+    # The rows changed behind the ORM's back.
+    db.Content.objects.invalidate(*containers)
+    return ["/uri/content/{0}".format(content_id)
+        for content_id in container_ids]
+
+
 def create_content(title, content, author_uri):
     #TODO check all required properties
     container_db = db.Content()
@@ -68,6 +174,7 @@ def update_content( uri, title, content, author_uri ):
         log.debug(e)
         return None
 
+    previous_db = wrapper_db.latest
     content_db = db.ContentVersion(
         container=wrapper_db,
         title=title,
@@ -79,6 +186,8 @@ def update_content( uri, title, content, author_uri ):
     content_db.save()
     wrapper_db.latest = content_db
     wrapper_db.save()
+    if previous_db and previous_db.base_id is None:
+        _compact_version(previous_db)
     return get_content("/uri/content/{0}".format(wrapper_db.id))
 
 
@@ -104,3 +213,22 @@ def clone_content(uri):
     container_db.save()
 
     return get_content("/uri/content/{0}".format(container_db.id))
+
+
+def clone_contents(content_uris):
+    """ clone several contents at once and return the uris of the copies in
+        the same order, see create_contents """
+    ids = [int(content_uri2id(uri)) for uri in content_uris]
+    originals = db.Content.objects.filter(id__in=ids).select_related('latest')
+    originals = dict((original_db.id, original_db)
+        for original_db in originals)
+    contents = []
+    for content_id in ids:
+        latest_db = originals[content_id].latest
+        contents.append({
+            "title": latest_db.title,
+            "content": latest_db.content,
+            "author_uri": latest_db.author_uri,
+            "based_on": content_id,
+        })
+    return create_contents(contents)
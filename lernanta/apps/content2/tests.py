@@ -50,6 +50,31 @@ class CourseTests(TestCase):
         content_model.update_content(
             content['uri'], 'New title', 'New content', '/uri/users/testuser'
         )
+        content = content_model.get_content(content['uri'], ['history'])
+        self.assertEqual([version['title'] for version in content['history']],
+            ['title', 'New title'])
+
+
+    def test_content_history_deltas(self):
+        paragraphs = ['<p>Paragraph %d of the page.</p>\n' % i for i in range(20)]
+        content = content_model.create_content('title', ''.join(paragraphs), '/uri/users/bob')
+        texts = [content['content']]
+        for i in range(30):
+            paragraphs[i % 20] = '<p>Edit %d.</p>\n' % i
+            texts.append(''.join(paragraphs))
+            content_model.update_content(
+                content['uri'], 'title', texts[-1], '/uri/users/bob'
+            )
+        self.assertEqual(content_model.get_content(content['uri'])['content'], texts[-1])
+
+        history = content_model.get_content_history(content['uri'], per_page=25, with_content=True)
+        self.assertTrue(history['has_next'])
+        self.assertEqual([version['content'] for version in history['versions']],
+            texts[::-1][:25])
+        history = content_model.get_content_history(content['uri'], page=2, per_page=25, with_content=True)
+        self.assertFalse(history['has_next'])
+        self.assertEqual([version['content'] for version in history['versions']],
+            texts[::-1][25:])
 
 
     def test_clone_content(self):
@@ -57,3 +82,15 @@ class CourseTests(TestCase):
         clone = content_model.clone_content(content['uri'])
         for key in ['title', 'content']:
             self.assertTrue(content[key], clone[key])
+
+
+    def test_clean_user_contents(self):
+        from content2 import utils
+        dirty = '<p><a href="/a" onclick="x()">link</a><script>x()</script></p>'
+        cleaned = utils.clean_user_contents([dirty, dirty, ''])
+        self.assertIn('<a href="/a">link</a>', cleaned[0])
+        self.assertNotIn('onclick', cleaned[0])
+        self.assertNotIn('<script>', cleaned[0])
+        self.assertEqual(cleaned[1], cleaned[0])
+        self.assertEqual(cleaned[2], '')
+        self.assertEqual(utils.clean_user_content(cleaned[0]), cleaned[0])
@@ -1,15 +1,16 @@
 import bleach
 
+from richtext import clean_html, clean_html_many
+
+
 def clean_user_content(content):
-    config = {
-        'tags': ['table', 'tr', 'th', 'td', 'tbody', 'a', 'iframe'],
-        'attributes': {'a': ['href'], 'iframe': ['src', 'width', 'height'] },
-        'styles': [],
-        'strip': True
-    }
-    content = bleach.clean(content, **config)
-    #TODO
-    return content
+    return clean_html('user_content', content)
+
+
+def clean_user_contents(contents):
+    """ clean several contents at once, for imports """
+    return clean_html_many('user_content', contents)
+
 
 def clean_trusted_user_content(content):
     bleach.clean(content, strip=True)
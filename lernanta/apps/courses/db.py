@@ -77,3 +77,16 @@ class CohortComment(ModelBase):
     comment_uri = models.CharField(max_length=256)
     reference_uri = models.CharField(max_length=256)
 
+
+class BulkJob(ModelBase):
+    """ status of a course clone or import running in the background """
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    job_id = models.CharField(max_length=32, unique=True)
+    status = models.CharField(max_length=10)
+    course_uri = models.CharField(max_length=256, blank=True)
+    created_on = models.DateTimeField(auto_now_add=True)
@@ -1,15 +1,91 @@
-from apps.courses import db
+"""
+Streaming CSV exports of the course signups.
+
+The row generators read the signups with ``iterator()`` and look up the
+members' profiles one chunk of rows at a time, so they hold a bounded
+number of rows whatever the size of the cohort. ``write_csv`` writes the
+rows to a file (see the ``export_course_signups`` command) and
+``csv_lines`` encodes them one by one for a streaming ``HttpResponse``.
+"""
+from cStringIO import StringIO
+
 import unicodecsv
 
+from courses import db
+from users.models import UserProfile
+
+EXPORT_CHUNK_SIZE = 500
+
+
+def _username(user_uri):
+    return user_uri.strip('/').split('/')[-1]
+
+
+def _chunks(rows, size=EXPORT_CHUNK_SIZE):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _with_emails(signups):
+    """Yield the ``(user_uri, ...)`` signup rows with the email of the
+    user, using one query per chunk of rows."""
+    for chunk in _chunks(signups):
+        usernames = set(_username(row[0]) for row in chunk)
+        emails = dict(UserProfile.objects.filter(
+            username__in=usernames).values_list('username', 'email'))
+        for row in chunk:
+            yield row, emails.get(_username(row[0]), '')
+
+
+def signup_rows():
+    """Every signup of every course, past ones included."""
+    yield ['signup_date', 'leave_date', 'role', 'user', 'course']
+    signups = db.CohortSignup.objects.no_cache().order_by('id').values_list(
+        'signup_date', 'leave_date', 'role', 'user_uri', 'cohort__course_id')
+    for signup_date, leave_date, role, user_uri, course_id in \
+            signups.iterator():
+        yield [
+            signup_date.isoformat(),
+            leave_date.isoformat() if leave_date else '',
+            role,
+            user_uri,
+            course_id,
+        ]
+
+
+def course_email_rows(course_id):
+    """The current members of a course with their email address."""
+    yield ["username", "email address", "signup date"]
+    signups = db.CohortSignup.objects.no_cache().filter(
+        cohort__course=course_id, leave_date__isnull=True).order_by(
+        'id').values_list('user_uri', 'signup_date')
+    for (user_uri, signup_date), email in _with_emails(signups.iterator()):
+        yield [_username(user_uri), email, signup_date]
+
+
+def csv_lines(rows):
+    """Encode the rows as CSV, yielding one line at a time."""
+    line = StringIO()
+    writer = unicodecsv.writer(line)
+    for row in rows:
+        writer.writerow(row)
+        yield line.getvalue()
+        line.seek(0)
+        line.truncate()
+
+
+def write_csv(rows, fileobj):
+    writer = unicodecsv.writer(fileobj)
+    for row in rows:
+        writer.writerow(row)
+
+
 def export_signup_csv(filename):
     with open(filename, 'w') as fout:
-        writer = unicodecsv.writer(fout)
-        writer.writerow(['signup_date', 'leave_date', 'role', 'user', 'course'])
-        for signup in db.CohortSignup.objects.all():
-            writer.writerow([
-                signup.signup_date.isoformat(),
-                signup.leave_date.isoformat() if signup.leave_date else '',
-                signup.role,
-                signup.user_uri,
-                signup.cohort.course.id
-            ])
+        write_csv(signup_rows(), fout)
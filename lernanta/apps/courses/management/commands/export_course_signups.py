@@ -0,0 +1,31 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from courses import export
+
+
+class Command(BaseCommand):
+    help = ('Write the signups of every course, or the members of one '
+            'course with their email address, as CSV.')
+
+    option_list = BaseCommand.option_list + (
+        make_option('--course', action='store', dest='course', type='int',
+            default=None, help='Export the members of this course id.'),
+        make_option('--output', action='store', dest='output',
+            default=None, help='File to write to, instead of stdout.'),
+    )
+
+    def handle(self, *args, **options):
+        if options['course']:
+            rows = export.course_email_rows(options['course'])
+        else:
+            rows = export.signup_rows()
+        if options['output']:
+            output = open(options['output'], 'wb')
+            try:
+                export.write_csv(rows, output)
+            finally:
+                output.close()
+        else:
+            export.write_csv(rows, self.stdout)
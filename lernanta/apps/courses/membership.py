@@ -0,0 +1,133 @@
+"""
+Cached cohort membership of the courses.
+
+For each course the cache holds its cohort settings and a dict mapping
+the username of every current member to their role, so permission checks
+and the course pages need no query once it is loaded. Signup dates are
+only needed by a few pages and are loaded on demand. The entries are
+dropped by the courses.models functions changing a cohort or its members.
+"""
+from django.core.cache import cache
+
+from courses import db
+
+MEMBERSHIP_KEY = 'courses_membership_%s'
+MEMBERSHIP_TIMEOUT = 60 * 60 * 24
+
+
+def _username(user):
+    """Username of a user given as a username, a user uri or a user."""
+    if hasattr(user, 'username'):
+        return user.username
+    return user.strip('/').split('/')[-1]
+
+
+class CohortMembership(object):
+
+    def __init__(self, course_id, cohort_id, term, signup, start_date,
+            end_date, roles, uris):
+        self.course_id = course_id
+        self.cohort_id = cohort_id
+        self.term = term
+        self.signup = signup
+        self.start_date = start_date
+        self.end_date = end_date
+        self.roles = roles
+        self.uris = uris
+        self._signup_dates = None
+
+    @property
+    def uri(self):
+        return "/uri/cohort/{0}".format(self.cohort_id)
+
+    def role_of(self, user):
+        """Role of a current member, or None."""
+        return self.roles.get(_username(user))
+
+    def is_member(self, user):
+        return _username(user) in self.roles
+
+    def is_organizer(self, user):
+        return self.role_of(user) == db.CohortSignup.ORGANIZER
+
+    def get_signup_dates(self):
+        """Signup date of every current member, by username."""
+        if self._signup_dates is None:
+            signups = db.CohortSignup.objects.no_cache().filter(
+                cohort=self.cohort_id, leave_date__isnull=True).values_list(
+                'user_uri', 'signup_date')
+            self._signup_dates = dict((_username(user_uri), signup_date)
+                for user_uri, signup_date in signups)
+        return self._signup_dates
+
+    def as_cohort(self, signup_dates=False):
+        """The cohort in the format of courses.models.get_cohort."""
+        cohort = {
+            "uri": self.uri,
+            "course_uri": "/uri/course/{0}".format(self.course_id),
+            "term": self.term,
+            "signup": self.signup,
+        }
+        if self.term != db.Cohort.ROLLING:
+            cohort["start_date"] = self.start_date.date()
+            cohort["end_date"] = self.end_date.date()
+
+        cohort["users"] = {}
+        cohort["organizers"] = []
+        dates = self.get_signup_dates() if signup_dates else {}
+        for username, role in self.roles.iteritems():
+            cohort["users"][username] = {
+                "username": username,
+                "uri": self.uris[username],
+                "role": role,
+            }
+            if username in dates:
+                cohort["users"][username]["signup_date"] = dates[username]
+            key = "{0}s".format(role.lower())
+            cohort.setdefault(key, []).append(username)
+        return cohort
+
+
+def _load_membership(course_id):
+    cohorts = db.Cohort.objects.no_cache().filter(
+        course=course_id).values_list('id', 'term', 'signup', 'start_date',
+        'end_date')
+    cohorts = list(cohorts[:2])
+    if len(cohorts) != 1:
+        return None
+    cohort_id, term, signup, start_date, end_date = cohorts[0]
+    roles = {}
+    uris = {}
+    signups = db.CohortSignup.objects.no_cache().filter(cohort=cohort_id,
+        leave_date__isnull=True).values_list('user_uri', 'role')
+    for user_uri, role in signups:
+        username = _username(user_uri)
+        roles[username] = role
+        uris[username] = user_uri
+    return {
+        'course_id': course_id,
+        'cohort_id': cohort_id,
+        'term': term,
+        'signup': signup,
+        'start_date': start_date,
+        'end_date': end_date,
+        'roles': roles,
+        'uris': uris,
+    }
+
+
+def get_membership(course_id):
+    """Return the CohortMembership of a course, or None if the course does
+    not have exactly one cohort."""
+    key = MEMBERSHIP_KEY % course_id
+    data = cache.get(key)
+    if data is None:
+        data = _load_membership(int(course_id))
+        if data is None:
+            return None
+        cache.set(key, data, MEMBERSHIP_TIMEOUT)
+    return CohortMembership(**data)
+
+
+def invalidate_membership(course_id):
+    cache.delete(MEMBERSHIP_KEY % course_id)
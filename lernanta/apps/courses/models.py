@@ -1,13 +1,17 @@
 import simplejson as json
 import datetime
+import uuid
 
 from django.utils.translation import ugettext as _
 from django.contrib.sites.models import Site
+from django.db import connection, transaction
+from django.db.models import Max
 
 from l10n.urlresolvers import reverse
 
 from drumbeat.utils import slugify
 from courses import db
+from courses import membership
 from content2 import models as content_model
 from replies import models as comment_model
 from learn import models as learn_model
@@ -19,6 +23,9 @@ from users.models import UserProfile #NOTE: don't like this dep
 import logging
 log = logging.getLogger(__name__)
 
+# Courses with more content than this are cloned by a background job.
+BULK_JOB_THRESHOLD = 100
+
 
 class ResourceNotFoundException(Exception):
     pass
@@ -108,28 +115,42 @@ def get_courses(title=None, hashtag=None, language=None, organizer_uri=None, dra
     return [ get_course(course_id2uri(course_db.id)) for course_db in results ]
 
 
-def get_user_courses(user_uri):
-    """ return courses organized or participated in by an user """
-    signups = db.CohortSignup.objects.filter(user_uri=user_uri, leave_date__isnull=True, cohort__course__archived=False)
+def get_user_signups(user_uri):
+    """ return the courses an user is signed up to with the role, using a
+        single join and one query for the images """
+    signups = db.CohortSignup.objects.filter(user_uri=user_uri,
+        leave_date__isnull=True, cohort__course__archived=False,
+        cohort__course__deleted=False).values_list('role',
+        'cohort__course__id', 'cohort__course__title',
+        'cohort__course__image_uri')
+    signups = list(signups)
+    images = media_model.get_images(
+        [image_uri for role, id, title, image_uri in signups if image_uri])
     courses = []
-    for signup in signups:
-        try:
-            course = get_course(course_id2uri(signup.cohort.course.id))
-        except ResourceDeletedException:
-            continue
+    for role, course_id, title, image_uri in signups:
         course_data = {
-            "id": course['id'],
-            "title": course['title'],
-            "user_role": signup.role,
-            "url": reverse("courses_show", kwargs={"course_id": course["id"], "slug": course["slug"]}),
+            "id": course_id,
+            "title": title,
+            "slug": slugify(title),
+            "user_role": role,
         }
-        if "image_uri" in course:
-            course_data["image_url"] = media_model.get_image(course['image_uri'])['url']
+        if image_uri in images:
+            course_data["image_url"] = images[image_uri]['url']
         courses += [course_data]
     return courses
 
 
-def create_course(title, hashtag, description, language, organizer_uri, based_on_uri=None):
+def get_user_courses(user_uri):
+    """ return courses organized or participated in by an user """
+    courses = []
+    for course_data in get_user_signups(user_uri):
+        course_data["url"] = reverse("courses_show", kwargs={
+            "course_id": course_data["id"], "slug": course_data.pop("slug")})
+        courses += [course_data]
+    return courses
+
+
+def _create_course_db(title, hashtag, description, language, organizer_uri, based_on_uri=None):
     course_db = db.Course(
         title=title,
         short_title=hashtag,
@@ -143,43 +164,82 @@ def create_course(title, hashtag, description, language, organizer_uri, based_on
         course_db.based_on = based_on
 
     course_db.save()
+    return course_db
+
+
+def create_course(title, hashtag, description, language, organizer_uri, based_on_uri=None):
+    course_db = _create_course_db(title, hashtag, description, language,
+        organizer_uri, based_on_uri)
+    course_uri = course_id2uri(course_db.id)
 
     about = content_model.create_content(
        **{"title": _("About"), "content": "", "author_uri": organizer_uri}
     )
-    add_course_content("/uri/course/{0}".format(course_db.id), about['uri'])
-    create_course_cohort("/uri/course/{0}".format(course_db.id), organizer_uri)
-    course = get_course("/uri/course/{0}".format(course_db.id))
-
-    learn_api_data = get_course_learn_api_data(course['uri'])
-    learn_model.add_course_listing(**learn_api_data)
-    learn_model.add_course_to_list(learn_api_data['course_url'], "drafts")
+    add_course_content(course_uri, about['uri'])
+    create_course_cohort(course_uri, organizer_uri)
+    queue_course_learn_sync(course_uri)
 
     # TODO notify admins
-    return course
+    return get_course(course_uri)
 
 
 def clone_course(course_uri, organizer_uri):
-    original_course = get_course(course_uri)
-    new_course = create_course(
-        original_course['title'],
-        original_course['hashtag'],
-        original_course['description'],
-        original_course['language'],
-        organizer_uri,
-        course_uri
-    )
+    """ copy a course with all its content, in one transaction and with the
+        content inserted in batches """
+    new_course_uri = _clone_course(course_uri, organizer_uri)
+    queue_course_learn_sync(new_course_uri)
+    return get_course(new_course_uri)
+
+
+@transaction.commit_on_success
+def _clone_course(course_uri, organizer_uri):
+    original_db = _get_course_db(course_uri)
+    content_uris = list(original_db.content.order_by('index').values_list(
+        'content_uri', flat=True))
+    course_db = _create_course_db(original_db.title, original_db.short_title,
+        original_db.description, original_db.language, organizer_uri,
+        course_uri)
+    new_course_uri = course_id2uri(course_db.id)
+    # The about content is cloned too, at index 0.
+    add_course_contents(new_course_uri,
+        content_model.clone_contents(content_uris))
+    create_course_cohort(new_course_uri, organizer_uri)
+    return new_course_uri
+
+
+def start_bulk_job(task, *args):
+    """ run a courses.tasks bulk task in the background and return the id
+        used to poll its status with get_bulk_job """
+    job_id = uuid.uuid4().hex
+    db.BulkJob.objects.create(job_id=job_id, status=db.BulkJob.PENDING)
+    task.apply_async(args=(job_id,) + args)
+    return job_id
+
 
-    new_about = content_model.clone_content(original_course['about_uri'])
-    about_db = db.CourseContent.objects.get(content_uri=new_course['about_uri'])
-    about_db.content_uri = new_about['uri']
-    about_db.save()
+def update_bulk_job(job_id, status, course_uri=None):
+    db.BulkJob.objects.filter(job_id=job_id).update(status=status,
+        course_uri=course_uri or '')
 
-    for content in original_course['content']:
-        new_content = content_model.clone_content(content['uri'])
-        add_course_content(new_course['uri'], new_content['uri'])
 
-    return get_course(new_course['uri'])
+def get_bulk_job(job_id):
+    """ return the status ('pending', 'running', 'done' or 'failed') and,
+        once done, the course_uri of a bulk job, or None if the job is
+        unknown """
+    jobs = db.BulkJob.objects.no_cache().filter(job_id=job_id).values(
+        'status', 'course_uri')
+    for job in jobs:
+        return job
+    return None
+
+
+def start_clone_course(course_uri, organizer_uri):
+    """ clone a course in the background, see start_bulk_job """
+    from courses.tasks import CloneCourse
+    return start_bulk_job(CloneCourse, course_uri, organizer_uri)
+
+
+def get_course_content_count(course_uri):
+    return _get_course_db(course_uri).content.count()
 
 
 def update_course(course_uri, title=None, hashtag=None, description=None, language=None, image_uri=None):
@@ -211,6 +271,38 @@ def update_course_learn_api(course_uri):
         log.error("Could not update learn index information!")
 
 
+def queue_course_learn_sync(course_uri):
+    """ add or update the learn index listing of a course in the
+        background """
+    from courses.tasks import SyncCourseLearnIndex
+    SyncCourseLearnIndex.apply_async(args=(course_uri,))
+
+
+def sync_course_learn_index(course_uri):
+    """ add or update the learn index listing of a course and put it in the
+        list matching its status """
+    learn_api_data = get_course_learn_api_data(course_uri)
+    course_url = learn_api_data['course_url']
+    try:
+        learn_model.update_course_listing(**learn_api_data)
+    except learn_model.db.Course.DoesNotExist:
+        learn_model.add_course_listing(**learn_api_data)
+
+    course_db = _get_course_db(course_uri)
+    status_list = "listed"
+    if course_db.archived:
+        status_list = "archived"
+    elif course_db.draft:
+        status_list = "drafts"
+    lists = [course_list['name'] for course_list in
+        learn_model.get_lists_for_course(course_url)]
+    for list_name in ("listed", "archived", "drafts"):
+        if list_name in lists and list_name != status_list:
+            learn_model.remove_course_from_list(course_url, list_name)
+    if status_list not in lists:
+        learn_model.add_course_to_list(course_url, status_list)
+
+
 def get_course_learn_api_data(course_uri):
     """ return data used by the learn API to list courses """
     course = get_course(course_uri)
@@ -346,11 +438,13 @@ def delete_spam_course(course_uri):
     
 
 def get_course_content(course_uri):
-    content = []
-    course_id = course_uri2id(course_uri)
     course_db = _get_course_db(course_uri)
-    for course_content_db in course_db.content.order_by('index'):
-        content_data = content_model.get_content(course_content_db.content_uri)
+    course_contents = list(course_db.content.order_by('index'))
+    contents = content_model.get_contents(
+        [course_content_db.content_uri for course_content_db in course_contents])
+    content = []
+    for course_content_db in course_contents:
+        content_data = contents[course_content_db.content_uri]
         content += [{
             "id": content_data["id"],
             "uri": content_data["uri"],
@@ -361,20 +455,29 @@ def get_course_content(course_uri):
 
 
 def add_course_content(course_uri, content_uri):
-    course_id = course_uri2id(course_uri)
+    add_course_contents(course_uri, [content_uri])
+
+
+def add_course_contents(course_uri, content_uris):
+    """ append content to a course, inserting the rows in batches """
     course_db = _get_course_db(course_uri)
-    next_index = 0
-    try:
-        next_index = db.CourseContent.objects.filter(course = course_db).order_by('-index')[0].index + 1
-    except:
-        # TODO
-        pass
-    course_content_db = db.CourseContent(
-        course=course_db,
-        content_uri=content_uri,
-        index=next_index
-    )
-    course_content_db.save()
+    last_index = course_db.content.aggregate(Max('index'))['index__max']
+    next_index = 0 if last_index is None else last_index + 1
+
+    qn = connection.ops.quote_name
+    columns = ('course_id', 'content_uri', 'index')
+    sql = 'INSERT INTO %s (%s) VALUES (%s)' % (
+        qn(db.CourseContent._meta.db_table),
+        ', '.join([qn(column) for column in columns]),
+        ', '.join(['%s'] * len(columns)))
+    rows = [(course_db.id, content_uri, next_index + i)
+        for i, content_uri in enumerate(content_uris)]
+    cursor = connection.cursor()
+    for start in range(0, len(rows), content_model.BULK_INSERT_SIZE):
+        cursor.executemany(sql, rows[start:start + content_model.BULK_INSERT_SIZE])
+    transaction.commit_unless_managed()
+    # Flushes the cached content queries of the course.
+    db.Course.objects.invalidate(course_db)
 
 
 def remove_course_content(course_uri, content_uri):
@@ -449,6 +552,7 @@ def create_course_cohort(course_uri, organizer_uri):
         signup=db.Cohort.CLOSED
     )
     cohort_db.save()
+    membership.invalidate_membership(course_db.id)
     try:
         cohort = get_course_cohort(course_uri)
     except:
@@ -459,17 +563,20 @@ def create_course_cohort(course_uri, organizer_uri):
     return get_course_cohort(course_uri)
 
 
-def get_course_cohort_uri(course_uri):
-    course_db = _get_course_db(course_uri)
-    try:
-        cohort_db = db.Cohort.objects.get(course=course_db)
-    except:
+def get_course_membership(course_uri):
+    """ return the cached courses.membership.CohortMembership of a course """
+    course_membership = membership.get_membership(course_uri2id(course_uri))
+    if course_membership is None:
         raise DataIntegrityException
-    return "/uri/cohort/{0}".format(cohort_db.id)
+    return course_membership
+
+
+def get_course_cohort_uri(course_uri):
+    return get_course_membership(course_uri).uri
 
 
 def get_course_cohort(course_uri):
-    return get_cohort(get_course_cohort_uri(course_uri))
+    return get_course_membership(course_uri).as_cohort(signup_dates=True)
 
 
 def _get_cohort_db(cohort_uri):
@@ -481,39 +588,17 @@ def _get_cohort_db(cohort_uri):
     return cohort_db
 
 
-def get_cohort(cohort_uri):
-    cohort_db = _get_cohort_db(cohort_uri)
+def _get_cohort_membership(cohort_uri):
+    cohort_id = cohort_uri.strip('/').split('/')[-1]
+    course_ids = db.Cohort.objects.filter(id=cohort_id).values_list(
+        'course_id', flat=True)
+    if not course_ids:
+        raise ResourceNotFoundException
+    return get_course_membership(course_id2uri(course_ids[0]))
 
-    cohort_data = {
-        "uri": "/uri/cohort/{0}".format(cohort_db.id),
-        "course_uri": "/uri/course/{0}".format(cohort_db.course_id),
-        "term": cohort_db.term,
-        "signup": cohort_db.signup,
-    }
-    #NOTE: fetching course + cohort twice when using get_course_cohort
-    #NOTE-Q: does cohort.course.id fetch the course data?
-    #NOTE-A: Yes, cohort.course_id doesn't
-
-    if cohort_db.term != db.Cohort.ROLLING:
-        cohort_data["start_date"] = cohort_db.start_date.date()
-        cohort_data["end_date"] = cohort_db.end_date.date()
-
-    cohort_data["users"] = {}
-    cohort_data["organizers"] = []
-    for signup in cohort_db.signup_set.filter(leave_date__isnull=True):
-        username = signup.user_uri.strip('/').split('/')[-1]
-        cohort_data["users"][username] = {
-            "username": username,
-            "uri": signup.user_uri,
-            "role": signup.role,
-            "signup_date": signup.signup_date
-        }
-        key = "{0}s".format(signup.role.lower())
-        if not key in cohort_data:
-            cohort_data[key] = []
-        cohort_data[key] += [username]
 
-    return cohort_data  
+def get_cohort(cohort_uri):
+    return _get_cohort_membership(cohort_uri).as_cohort(signup_dates=True)
 
 
 def get_cohort_size( uri ):
@@ -533,20 +618,16 @@ def update_cohort( uri, term=None, signup=None, start_date=None, end_date=None )
     if end_date:
         cohort_db.end_date = end_date
     cohort_db.save()
+    membership.invalidate_membership(cohort_db.course_id)
     return get_cohort(uri)
 
 
 def user_in_cohort(user_uri, cohort_uri):
-    cohort_db = _get_cohort_db(cohort_uri)
-    return cohort_db.signup_set.filter(
-        user_uri=user_uri, leave_date__isnull=True).exists()
+    return _get_cohort_membership(cohort_uri).is_member(user_uri)
 
 
 def is_cohort_organizer(user_uri, cohort_uri):
-    cohort_db = _get_cohort_db(cohort_uri)
-    return cohort_db.signup_set.filter(
-        user_uri=user_uri, leave_date__isnull=True,
-        role=db.CohortSignup.ORGANIZER).exists()
+    return _get_cohort_membership(cohort_uri).is_organizer(user_uri)
 
 
 def add_user_to_cohort(cohort_uri, user_uri, role, notify_organizers=False):
@@ -565,6 +646,7 @@ def add_user_to_cohort(cohort_uri, user_uri, role, notify_organizers=False):
         role=role
     )
     signup_db.save()
+    membership.invalidate_membership(cohort_db.course_id)
 
     if notify_organizers:
         cohort = get_cohort(cohort_uri)
@@ -609,6 +691,7 @@ def remove_user_from_cohort(cohort_uri, user_uri):
 
     user_signup_db.leave_date = datetime.datetime.utcnow()
     user_signup_db.save()
+    membership.invalidate_membership(cohort_db.course_id)
     return True, None
 
 
@@ -0,0 +1,55 @@
+from celery.task import Task
+
+from courses import models as course_model
+from courses.db import BulkJob
+
+
+class SyncCourseLearnIndex(Task):
+    """Add or update the learn index listing and lists of a course."""
+    name = 'courses.tasks.SyncCourseLearnIndex'
+
+    def run(self, course_uri, **kwargs):
+        log = self.get_logger(**kwargs)
+        try:
+            course_model.sync_course_learn_index(course_uri)
+        except course_model.ResourceDeletedException:
+            return
+        except:
+            log.error('Could not update course info in the learn API')
+
+
+class CloneCourse(Task):
+    """Clone a course for the polling started by
+    courses.models.start_clone_course."""
+    name = 'courses.tasks.CloneCourse'
+
+    def run(self, job_id, course_uri, organizer_uri, **kwargs):
+        log = self.get_logger(**kwargs)
+        course_model.update_bulk_job(job_id, BulkJob.RUNNING)
+        try:
+            course = course_model.clone_course(course_uri, organizer_uri)
+        except:
+            log.error('Could not clone course %s' % course_uri)
+            course_model.update_bulk_job(job_id, BulkJob.FAILED)
+            raise
+        course_model.update_bulk_job(job_id, BulkJob.DONE, course['uri'])
+
+
+class ImportProject(Task):
+    """Import a project as a course for the polling started by
+    courses.utils.start_import_project."""
+    name = 'courses.tasks.ImportProject'
+
+    def run(self, job_id, project_id, hashtag, organizer_uri, **kwargs):
+        from projects.models import Project
+        from courses import utils
+        log = self.get_logger(**kwargs)
+        course_model.update_bulk_job(job_id, BulkJob.RUNNING)
+        try:
+            project = Project.objects.get(id=project_id)
+            course = utils.import_project(project, hashtag, organizer_uri)
+        except:
+            log.error('Could not import project %s' % project_id)
+            course_model.update_bulk_job(job_id, BulkJob.FAILED)
+            raise
+        course_model.update_bulk_job(job_id, BulkJob.DONE, course['uri'])
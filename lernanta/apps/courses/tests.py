@@ -5,8 +5,10 @@ from users.models import create_profile
 from test_utils import TestCase
 
 from courses import models as course_model
+from courses import export
+from courses.tasks import CloneCourse
 from content2 import models as content_model
-from mock import patch
+from mock import patch, Mock
 
 
 class CourseTests(TestCase):
@@ -117,6 +119,25 @@ class CourseTests(TestCase):
     def test_remove_user(self):
         pass
 
+    def test_membership_role_of(self):
+        membership = course_model.get_course_membership(self.course['uri'])
+        self.assertEqual(membership.role_of('/uri/user/testuser'), 'ORGANIZER')
+        self.assertEqual(membership.role_of('bob'), None)
+
+        cohort_uri = membership.uri
+        course_model.add_user_to_cohort(cohort_uri, '/uri/user/bob', 'LEARNER')
+        membership = course_model.get_course_membership(self.course['uri'])
+        self.assertEqual(membership.role_of('bob'), 'LEARNER')
+        self.assertIn('bob', membership.get_signup_dates())
+
+        course_model.remove_user_from_cohort(cohort_uri, '/uri/user/bob')
+        membership = course_model.get_course_membership(self.course['uri'])
+        self.assertFalse(membership.is_member('bob'))
+
+        course_model.update_cohort(cohort_uri, signup='OPEN')
+        membership = course_model.get_course_membership(self.course['uri'])
+        self.assertEqual(membership.signup, 'OPEN')
+
     def test_make_organizer(self):
         pass
 
@@ -151,6 +172,47 @@ class CourseTests(TestCase):
             self.assertEqual(clone['content'][i]['title'], self.course['content'][i]['title'])
             self.assertEqual(clone['content'][i]['content'], self.course['content'][i]['content'])
 
+    def test_clone_course_content(self):
+        uris = content_model.create_contents([
+            {"title": "Page %d" % i, "content": "Content %d" % i,
+                "author_uri": '/uri/user/testuser'} for i in range(3)])
+        course_model.add_course_contents(self.course['uri'], uris)
+        clone = course_model.clone_course(self.course['uri'], '/uri/user/bob/')
+        self.assertEqual([content['index'] for content in clone['content']],
+            [1, 2, 3])
+        for i, content in enumerate(clone['content']):
+            self.assertNotEqual(content['uri'], uris[i])
+            cloned = content_model.get_content(content['uri'])
+            self.assertEqual(cloned['title'], "Page %d" % i)
+            self.assertEqual(cloned['content'], "Content %d" % i)
+        clone_about = content_model.get_content(clone['about_uri'])
+        self.assertEqual(clone_about['content'], 'This is the about content')
+
+    def test_bulk_job_status(self):
+        task = Mock()
+        job_id = course_model.start_bulk_job(task, self.course['uri'],
+            '/uri/user/bob/')
+        self.assertEqual(course_model.get_bulk_job(job_id)['status'],
+            'pending')
+        CloneCourse().run(*task.apply_async.call_args[1]['args'])
+        job = course_model.get_bulk_job(job_id)
+        self.assertEqual(job['status'], 'done')
+        clone = course_model.get_course(job['course_uri'])
+        self.assertEqual(clone['title'], self.course['title'])
+        self.assertEqual(course_model.get_bulk_job('0' * 32), None)
+
+    def test_export_course_emails(self):
+        cohort = course_model.get_course_cohort(self.course['uri'])
+        course_model.add_user_to_cohort(cohort['uri'], '/uri/user/bob', 'LEARNER')
+        rows = list(export.course_email_rows(self.course['id']))
+        self.assertEqual(rows[0], ["username", "email address", "signup date"])
+        self.assertEqual([row[:2] for row in rows[1:]],
+            [[self.test_username, self.test_email],
+            [self.test_username2, self.test_email2]])
+        lines = list(export.csv_lines(rows))
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[2].startswith('bob,bob@mail.org,'))
+
     def test_delete_spam_course(self):
         course = course_model.create_course(
             **{
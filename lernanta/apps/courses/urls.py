@@ -12,6 +12,10 @@ urlpatterns = patterns('',
         'courses.views.clone_course',
         name='courses_clone'),
 
+    url(r'^jobs/(?P<job_id>[\da-f]+)/$',
+        'courses.views.bulk_job',
+        name='courses_bulk_job'),
+
     url(r'^(?P<course_id>[\d]+)/$',
         'courses.views.course_slug_redirect',
         name='courses_slug_redirect'),
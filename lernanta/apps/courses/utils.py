@@ -1,35 +1,62 @@
+from django.db import transaction
+
 import courses.models as course_model
 import content2.models as content_model
 from content2 import utils as content_utils
 
-def import_project(project, hashtag):
-    course = {}
-    course['title'] = project.name
-    course['hashtag'] = hashtag
-    course['description'] = project.short_description
-    course['language'] = project.language
-    user_uri = "/uri/user/{0}".format(project.participations.filter(organizing=True).order_by('joined_on')[0].user.username)
-    course['organizer_uri'] = user_uri
 
-    course = course_model.create_course(**course)
+def _get_import_pages(project):
+    return project.pages.filter(deleted=False, listed=True).order_by('index')
+
+
+def import_project(project, hashtag, organizer_uri=None):
+    """ copy a project and its listed pages into a new course, inserting the
+        pages in batches. The optional organizer_uri is added as organizer
+        next to the first organizer of the project """
+    course_uri = _import_project(project, hashtag, organizer_uri)
+    course_model.queue_course_learn_sync(course_uri)
+    return course_model.get_course(course_uri)
+
+
+@transaction.commit_on_success
+def _import_project(project, hashtag, organizer_uri):
+    user_uri = "/uri/user/{0}".format(project.participations.filter(organizing=True).order_by('joined_on')[0].user.username)
+    course_db = course_model._create_course_db(project.name, hashtag,
+        project.short_description, project.language, user_uri)
+    course_uri = course_model.course_id2uri(course_db.id)
 
-    # update about page
-    about = {
-        "uri": course['about_uri'],
+    contents = [{
         "title": "About",
         "content": project.long_description,
         "author_uri": user_uri,
-    }
-    content_model.update_content(**about)
-
-    # add other pages to course
-    for page in project.pages.filter(deleted=False, listed=True).order_by('index'):
-        content = {
+    }]
+    pages = list(_get_import_pages(project).select_related('author'))
+    cleaned = content_utils.clean_user_contents(
+        [page.content for page in pages])
+    for page, content in zip(pages, cleaned):
+        contents.append({
             "title": page.title,
-            "content": content_utils.clean_user_content(page.content),
+            "content": content,
             "author_uri": "/uri/user/{0}".format(page.author.username),
-        }
-        content = content_model.create_content(**content)
-        course_model.add_course_content(course['uri'], content['uri'])
+        })
+    course_model.add_course_contents(course_uri,
+        content_model.create_contents(contents))
+
+    course_model.create_course_cohort(course_uri, user_uri)
+    if organizer_uri:
+        cohort = course_model.get_course_cohort(course_uri)
+        course_model.add_user_to_cohort(cohort['uri'], organizer_uri,
+            course_model.db.CohortSignup.ORGANIZER)
+    return course_uri
+
+
+def start_import_project(project, hashtag, organizer_uri=None):
+    """ import a project in the background, see
+        courses.models.start_bulk_job """
+    from courses.tasks import ImportProject
+    return course_model.start_bulk_job(ImportProject, project.id, hashtag,
+        organizer_uri)
+
 
-    return course
+def needs_bulk_job(project):
+    return _get_import_pages(project).count() > course_model.BULK_JOB_THRESHOLD
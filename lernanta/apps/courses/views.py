@@ -1,5 +1,4 @@
 import logging
-import unicodecsv
 
 from django import http
 from django.shortcuts import render_to_response, get_object_or_404
@@ -13,7 +12,6 @@ from django.conf import settings
 
 from l10n.urlresolvers import reverse
 from users.decorators import login_required
-from users.models import UserProfile
 from drumbeat import messages
 
 from courses import models as course_model
@@ -26,6 +24,7 @@ from courses.forms import CohortSignupForm
 from courses.forms import CourseTagsForm
 from courses.forms import CourseEmbeddedUrlForm
 from courses.decorators import require_organizer
+from courses import export
 from courses.badges_oembed import add_content_from_response
 from courses.badges_oembed import BadgeNotFoundException
 
@@ -68,18 +67,16 @@ def _populate_course_context( request, course_id, context ):
     if 'image_uri' in course:
         context['course']['image'] = media_model.get_image(course['image_uri'])
 
-    #NOTE if performance becomes a problem dont fetch cohort
-    cohort = course_model.get_course_cohort(course_uri)
+    course_membership = course_model.get_course_membership(course_uri)
+    cohort = course_membership.as_cohort()
     context['cohort'] = cohort
     user_uri = u"/uri/user/{0}".format(request.user.username)
-    context['organizer'] = course_model.is_cohort_organizer(
-        user_uri, cohort['uri']
-    )
+    context['organizer'] = course_membership.is_organizer(user_uri)
     context['organizer'] |= request.user.is_superuser
     context['admin'] = request.user.is_superuser
     context['can_edit'] = context['organizer'] and not course['status'] == 'archived'
     context['trusted_user'] = request.user.has_perm('users.trusted_user')
-    if course_model.user_in_cohort(user_uri, cohort['uri']):
+    if course_membership.is_member(user_uri):
         if not context['organizer']:
             context['show_leave_course'] = True
         context['learner'] = True
@@ -139,10 +136,12 @@ def import_project( request, project_slug ):
     from projects.models import Project
     project = get_object_or_404(Project, slug=project_slug)
     from courses import utils
-    course = utils.import_project(project, project.name[:3])
-    cohort = course_model.get_course_cohort(course['uri'])
     user_uri = u"/uri/user/{0}".format(request.user.username)
-    course_model.add_user_to_cohort(cohort['uri'], user_uri, "ORGANIZER")
+    if utils.needs_bulk_job(project):
+        job_id = utils.start_import_project(project, project.name[:3], user_uri)
+        return http.HttpResponseRedirect(
+            reverse('courses_bulk_job', kwargs={'job_id': job_id}))
+    course = utils.import_project(project, project.name[:3], user_uri)
     return course_slug_redirect(request, course['id'])
 
 
@@ -150,10 +149,28 @@ def import_project( request, project_slug ):
 def clone_course( request, course_id ):
     course_uri = course_model.course_id2uri(course_id)
     user_uri = u"/uri/user/{0}".format(request.user.username)
+    if course_model.get_course_content_count(course_uri) > course_model.BULK_JOB_THRESHOLD:
+        job_id = course_model.start_clone_course(course_uri, user_uri)
+        return http.HttpResponseRedirect(
+            reverse('courses_bulk_job', kwargs={'job_id': job_id}))
     course = course_model.clone_course(course_uri, user_uri)
     return course_slug_redirect(request, course['id'])
 
 
+def bulk_job( request, job_id ):
+    """ wait for a clone or import job, as a page refreshing itself or as
+        JSON for ajax polling """
+    job = course_model.get_bulk_job(job_id)
+    if job is None:
+        raise http.Http404
+    if request.is_ajax():
+        return http.HttpResponse(json.dumps(job), mimetype="application/json")
+    if job['status'] == course_model.db.BulkJob.DONE:
+        return course_slug_redirect(request, course_model.course_uri2id(job['course_uri']))
+    return render_to_response('courses/bulk_job.html', {'job': job},
+        context_instance=RequestContext(request))
+
+
 def course_slug_redirect( request, course_id ):
     course_uri = course_model.course_id2uri(course_id)
     course = _get_course_or_404(course_uri)
@@ -384,12 +401,11 @@ def course_add_user( request, course_id ):
 
 @login_required
 def course_leave( request, course_id, username ):
-    cohort_uri = course_model.get_course_cohort_uri(course_id)
+    course_membership = course_model.get_course_membership(course_id)
+    cohort_uri = course_membership.uri
     user_uri = u"/uri/user/{0}".format(request.user.username)
     # TODO site admin should also be able to remove users
-    is_organizer = course_model.is_cohort_organizer(
-        user_uri, cohort_uri
-    )
+    is_organizer = course_membership.is_organizer(user_uri)
     removed = False
     error_message = _("Could not remove user")
     if username == request.user.username or is_organizer:
@@ -411,11 +427,10 @@ def course_leave( request, course_id, username ):
 @require_http_methods(['POST'])
 @require_organizer
 def course_add_organizer( request, course_id, username ):
-    cohort_uri = course_model.get_course_cohort_uri(course_id)
+    course_membership = course_model.get_course_membership(course_id)
+    cohort_uri = course_membership.uri
     user_uri = u"/uri/user/{0}".format(request.user.username)
-    is_organizer = course_model.is_cohort_organizer(
-        user_uri, cohort_uri
-    )
+    is_organizer = course_membership.is_organizer(user_uri)
     if not is_organizer and not request.user.is_superuser:
         messages.error( request, _("Only other organizers can add a new organizer") )
         return course_slug_redirect( request, course_id)
@@ -575,20 +590,12 @@ def course_export_emails( request, course_id ):
         msg = _('You do not have permission to view this page')
         return http.HttpResponseForbidden(msg)
     
-    course_uri = course_model.course_id2uri(course_id)
-    cohort = course_model.get_course_cohort(course_uri)
-
-    response = http.HttpResponse(mimetype='text/csv')
+    # Streamed, so the cohort is never loaded at once.
+    response = http.HttpResponse(
+        export.csv_lines(export.course_email_rows(course_id)),
+        mimetype='text/csv')
     response['Content-Disposition'] = 'attachment; '
     response['Content-Disposition'] += 'filename=detailed_report.csv'
-    writer = unicodecsv.writer(response)
-    writer.writerow(["username", "email address", "signup date"])
-
-    for user in cohort['users'].values():
-        username = user['uri'].strip('/').split('/')[-1]
-        user['email'] = UserProfile.objects.get(username=username).email
-        writer.writerow([username, user['email'], user['signup_date']])
-
     return response
 
 
@@ -1,5 +1,3 @@
-import random
-
 from django.conf import settings
 from django.shortcuts import render_to_response
 from django.template import RequestContext
@@ -14,29 +12,20 @@ from users.decorators import login_required
 from users.models import UserProfile
 from users.forms import CreateProfileForm
 from projects.models import Project
-from news.models import FeedEntry
 from drumbeat import messages
 from activity.views import filter_activities
 from pagination.views import get_pagination_context
 from tracker import models as tracker_models
 from links.models import Link
-from learn.models import get_courses_by_list
+from homepage.fragments import get_fragment, get_featured_courses
 
 
 def splash(request):
     """Splash page we show to users who are not authenticated."""
-    courses = get_courses_by_list("community")
-    featured_count = min(4,len(courses))
-    courses = random.sample(courses, featured_count)
-    activities = Activity.objects.public()
-    feed_entries = FeedEntry.objects.filter(
-        page='splash').order_by('-created_on')[0:4]
-    feed_url = settings.FEED_URLS['splash']
     context = {
-        'activities': activities,
-        'featured_projects': courses,
-        'feed_entries': feed_entries,
-        'feed_url': feed_url,
+        'featured_projects': get_featured_courses('community', 4),
+        'feed_html': get_fragment('splash_feed'),
+        'feed_url': settings.FEED_URLS['splash'],
         'domain': Site.objects.get_current().domain,
     }
     context.update(tracker_models.get_google_tracking_context())
@@ -0,0 +1,61 @@
+"""
+Redirects from the paths of the old Drupal site.
+
+Requests that end in a 404 are redirected to DRUPAL_URL if their path is
+in the local ``LegacyUrl`` map. Lookups are memoized per process, including
+the misses, so crawlers hitting dead URLs cost at most one indexed query
+per path and ``NEGATIVE_TIMEOUT``. Unknown paths are probed on the old
+site by a background task (at most once per ``PROBE_INTERVAL``) and added
+to the map when they exist.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.encoding import smart_str
+
+from drumbeat.models import LegacyUrl
+from drumbeat.utils import LRUCache
+
+# Seconds a miss is remembered by each process.
+NEGATIVE_TIMEOUT = 60 * 10
+# Seconds before an unknown path can be probed again.
+PROBE_INTERVAL = 60 * 60 * 24
+PROBE_KEY = 'drumbeat_legacy_probe_%s'
+# Seconds the background probe waits for the old site.
+PROBE_TIMEOUT = 5
+
+# Maps paths to (found, expiry time or None).
+lookups = LRUCache(10000)
+
+
+def normalize_path(path):
+    """Key of ``path`` in the map, the same with or without slashes."""
+    return path.strip('/')
+
+
+def get_legacy_url(path):
+    """Return the URL of ``path`` on the old site, or None if it is not
+    known to exist there (the path is then queued to be probed)."""
+    key = normalize_path(path)
+    if not key or len(key) > LegacyUrl._meta.get_field('path').max_length:
+        return None
+    found, expires = lookups.get(key, (None, None))
+    if found is None or (expires and expires < time.time()):
+        found = LegacyUrl.objects.no_cache().filter(path=key).exists()
+        expires = None if found else time.time() + NEGATIVE_TIMEOUT
+        lookups.set(key, (found, expires))
+        if not found:
+            queue_probe(path)
+    if found:
+        # The redirect keeps the path as requested.
+        return settings.DRUPAL_URL + path
+    return None
+
+
+def queue_probe(path):
+    key = PROBE_KEY % hashlib.md5(smart_str(normalize_path(path))).hexdigest()
+    if cache.add(key, True, PROBE_INTERVAL):
+        from drumbeat.tasks import ProbeLegacyUrl
+        ProbeLegacyUrl.apply_async(args=(path,))
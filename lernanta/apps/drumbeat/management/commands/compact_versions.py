@@ -0,0 +1,115 @@
+import random
+import time
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from content.models import PageVersion
+from content2 import db as content2_db
+from drumbeat import versions
+
+BENCHMARK_REVISIONS = 500
+
+
+class Command(BaseCommand):
+    help = ('Store the page and content versions as snapshots and deltas. '
+            'Run once after upgrading, it is safe to run again.')
+
+    option_list = BaseCommand.option_list + (
+        make_option('--benchmark', action='store_true', dest='benchmark',
+            default=False, help=('Report the storage size and rebuild time '
+            'of a synthetic %d revision page instead.' % (
+            BENCHMARK_REVISIONS))),
+    )
+
+    def handle(self, *args, **options):
+        if options['benchmark']:
+            self.benchmark()
+            return
+        before = after = 0
+        for page_id in PageVersion.objects.values_list('page_id',
+                flat=True).distinct().order_by():
+            sizes = self.compact(PageVersion, PageVersion.objects.filter(
+                page=page_id))
+            before += sizes[0]
+            after += sizes[1]
+        # The latest version of a content keeps its full content.
+        contents = content2_db.Content.objects.no_cache().values_list('id',
+            'latest_id')
+        for content_id, latest_id in contents.iterator():
+            sizes = self.compact(content2_db.ContentVersion,
+                content2_db.ContentVersion.objects.filter(
+                container=content_id).exclude(id=latest_id))
+            before += sizes[0]
+            after += sizes[1]
+        self.stdout.write('Stored %d characters of content in %d.\n' % (
+            before, after))
+
+    @transaction.commit_on_success
+    def compact(self, model, versions_db):
+        """Encode the versions of one document again, oldest first.
+        Returns the characters stored before and after."""
+        rows = list(versions_db.no_cache().select_related('base').order_by(
+            'id'))
+        texts = [versions.decode_version(row) for row in rows]
+        before = after = 0
+        changed = []
+        for row, text, (base_index, delta) in zip(rows, texts,
+                versions.encode_history(texts)):
+            before += len(row.content) + len(row.delta)
+            if base_index is None:
+                stored = (None, '', text)
+            else:
+                stored = (rows[base_index].id, delta, '')
+            after += len(stored[1]) + len(stored[2])
+            if stored != (row.base_id, row.delta, row.content):
+                model.objects.filter(id=row.id).update(base=stored[0],
+                    delta=stored[1], content=stored[2])
+                changed.append(row)
+        if changed:
+            model.objects.invalidate(*changed)
+        return before, after
+
+    def benchmark(self):
+        rng = random.Random(BENCHMARK_REVISIONS)
+        paragraphs = [u'<p>Paragraph %d. %s</p>\n' % (i,
+            u'Lorem ipsum dolor sit amet. ' * rng.randint(1, 4))
+            for i in range(60)]
+        texts = []
+        for revision in range(BENCHMARK_REVISIONS):
+            paragraphs[rng.randrange(len(paragraphs))] = (
+                u'<p>Revision %d. %s</p>\n' % (revision,
+                u'Consectetur adipiscing elit. ' * rng.randint(1, 4)))
+            if revision % 7 == 0:
+                paragraphs.insert(rng.randrange(len(paragraphs)),
+                    u'<p>Added in revision %d.</p>\n' % revision)
+            texts.append(u''.join(paragraphs))
+
+        start = time.time()
+        encoded = versions.encode_history(texts)
+        encode_time = time.time() - start
+        full_size = sum(len(text) for text in texts)
+        stored_size = sum(len(text) if delta is None else len(delta)
+            for text, (base_index, delta) in zip(texts, encoded))
+        snapshots = len([delta for base_index, delta in encoded
+            if delta is None])
+
+        rebuild_times = []
+        for text, (base_index, delta) in zip(texts, encoded):
+            if delta is None:
+                continue
+            start = time.time()
+            rebuilt = versions.apply_delta(texts[base_index], delta)
+            rebuild_times.append(time.time() - start)
+            assert rebuilt == text
+        self.stdout.write('%d revisions, %d snapshots.\n' % (len(texts),
+            snapshots))
+        self.stdout.write('Full copies: %d characters, stored: %d '
+            '(%.1f%%).\n' % (full_size, stored_size,
+            100.0 * stored_size / full_size))
+        self.stdout.write('Encoding: %.1f ms per revision.\n' % (
+            1000 * encode_time / len(texts)))
+        self.stdout.write('Rebuild: %.2f ms average, %.2f ms max.\n' % (
+            1000 * sum(rebuild_times) / len(rebuild_times),
+            1000 * max(rebuild_times)))
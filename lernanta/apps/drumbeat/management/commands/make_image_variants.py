@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db.models import get_models
+from django.db.models.fields.files import ImageField
+
+from drumbeat.storage import ImageStorage
+
+
+class Command(BaseCommand):
+    help = ('Make the resized variants of the images uploaded before '
+            'their image fields had variants. Run it after adding a '
+            'variant, pages link to the variants without checking them.')
+
+    def handle(self, *args, **options):
+        written = 0
+        for model in get_models():
+            for field in model._meta.fields:
+                if not isinstance(field, ImageField):
+                    continue
+                storage = field.storage
+                if not isinstance(storage, ImageStorage) or not storage.variants:
+                    continue
+                names = model._default_manager.exclude(**{
+                    field.name: ''}).exclude(**{
+                    field.name + '__isnull': True}).values_list(
+                    field.name, flat=True).distinct()
+                for name in names.iterator():
+                    if not storage.exists(name):
+                        continue
+                    try:
+                        written += storage.make_variants(name)
+                    except IOError as error:
+                        self.stdout.write('Skipped %s: %s\n' % (name, error))
+        self.stdout.write('Wrote %d image variant(s).\n' % written)
@@ -1,8 +1,8 @@
-import urllib
 import logging
 
 from django.http import HttpResponsePermanentRedirect
-from django.conf import settings
+
+from drumbeat.legacy import get_legacy_url
 
 log = logging.getLogger(__name__)
 
@@ -12,12 +12,9 @@ class NotFoundMiddleware(object):
     def process_response(self, request, response):
         if response.status_code == 404:
             # Handle old Drupal URLs
-            url = settings.DRUPAL_URL + request.path[4:]
-            log.error('Not found %s' % url)
-            try:
-                page = urllib.urlopen(url)
-                if page.getcode() != 404:
-                    return HttpResponsePermanentRedirect(url)
-            except UnicodeError:
-                pass
+            path = request.path[4:]
+            log.debug('Not found %s' % path)
+            url = get_legacy_url(path)
+            if url:
+                return HttpResponsePermanentRedirect(url)
         return response
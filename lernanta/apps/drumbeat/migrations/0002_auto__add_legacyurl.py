@@ -0,0 +1,33 @@
+# encoding: utf-8
+import datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        
+        # Adding model 'LegacyUrl'
+        db.create_table('drumbeat_legacyurl', (
+            ('id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('path', self.gf('django.db.models.fields.CharField')(unique=True, max_length=255)),
+        ))
+        db.send_create_signal('drumbeat', ['LegacyUrl'])
+
+
+    def backwards(self, orm):
+        
+        # Deleting model 'LegacyUrl'
+        db.delete_table('drumbeat_legacyurl')
+
+
+    models = {
+        'drumbeat.legacyurl': {
+            'Meta': {'object_name': 'LegacyUrl'},
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'path': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '255'})
+        }
+    }
+
+    complete_apps = ['drumbeat']
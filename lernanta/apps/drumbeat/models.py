@@ -16,3 +16,14 @@ class ModelBase(caching.base.CachingMixin, models.Model):
 
     class Meta:
         abstract = True
+
+
+class LegacyUrl(ModelBase):
+    """Path of a page of the old Drupal site, relative to DRUPAL_URL.
+
+    Imported with the import_drupal_urls command and completed by the
+    drumbeat.tasks.ProbeLegacyUrl task."""
+    path = models.CharField(max_length=255, unique=True)
+
+    def __unicode__(self):
+        return self.path
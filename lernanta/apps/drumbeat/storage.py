@@ -1,11 +1,40 @@
 import os
 import Image
+import ImageOps
 import logging
+from cStringIO import StringIO
 
+from django.core.files.base import ContentFile
 from django.core.files.storage import FileSystemStorage
 
 log = logging.getLogger(__name__)
 
+# Pre-sized copies made at upload time: name -> (width, height, crop).
+# Cropped variants fill the whole box, the others fit inside it.
+IMAGE_VARIANTS = {
+    'avatar48': (48, 48, True),
+    'avatar240': (240, 240, True),
+    'card': (203, 125, True),
+    'logo': (400, 200, False),
+}
+
+
+def get_variant_name(name, variant):
+    """Path of the ``variant`` of the image stored at ``name``.
+
+    Variants live next to the original, in its partition directory."""
+    root, ext = os.path.splitext(name)
+    return '%s_%s%s' % (root, variant, ext)
+
+
+def get_variant_url(field_file, variant):
+    """URL of the ``variant`` of an image field value, or of the original
+    if the storage does not make that variant."""
+    storage = field_file.storage
+    if isinstance(storage, ImageStorage):
+        return storage.variant_url(field_file.name, variant)
+    return field_file.url
+
 
 class ImageStorage(FileSystemStorage):
 
@@ -16,6 +45,38 @@ class ImageStorage(FileSystemStorage):
         'JPG': 'jpg',
     }
 
+    def __init__(self, variants=(), **kwargs):
+        super(ImageStorage, self).__init__(**kwargs)
+        self.variants = tuple(variants)
+
+    def _encode(self, image, format):
+        if format == 'JPEG' and image.mode not in ('RGB', 'L', 'CMYK'):
+            image = image.convert('RGB')
+        # Only the pixels are written, which drops the EXIF and other
+        # metadata of the upload.
+        data = StringIO()
+        image.save(data, format)
+        return data.getvalue()
+
+    def _resize(self, image, width, height, crop):
+        if image.mode not in ('RGB', 'RGBA', 'L'):
+            image = image.convert('RGBA' if 'transparency' in image.info
+                else 'RGB')
+        if crop:
+            return ImageOps.fit(image, (width, height), Image.ANTIALIAS)
+        image = image.copy()
+        image.thumbnail((width, height), Image.ANTIALIAS)
+        return image
+
+    def _write_variant(self, image, format, name, variant):
+        resized = self._resize(image, *IMAGE_VARIANTS[variant])
+        # Variant paths are deterministic, so an older copy is replaced.
+        variant_file = open(self.path(get_variant_name(name, variant)), 'wb')
+        try:
+            variant_file.write(self._encode(resized, format))
+        finally:
+            variant_file.close()
+
     def _save(self, name, content):
         name, ext = os.path.splitext(name)
         image = Image.open(content)
@@ -25,6 +86,40 @@ class ImageStorage(FileSystemStorage):
             log.warn("Attempt to upload image of unknown format: %s" % (
                 image.format,))
             raise Exception("Unknown image format: %s" % (image.format,))
-        name = super(ImageStorage, self)._save(name, content)
-        image.save(self.path(name), image.format)
+        format = image.format
+        image.load()
+        name = super(ImageStorage, self)._save(name,
+            ContentFile(self._encode(image, format)))
+        for variant in self.variants:
+            self._write_variant(image, format, name, variant)
         return name
+
+    def make_variants(self, name):
+        """Make the missing variants of an image saved before they were
+        configured. Returns the number of files written."""
+        image = None
+        written = 0
+        for variant in self.variants:
+            if self.exists(get_variant_name(name, variant)):
+                continue
+            if image is None:
+                image = Image.open(self.path(name))
+                image.load()
+            self._write_variant(image, image.format, name, variant)
+            written += 1
+        return written
+
+    def variant_url(self, name, variant):
+        """URL of a configured variant, without checking the file: the
+        variants are written with the image, and make_image_variants
+        writes those of older uploads."""
+        if variant in self.variants:
+            return self.url(get_variant_name(name, variant))
+        return self.url(name)
+
+    def delete(self, name):
+        for variant in self.variants:
+            variant_name = get_variant_name(name, variant)
+            if self.exists(variant_name):
+                super(ImageStorage, self).delete(variant_name)
+        super(ImageStorage, self).delete(name)
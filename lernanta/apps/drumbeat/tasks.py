@@ -0,0 +1,26 @@
+import requests
+
+from django.conf import settings
+from django.utils.encoding import iri_to_uri
+
+from celery.task import Task
+
+from drumbeat.models import LegacyUrl
+from drumbeat.legacy import PROBE_TIMEOUT, normalize_path
+
+
+class ProbeLegacyUrl(Task):
+    """Add ``path`` to the legacy URL map if the old site serves it."""
+    name = 'drumbeat.tasks.ProbeLegacyUrl'
+
+    def run(self, path, **kwargs):
+        log = self.get_logger(**kwargs)
+        url = iri_to_uri(settings.DRUPAL_URL + path)
+        try:
+            response = requests.head(url, timeout=PROBE_TIMEOUT,
+                allow_redirects=True)
+        except requests.exceptions.RequestException as error:
+            log.debug(u'Probing %s failed: %s' % (url, error))
+            return
+        if response.status_code < 400:
+            LegacyUrl.objects.get_or_create(path=normalize_path(path))
@@ -0,0 +1,172 @@
+import os
+import shutil
+import time
+import tempfile
+from cStringIO import StringIO
+
+import Image
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import get_cache
+from django.core.files.base import ContentFile
+
+from mock import patch, Mock
+from test_utils import TestCase
+
+from users.models import UserProfile, create_profile
+from drumbeat import legacy
+from drumbeat.middleware import NotFoundMiddleware
+from drumbeat.models import LegacyUrl
+from drumbeat.storage import ImageStorage, get_variant_name
+from drumbeat.tasks import ProbeLegacyUrl
+from drumbeat.utils import get_unique_slug
+
+
+class UniqueSlugTests(TestCase):
+
+    def setUp(self):
+        for username in ('slug', 'slug-2', 'slugs'):
+            create_profile(User(username=username,
+                email='%s@mail.org' % username))
+
+    def get_unique_slug(self, slug, rejected=()):
+        return get_unique_slug(UserProfile.objects.all(), slug,
+            field_name='username', rejected=rejected)
+
+    def test_get_unique_slug(self):
+        self.assertEqual(self.get_unique_slug('new'), 'new')
+        self.assertEqual(self.get_unique_slug('slug'), 'slug-3')
+
+    def test_rejected_slugs(self):
+        # Slugs taken by saves the query does not see yet are skipped.
+        self.assertEqual(self.get_unique_slug('new', rejected=['new']),
+            'new-2')
+        self.assertEqual(self.get_unique_slug('new',
+            rejected=['new', 'new-2']), 'new-3')
+        self.assertEqual(self.get_unique_slug('slug', rejected=['slug-3']),
+            'slug-4')
+
+
+class ImageStorageTests(TestCase):
+
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        data = StringIO()
+        Image.new('RGB', (300, 100), (255, 0, 0)).save(data, 'PNG')
+        self.image_data = data.getvalue()
+
+    def tearDown(self):
+        shutil.rmtree(self.location)
+
+    def get_storage(self, variants=()):
+        return ImageStorage(variants=variants, location=self.location,
+            base_url='/media/')
+
+    def test_save_variants(self):
+        storage = self.get_storage(('avatar48', 'logo'))
+        name = storage.save('images/test.jpg', ContentFile(self.image_data))
+        # The name follows the decoded format.
+        self.assertEqual(name, 'images/test.png')
+        avatar = Image.open(storage.path(get_variant_name(name, 'avatar48')))
+        self.assertEqual(avatar.size, (48, 48))
+        logo = Image.open(storage.path(get_variant_name(name, 'logo')))
+        self.assertEqual(logo.size, (300, 100))
+
+    def test_variant_url(self):
+        storage = self.get_storage(('avatar48',))
+        name = storage.save('images/test.png', ContentFile(self.image_data))
+        self.assertEqual(storage.variant_url(name, 'avatar48'),
+            '/media/images/test_avatar48.png')
+        # Variants the storage does not make fall back to the original.
+        self.assertEqual(storage.variant_url(name, 'card'),
+            '/media/images/test.png')
+
+    def test_make_variants(self):
+        name = self.get_storage().save('images/test.png',
+            ContentFile(self.image_data))
+        storage = self.get_storage(('avatar48', 'card'))
+        self.assertFalse(storage.exists(get_variant_name(name, 'card')))
+        self.assertEqual(storage.make_variants(name), 2)
+        card = Image.open(storage.path(get_variant_name(name, 'card')))
+        self.assertEqual(card.size, (203, 125))
+        self.assertEqual(storage.make_variants(name), 0)
+
+    def test_delete(self):
+        storage = self.get_storage(('avatar48', 'card'))
+        name = storage.save('images/test.png', ContentFile(self.image_data))
+        os.remove(storage.path(get_variant_name(name, 'card')))
+        # Missing variants are skipped.
+        storage.delete(name)
+        self.assertEqual(os.listdir(os.path.join(self.location, 'images')),
+            [])
+
+
+class LegacyUrlTests(TestCase):
+
+    drupal_url = 'http://archive.example.org/'
+
+    def setUp(self):
+        self.old_drupal_url = getattr(settings, 'DRUPAL_URL', None)
+        settings.DRUPAL_URL = self.drupal_url
+        legacy.lookups.clear()
+        # The dummy cache backend would not remember the probes.
+        self.cache_patch = patch('drumbeat.legacy.cache',
+            get_cache('locmem://'))
+        self.cache_patch.start()
+        self.probe_patch = patch.object(ProbeLegacyUrl, 'apply_async')
+        self.apply_async = self.probe_patch.start()
+
+    def tearDown(self):
+        self.probe_patch.stop()
+        self.cache_patch.stop()
+        legacy.lookups.clear()
+        settings.DRUPAL_URL = self.old_drupal_url
+
+    def test_found(self):
+        LegacyUrl.objects.create(path='groups/old-group')
+        self.assertEqual(legacy.get_legacy_url('groups/old-group/'),
+            self.drupal_url + 'groups/old-group/')
+        self.assertEqual(legacy.get_legacy_url('groups/old-group'),
+            self.drupal_url + 'groups/old-group')
+        self.assertFalse(self.apply_async.called)
+
+        request = Mock(path='/en/groups/old-group/')
+        response = NotFoundMiddleware().process_response(request,
+            Mock(status_code=404))
+        self.assertEqual(response.status_code, 301)
+        self.assertEqual(response['Location'],
+            self.drupal_url + 'groups/old-group/')
+
+    def test_negative_cache(self):
+        self.assertEqual(legacy.get_legacy_url('groups/new-group/'), None)
+        LegacyUrl.objects.create(path='groups/new-group')
+        # The miss is remembered until it expires.
+        self.assertEqual(legacy.get_legacy_url('groups/new-group/'), None)
+        later = time.time() + legacy.NEGATIVE_TIMEOUT + 1
+        with patch('drumbeat.legacy.time.time', Mock(return_value=later)):
+            self.assertEqual(legacy.get_legacy_url('groups/new-group/'),
+                self.drupal_url + 'groups/new-group/')
+
+    def test_queue_probe_once(self):
+        legacy.queue_probe('groups/unknown/')
+        legacy.queue_probe('groups/unknown')
+        legacy.queue_probe('groups/other/')
+        self.assertEqual([call[1]['args'] for call in
+            self.apply_async.call_args_list],
+            [('groups/unknown/',), ('groups/other/',)])
+
+    def test_probe_records_found_url(self):
+        with patch('drumbeat.tasks.requests.head',
+                Mock(return_value=Mock(status_code=200))) as head:
+            ProbeLegacyUrl().run('groups/found/')
+        self.assertEqual(head.call_args[0][0],
+            self.drupal_url + 'groups/found/')
+        self.assertTrue(LegacyUrl.objects.filter(
+            path='groups/found').exists())
+
+        with patch('drumbeat.tasks.requests.head',
+                Mock(return_value=Mock(status_code=404))):
+            ProbeLegacyUrl().run('groups/missing/')
+        self.assertFalse(LegacyUrl.objects.filter(
+            path='groups/missing').exists())
@@ -2,9 +2,12 @@ import os
 import re
 import math
 import hashlib
+import threading
 import unicodedata
+from collections import OrderedDict
 
 from django.core.validators import ValidationError, validate_slug
+from django.db import IntegrityError, transaction
 from django.utils.encoding import smart_unicode
 
 
@@ -38,6 +41,66 @@ def slug_validator(s, ok=SLUG_OK, lower=True):
                               code=validate_slug.code)
 
 
+# Times a unique slug is allocated again when a concurrent save took it.
+SLUG_ATTEMPTS = 5
+
+
+def get_unique_slug(queryset, slug, field_name='slug', rejected=()):
+    """
+    Return ``slug`` if no object of ``queryset`` uses it, or ``slug``
+    followed by the next free numeric suffix (``slug-2``, ``slug-3``...).
+
+    The slugs in use are read with a single prefix query. ``rejected``
+    slugs are counted as used too: they were taken by concurrent saves the
+    query may not see (the transaction snapshot can predate them).
+    """
+    if hasattr(queryset, 'no_cache'):
+        queryset = queryset.no_cache()
+    used = list(queryset.filter(**{field_name + '__startswith': slug}
+        ).values_list(field_name, flat=True))
+    used.extend(rejected)
+    pattern = re.compile(r'^%s(?:-(\d+))?$' % re.escape(slug), re.IGNORECASE)
+    taken = False
+    max_suffix = 1
+    for value in used:
+        match = pattern.match(value)
+        if not match:
+            continue
+        if match.group(1) is None:
+            taken = True
+        else:
+            max_suffix = max(max_suffix, int(match.group(1)))
+    if not taken:
+        return slug
+    return '%s-%s' % (slug, max_suffix + 1)
+
+
+def save_with_unique_slug(instance, slug, queryset, save):
+    """
+    Call ``save`` after giving ``instance`` a unique slug built from
+    ``slug``, unless it already has one. If a concurrent save takes the
+    slug first the unique index rejects the row and a slug past the
+    rejected ones is allocated. Models without a unique index on the slug
+    can still get duplicates from concurrent saves.
+    """
+    if instance.slug:
+        return save()
+    rejected = []
+    for attempt in range(SLUG_ATTEMPTS):
+        instance.slug = get_unique_slug(queryset, slug, rejected=rejected)
+        sid = transaction.savepoint()
+        try:
+            result = save()
+        except IntegrityError:
+            transaction.savepoint_rollback(sid)
+            if attempt == SLUG_ATTEMPTS - 1:
+                raise
+            rejected.append(instance.slug)
+        else:
+            transaction.savepoint_commit(sid)
+            return result
+
+
 def get_partition_id(pk, chunk_size=1000):
     """
     Given a primary key and optionally the number of models that will get
@@ -83,3 +146,36 @@ class MultiQuerySet(object):
                     offset = 0
                     stop = total_len - len(items)
                     continue
+
+
+class LRUCache(object):
+    """Small thread safe least recently used mapping."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            try:
+                value = self.data.pop(key)
+            except KeyError:
+                return default
+            # Move the key to the most recently used end.
+            self.data[key] = value
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.data.pop(key, None)
+            self.data[key] = value
+            while len(self.data) > self.max_size:
+                self.data.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def __len__(self):
+        return len(self.data)
@@ -0,0 +1,138 @@
+"""
+Delta storage for the version history of rich text.
+
+A stored version is either a snapshot, holding its full text, or a delta
+against the newest snapshot of the same document that was stored before
+it. Deltas are always taken against a snapshot, never against another
+delta, so any version is rebuilt from at most one snapshot and one delta.
+A new snapshot is taken every ``SNAPSHOT_INTERVAL`` versions, or sooner
+when the text has drifted so far that the delta is not worth it.
+
+The versioned models have a nullable ``base`` foreign key to the
+snapshot and a ``delta`` text field, and keep the text of snapshots in
+their ``content`` field (empty for deltas).
+"""
+import re
+from difflib import SequenceMatcher
+
+from django.utils import simplejson as json
+
+# Versions stored as deltas against the same snapshot.
+SNAPSHOT_INTERVAL = 25
+
+# Deltas larger than this fraction of the full text are not worth it.
+MAX_DELTA_RATIO = 0.5
+
+# Rich text is diffed in runs ending at a tag or a line break, which keeps
+# the matching fast and the deltas small for html.
+TOKEN_RE = re.compile(r'[^>\n]+[>\n]?|[>\n]')
+
+
+def _tokenize(text):
+    return TOKEN_RE.findall(text)
+
+
+def make_delta(base, text):
+    """Return a delta rebuilding ``text`` from ``base``: a JSON list of
+    ``[start, end]`` token ranges copied from ``base`` and of inserted
+    strings."""
+    base_tokens = _tokenize(base)
+    tokens = _tokenize(text)
+    ops = []
+    matcher = SequenceMatcher(None, base_tokens, tokens, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            ops.append([i1, i2])
+        elif j1 < j2:
+            ops.append(''.join(tokens[j1:j2]))
+    return json.dumps(ops, separators=(',', ':'))
+
+
+def apply_delta(base, delta):
+    base_tokens = _tokenize(base)
+    parts = []
+    for op in json.loads(delta):
+        if isinstance(op, list):
+            parts.append(''.join(base_tokens[op[0]:op[1]]))
+        else:
+            parts.append(op)
+    return u''.join(parts)
+
+
+def choose_delta(text, snapshot, deltas_count):
+    """Return the delta to store ``text`` against the ``snapshot`` text
+    that ``deltas_count`` versions already use, or None if ``text``
+    should be stored as a new snapshot."""
+    if snapshot is None or deltas_count >= SNAPSHOT_INTERVAL:
+        return None
+    delta = make_delta(snapshot, text)
+    if len(delta) > len(text) * MAX_DELTA_RATIO:
+        return None
+    return delta
+
+
+def get_snapshot(versions):
+    """Return the newest snapshot in the ``versions`` queryset and the
+    number of versions stored against it."""
+    for snapshot in versions.filter(base__isnull=True).order_by('-id')[:1]:
+        return snapshot, versions.filter(base=snapshot).count()
+    return None, 0
+
+
+def encode_version(version, versions):
+    """Turn ``version``, holding its full text in ``content``, into a
+    delta against the newest snapshot in ``versions`` if that is worth it.
+
+    Returns True if the version was changed; saving it is up to the
+    caller."""
+    snapshot, deltas_count = get_snapshot(versions)
+    if snapshot is None:
+        return False
+    delta = choose_delta(version.content, snapshot.content, deltas_count)
+    if delta is None:
+        return False
+    version.base = snapshot
+    version.delta = delta
+    version.content = ''
+    return True
+
+
+def decode_version(version):
+    """Return the full text of a stored version."""
+    if version.base_id is None:
+        return version.content
+    return apply_delta(version.base.content, version.delta)
+
+
+def release_snapshot(model, snapshot):
+    """Store the versions using ``snapshot`` as snapshots of their own.
+
+    Meant for pre_delete: the ``base`` foreign keys use SET_NULL, so the
+    dependent versions outlive their snapshot with their full text."""
+    dependents = list(model.objects.filter(base=snapshot))
+    for version in dependents:
+        model.objects.filter(id=version.id).update(base=None, delta='',
+            content=apply_delta(snapshot.content, version.delta))
+    if dependents and hasattr(model.objects, 'invalidate'):
+        model.objects.invalidate(*dependents)
+
+
+def encode_history(texts):
+    """Encode the full ``texts`` of the versions of a document, oldest
+    first. Returns ``(base index or None, delta or None)`` per version,
+    with None as the delta for snapshots."""
+    encoded = []
+    snapshot_index = None
+    deltas_count = 0
+    for i, text in enumerate(texts):
+        delta = None
+        if snapshot_index is not None:
+            delta = choose_delta(text, texts[snapshot_index], deltas_count)
+        if delta is None:
+            snapshot_index = i
+            deltas_count = 0
+            encoded.append((None, None))
+        else:
+            deltas_count += 1
+            encoded.append((snapshot_index, delta))
+    return encoded
@@ -0,0 +1,119 @@
+import random
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from django.utils.translation import activate, get_language
+
+from learn.models import get_courses_by_list
+from news.models import FeedEntry
+
+from processors import get_blog_feed
+
+log = logging.getLogger(__name__)
+
+# Fragments are refreshed by homepage.tasks.refresh_anonymous_pages every
+# 15 minutes. The timeout only matters if the task stops running.
+FRAGMENT_TIMEOUT = 60 * 60
+COURSE_LIST_TIMEOUT = 60 * 60
+
+FRAGMENT_KEY = 'anonymous_pages_fragment_%s_%s'
+COURSE_LIST_KEY = 'anonymous_pages_course_list_%s'
+
+# Course lists shown to anonymous visitors.
+FEATURED_COURSE_LISTS = ('community',)
+
+COURSE_FIELDS = ('id', 'title', 'description', 'url', 'thumbnail_url')
+
+
+def _splash_feed_context():
+    feed_entries = FeedEntry.objects.filter(
+        page='splash').order_by('-created_on')[0:4]
+    return {'feed_entries': list(feed_entries)}
+
+
+def _home_blog_context():
+    return {'feed_entries': get_blog_feed()}
+
+
+# name -> (template, context builder). Fragments do not depend on the
+# request, only on the active locale.
+FRAGMENTS = {
+    'splash_feed': ('dashboard/_splash_feed.html', _splash_feed_context),
+    'home_blog': ('homepage/blog_feed.html', _home_blog_context),
+}
+
+
+def _render_fragment(name, contexts):
+    template, get_context = FRAGMENTS[name]
+    if name not in contexts:
+        contexts[name] = get_context()
+    return render_to_string(template, contexts[name])
+
+
+def refresh_fragments(names=None):
+    """Render every fragment in each supported locale and store it.
+
+    The data behind each fragment is fetched once and reused for all
+    the locales."""
+    names = names or FRAGMENTS.keys()
+    current_locale = get_language()
+    contexts = {}
+    try:
+        for locale, language in settings.SUPPORTED_LANGUAGES:
+            activate(locale)
+            for name in names:
+                html = _render_fragment(name, contexts)
+                cache.set(FRAGMENT_KEY % (name, locale), html,
+                    FRAGMENT_TIMEOUT)
+    finally:
+        activate(current_locale)
+
+
+def get_fragment(name):
+    """Return the pre-rendered fragment for the active locale.
+
+    Falls back to rendering (and caching) it in place if the periodic
+    task has not filled the cache yet."""
+    locale = get_language()
+    key = FRAGMENT_KEY % (name, locale)
+    html = cache.get(key)
+    if html is None:
+        log.debug('Anonymous page fragment %s (%s) not cached.' % (
+            name, locale))
+        html = _render_fragment(name, {})
+        cache.set(key, html, FRAGMENT_TIMEOUT)
+    return mark_safe(html)
+
+
+def refresh_course_list(list_name):
+    """Cache the ids and card data of the courses in ``list_name``."""
+    courses = get_courses_by_list(list_name).values(*COURSE_FIELDS)
+    data = {
+        'ids': [],
+        'courses': {},
+    }
+    for course in courses:
+        data['ids'].append(course['id'])
+        data['courses'][course['id']] = course
+    cache.set(COURSE_LIST_KEY % list_name, data, COURSE_LIST_TIMEOUT)
+    return data
+
+
+def get_featured_courses(list_name, n):
+    """Pick ``n`` random courses from ``list_name`` using the cached
+    id list."""
+    data = cache.get(COURSE_LIST_KEY % list_name)
+    if data is None:
+        data = refresh_course_list(list_name)
+    ids = data['ids']
+    ids = random.sample(ids, min(n, len(ids)))
+    return [data['courses'][course_id] for course_id in ids]
+
+
+def refresh_anonymous_pages():
+    for list_name in FEATURED_COURSE_LISTS:
+        refresh_course_list(list_name)
+    refresh_fragments()
@@ -7,11 +7,11 @@ from django.utils.encoding import smart_str
 from django.conf import settings
 
 import requests
-import bleach
 
 import logging
 from news.tasks import get_feed_entries
 from lernanta.apps.news.tasks import parse_entry
+from richtext import clean_html
 
 log = logging.getLogger(__name__)
 
@@ -26,9 +26,8 @@ def get_blog_feed():
 
             for feed in feeds:
                 parsed = parse_entry(feed)
-                cleaned_description = smart_str(bleach.clean(parsed['description'], tags=('img',),
-                                                             attributes={'img': ['src', 'alt'], }, strip=True,
-                                                             strip_comments=True))
+                cleaned_description = smart_str(clean_html('feed',
+                                                           parsed['description'] or u''))
                 parsed['description'] = cleaned_description
                 feeds_arr.append(parsed)
             feeds = feeds_arr
@@ -0,0 +1,11 @@
+from celery.schedules import crontab
+from celery.decorators import periodic_task
+
+from homepage.fragments import refresh_anonymous_pages
+
+
+@periodic_task(run_every=crontab(minute='*/15'),
+    name='homepage.tasks.refresh_anonymous_pages')
+def refresh_anonymous_pages_task():
+    """Keep the fragments served to anonymous visitors warm."""
+    refresh_anonymous_pages()
@@ -1,11 +1,10 @@
-"""
-This file demonstrates writing tests using the unittest module. These will pass
-when you run "manage.py test".
+from django.test import TestCase
+from django.core.cache import cache
 
-Replace this with more appropriate tests for your application.
-"""
+from learn.models import add_course_listing, create_list, add_course_to_list
+from homepage import fragments
 
-from django.test import TestCase
+import test_utils
 
 
 class SimpleTest(TestCase):
@@ -14,3 +13,32 @@ class SimpleTest(TestCase):
         Tests that 1 + 1 always equals 2.
         """
         self.assertEqual(1 + 1, 2)
+
+
+class AnonymousPagesCacheTests(test_utils.TestCase):
+
+    def setUp(self):
+        cache.clear()
+        create_list('community', 'Community', '')
+        for i in range(5):
+            course_url = 'http://p2pu.org/courses/%s/' % i
+            add_course_listing(course_url, 'Course %s' % i, 'Description',
+                '', 'en', 'http://p2pu.org/media/image.png', [])
+            add_course_to_list(course_url, 'community')
+
+    def test_featured_courses_from_cached_list(self):
+        """Random featured courses are picked without touching the db."""
+        fragments.refresh_course_list('community')
+        with self.assertNumQueries(0):
+            courses = fragments.get_featured_courses('community', 3)
+        self.assertEqual(len(courses), 3)
+        self.assertEqual(len(set(c['id'] for c in courses)), 3)
+
+    def test_featured_courses_fewer_than_requested(self):
+        courses = fragments.get_featured_courses('community', 10)
+        self.assertEqual(len(courses), 5)
+
+    def test_fragment_is_cached(self):
+        fragments.refresh_fragments(['splash_feed'])
+        with self.assertNumQueries(0):
+            fragments.get_fragment('splash_feed')
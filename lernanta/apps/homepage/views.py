@@ -4,10 +4,8 @@ from django.shortcuts import render_to_response
 from django.template import RequestContext
 from django.views.decorators.gzip import gzip_page
 
-from learn.models import get_courses_by_list
-
-from processors import get_blog_feed
 from processors import get_featured_badges
+from fragments import get_fragment, get_featured_courses
 
 
 def _pick_n(sequence, n):
@@ -18,12 +16,11 @@ def _pick_n(sequence, n):
 
 @gzip_page
 def home(request):
-    feed_entries = get_blog_feed()
-    courses = _pick_n(get_courses_by_list("community"), 3)
+    courses = get_featured_courses('community', 3)
     badges = _pick_n(get_featured_badges(), 3)
 
     return render_to_response('homepage/home.html', {
-        'feed_entries':  feed_entries,
+        'blog_feed': get_fragment('home_blog'),
         'courses': courses,
         'badges': badges,
     }, context_instance=RequestContext(request))
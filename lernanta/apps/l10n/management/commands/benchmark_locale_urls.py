@@ -0,0 +1,63 @@
+import time
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from django.test.client import RequestFactory
+
+from l10n import urlresolvers
+from l10n.middleware import LocaleURLRewriter
+
+# A mix of the URLs reversed while rendering a course or profile page.
+URLS = (
+    ('splash', {}),
+    ('dashboard', {}),
+    ('users_login', {}),
+    ('learn_list', {'list_name': 'community'}),
+    ('users_profile_view', {'username': 'testuser'}),
+    ('projects_show', {'slug': 'intro-to-python'}),
+)
+
+
+class Command(BaseCommand):
+    help = ('Measure the per-request overhead of locale prefixing and '
+            'URL reversing with the lookup caches disabled (every call '
+            'is resolved from scratch, like before they existed) and '
+            'enabled.')
+    option_list = BaseCommand.option_list + (
+        make_option('--requests', type='int', dest='requests', default=500,
+            help='Number of simulated requests.'),
+        make_option('--reverses', type='int', dest='reverses', default=300,
+            help='Number of URLs reversed per request.'),
+    )
+
+    def _clear_caches(self):
+        urlresolvers.reverse_cache.clear()
+        urlresolvers.resolver.url_map = None
+
+    def _run(self, requests, reverses, uncached):
+        factory = RequestFactory()
+        middleware = LocaleURLRewriter()
+        start = time.time()
+        for i in xrange(requests):
+            if uncached:
+                self._clear_caches()
+            request = factory.get('/en/groups/intro-to-python/',
+                HTTP_ACCEPT_LANGUAGE='es-CO,en;q=0.5')
+            middleware.process_request(request)
+            for j in xrange(reverses):
+                viewname, kwargs = URLS[j % len(URLS)]
+                if uncached:
+                    urlresolvers.reverse_cache.clear()
+                urlresolvers.reverse(viewname, kwargs=kwargs)
+        return (time.time() - start) / requests
+
+    def handle(self, *args, **options):
+        requests = options['requests']
+        reverses = options['reverses']
+        before = self._run(requests, reverses, uncached=True)
+        self._clear_caches()
+        after = self._run(requests, reverses, uncached=False)
+        self.stdout.write('%d requests, %d reverses per request\n' % (
+            requests, reverses))
+        self.stdout.write('uncached: %.3f ms/request\n' % (before * 1000))
+        self.stdout.write('cached:   %.3f ms/request\n' % (after * 1000))
@@ -6,6 +6,7 @@ from django.contrib.auth.models import User
 
 from users.models import create_profile
 from l10n import locales
+from l10n import urlresolvers
 
 import test_utils
 
@@ -79,3 +80,25 @@ class TestLocaleURLs(test_utils.TestCase):
         })
         self.assertRedirects(response, '/en/home/dashboard/', status_code=302,
                              target_status_code=302)
+
+    def test_find_supported_uses_current_locales(self):
+        """The compiled lookups follow changes to the locale map."""
+        self.assertEqual(['de-DE'], urlresolvers.find_supported('de-AT'))
+        self.assertEqual(['zh-CN'], urlresolvers.find_supported('ZH-tw'))
+        self.assertEqual([], urlresolvers.find_supported('xx'))
+
+    def test_accept_language_is_memoized(self):
+        resolver = urlresolvers.resolver
+        self.assertEqual('es', resolver.from_accept_language('es-CO,en;q=0.5'))
+        self.assertEqual('es', resolver.accept_language_cache.get(
+            'es-CO,en;q=0.5'))
+        self.assertEqual(None, resolver.from_accept_language('xx'))
+
+    def test_reverse_cache(self):
+        urlresolvers.reverse_cache.clear()
+        url = urlresolvers.reverse('users_profile_view',
+            kwargs={'username': 'testuser'})
+        self.assertEqual(1, len(urlresolvers.reverse_cache))
+        self.assertEqual(url, urlresolvers.reverse('users_profile_view',
+            kwargs={'username': 'testuser'}))
+        self.assertEqual(1, len(urlresolvers.reverse_cache))
@@ -4,10 +4,12 @@ Taken from kitsune.sumo.urlresolvers
 import threading
 
 from django.conf import settings
+from django.core.urlresolvers import get_urlconf
 from django.core.urlresolvers import reverse as django_reverse
 from django.utils.translation.trans_real import parse_accept_lang_header
 
 import l10n.locales
+from drumbeat.utils import LRUCache
 
 # Thread-local storage for URL prefixes. Access with (get|set)_url_prefix.
 _locals = threading.local()
@@ -23,6 +25,97 @@ def get_url_prefix():
     return getattr(_locals, 'prefix', None)
 
 
+class LocaleResolver(object):
+    """Lookup tables built once from ``l10n.locales``.
+
+    The tables are rebuilt if ``l10n.locales.LANGUAGE_URL_MAP`` is replaced
+    (tests add locales that way)."""
+
+    def __init__(self):
+        self.url_map = None
+        self.accept_language_cache = LRUCache(1000)
+
+    def _build(self):
+        url_map = l10n.locales.LANGUAGE_URL_MAP
+        # Locales indexed by their primary language subtag, in the same
+        # order find_supported used to return them (xx-YY -> xx).
+        by_language = {}
+        for lang in url_map:
+            by_language.setdefault(lang.split('-', 1)[0], []).append(
+                url_map[lang])
+        self.by_language = by_language
+        self.nonlocales = frozenset(settings.SUPPORTED_NONLOCALES)
+        self.accept_language_cache.clear()
+        self.url_map = url_map
+
+    def _check(self):
+        if self.url_map is not l10n.locales.LANGUAGE_URL_MAP:
+            self._build()
+
+    def exact(self, lang):
+        """Return the locale for a lowercase ``lang`` or None."""
+        self._check()
+        return self.url_map.get(lang)
+
+    def find_supported(self, test):
+        self._check()
+        return self.by_language.get(test.lower().split('-', 1)[0], [])
+
+    def is_nonlocale(self, first_segment):
+        self._check()
+        return first_segment in self.nonlocales
+
+    def from_accept_language(self, header):
+        """Return the best supported locale for an Accept-Language header,
+        or None. Results are memoized per header value."""
+        self._check()
+        locale = self.accept_language_cache.get(header, False)
+        if locale is not False:
+            return locale
+        ranked_languages = parse_accept_lang_header(header)
+        # Do we support or remap their locale?
+        supported = [lang[0] for lang in ranked_languages if lang[0]
+                    in self.url_map]
+        locale = None
+        if supported:
+            locale = self.url_map[supported[0].lower()]
+        else:
+            # Do we support a less specific locale? (xx-YY -> xx)
+            for lang in ranked_languages:
+                supported = self.find_supported(lang[0])
+                if supported:
+                    locale = supported[0]
+                    break
+        self.accept_language_cache.set(header, locale)
+        return locale
+
+
+resolver = LocaleResolver()
+
+# Reversed URLs keyed by the reverse arguments and the locale prefix.
+reverse_cache = LRUCache(5000)
+
+
+# Only URLs reversed from these argument types are cached.
+CACHEABLE_ARG_TYPES = (basestring, int, long)
+
+
+def _reverse_cache_key(prefixer, viewname, urlconf, args, kwargs, prefix,
+                       current_app):
+    args = tuple(args or ())
+    kwargs = tuple(sorted((kwargs or {}).items()))
+    values = args + tuple(value for name, value in kwargs)
+    for value in values:
+        if not isinstance(value, CACHEABLE_ARG_TYPES):
+            return None
+    if prefixer:
+        locale = (prefixer.script_name, prefixer.locale_for_fix)
+    else:
+        locale = None
+    return (viewname, urlconf or get_urlconf(), args, kwargs, prefix,
+        current_app, locale)
+
+
 def reverse(viewname, urlconf=None, args=None, kwargs=None,
             prefix=None, current_app=None):
     """Wraps Django's reverse to prepend the correct locale."""
@@ -30,25 +123,36 @@ def reverse(viewname, urlconf=None, args=None, kwargs=None,
 
     if prefixer:
         prefix = prefix or '/'
+    key = _reverse_cache_key(prefixer, viewname, urlconf, args, kwargs,
+        prefix, current_app)
+    if key is not None:
+        url = reverse_cache.get(key)
+        if url is not None:
+            return url
     url = django_reverse(viewname, urlconf, args, kwargs, prefix, current_app)
     if prefixer:
-        return prefixer.fix(url)
-    else:
-        return url
+        url = prefixer.fix(url)
+    if key is not None:
+        reverse_cache.set(key, url)
+    return url
 
 
 def find_supported(test):
-    return [l10n.locales.LANGUAGE_URL_MAP[x] for
-            x in l10n.locales.LANGUAGE_URL_MAP if
-            x.split('-', 1)[0] == test.lower().split('-', 1)[0]]
+    return resolver.find_supported(test)
 
 
 class Prefixer(object):
 
     def __init__(self, request):
         self.request = request
+        self.script_name = request.META.get('SCRIPT_NAME', '')
         split = self.split_path(request.path_info)
         self.locale, self.shortened_path = split
+        if not self.locale:
+            # The locale used by fix() never changes for a request.
+            self.locale_for_fix = self.get_language()
+        else:
+            self.locale_for_fix = self.locale
 
     def split_path(self, path_):
         """
@@ -61,11 +165,11 @@ class Prefixer(object):
         # Use partitition instead of split since it always returns 3 parts
         first, _, rest = path.partition('/')
 
-        lang = first.lower()
-        if lang in l10n.locales.LANGUAGE_URL_MAP:
-            return l10n.locales.LANGUAGE_URL_MAP[lang], rest
+        locale = resolver.exact(first.lower())
+        if locale:
+            return locale, rest
         else:
-            supported = find_supported(first)
+            supported = resolver.find_supported(first)
             if len(supported):
                 return supported[0], rest
             else:
@@ -79,40 +183,27 @@ class Prefixer(object):
         """
 
         if 'lang' in self.request.GET:
-            lang = self.request.GET['lang'].lower()
-            if lang in l10n.locales.LANGUAGE_URL_MAP:
-                return l10n.locales.LANGUAGE_URL_MAP[lang]
-        
+            lang = resolver.exact(self.request.GET['lang'].lower())
+            if lang:
+                return lang
+
         # TODO: this is a hack to default to English
         return 'en'
 
         if self.request.META.get('HTTP_ACCEPT_LANGUAGE'):
-            ranked_languages = parse_accept_lang_header(
+            locale = resolver.from_accept_language(
                 self.request.META['HTTP_ACCEPT_LANGUAGE'])
-
-            # Do we support or remap their locale?
-            supported = [lang[0] for lang in ranked_languages if lang[0]
-                        in l10n.locales.LANGUAGE_URL_MAP]
-
-            # Do we support a less specific locale? (xx-YY -> xx)
-            if not len(supported):
-                for lang in ranked_languages:
-                    supported = find_supported(lang[0])
-                    if supported:
-                        break
-
-            if len(supported):
-                return l10n.locales.LANGUAGE_URL_MAP[supported[0].lower()]
+            if locale:
+                return locale
 
         return settings.LANGUAGE_CODE
 
     def fix(self, path):
         path = path.lstrip('/')
-        url_parts = [self.request.META['SCRIPT_NAME']]
+        url_parts = [self.script_name]
 
-        if path.partition('/')[0] not in settings.SUPPORTED_NONLOCALES:
-            locale = self.locale if self.locale else self.get_language()
-            url_parts.append(locale)
+        if not resolver.is_nonlocale(path.partition('/')[0]):
+            url_parts.append(self.locale_for_fix)
 
         url_parts.append(path)
 
@@ -134,12 +134,23 @@ def update_course_listing(course_url, title=None, description=None, data_url=Non
         listing.thumbnail_url = thumbnail_url
     listing.save()
 
-    if tags:
-        db.CourseTags.objects.filter(course=listing, internal=False).delete()
-        for tag in tags:
-            if not db.CourseTags.objects.filter(course=listing, tag=tag).exists():
-                course_tag = db.CourseTags(tag=tag, course=listing)
-                course_tag.save()
+    if tags is not None:
+        update_course_tags(listing, tags)
+
+
+def update_course_tags(listing, tags):
+    """ make the non internal tags of a listed course match ``tags``,
+    only touching the tags that changed """
+    existing = {}
+    for tag, internal in db.CourseTags.objects.filter(
+            course=listing).values_list('tag', 'internal'):
+        existing[tag] = existing.get(tag, False) or internal
+    # internal tags are never replaced by the same public tag
+    wanted = set(tags) - set(tag for tag, internal in existing.items() if internal)
+    db.CourseTags.objects.filter(course=listing, internal=False).exclude(
+        tag__in=wanted).delete()
+    for tag in wanted - set(existing):
+        db.CourseTags(tag=tag, course=listing).save()
 
 
 def search_course_title(keyword):
@@ -220,6 +231,6 @@ def get_lists_for_course(course_url):
             'url': l.course_list.url,
             'title': l.course_list.title
         }
-        for l in course.courselistentry_set.all()
+        for l in course.courselistentry_set.select_related('course_list')
     ]
 
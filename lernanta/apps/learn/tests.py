@@ -121,6 +121,19 @@ class ProjectTests(TestCase):
         self.assertTrue(len(tags) == len(self.test_course["tags"]))
 
 
+    def test_update_course_tags(self):
+        """ test that updating tags only changes the tags that differ """
+
+        add_course_listing(**self.test_course)
+        kept = CourseTags.objects.get(tag="tag1")
+        update_course_listing(self.test_course["course_url"],
+            tags=["tag1", "tag4"])
+        tags = CourseTags.objects.values_list('tag', flat=True)
+
+        self.assertEquals(sorted(tags), ["tag1", "tag4"])
+        self.assertEquals(CourseTags.objects.get(tag="tag1").id, kept.id)
+
+
     def test_course_language(self):
         """ test that course languages are handled correctly """
 
@@ -21,3 +21,20 @@ def get_image(image_uri):
         "url": image_db.image_file.url, #this needs to be https!
     }
     return image
+
+
+def get_images(image_uris):
+    """Load several images with one query. Returns a dict keyed by uri,
+    images that can not be found are left out."""
+    ids = {}
+    for image_uri in image_uris:
+        image_id = image_uri.strip('/').split('/')[-1]
+        if image_id.isdigit():
+            ids[int(image_id)] = image_uri
+    images = {}
+    for image_db in db.Image.objects.filter(id__in=ids.keys()):
+        images[ids[image_db.id]] = {
+            "uri": "/uri/media/image/{0}".format(image_db.id),
+            "url": image_db.image_file.url,
+        }
+    return images
@@ -3,7 +3,6 @@ import urllib2
 import logging
 import hashlib
 import feedparser
-import bleach
 
 from django.conf import settings
 from django.utils.encoding import smart_str
@@ -12,6 +11,7 @@ from celery.schedules import crontab
 from celery.decorators import periodic_task
 
 from news.models import FeedEntry
+from richtext import clean_html
 
 log = logging.getLogger(__name__)
 
@@ -81,8 +81,8 @@ def parse_feed(feed_url, page):
         if not body:
             log.warn("Parsing feed failed - no body found")
             continue
-        cleaned_body = smart_str(bleach.clean(body, tags=('img',), attributes={'img': ['src', 'alt'], },
-                                              strip=True, strip_comments=True))
+        # Feeds repeat their entries, which the cleaner remembers.
+        cleaned_body = smart_str(clean_html('feed', body))
         try:
             checksum = hashlib.md5(cleaned_body).hexdigest()
             exists = FeedEntry.objects.filter(checksum=checksum)
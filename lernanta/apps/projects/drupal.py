@@ -4,8 +4,9 @@ from django.db import models
 from django.conf import settings
 from django.template.loader import render_to_string
 
-from users.drupal import get_user
+from users.drupal import get_user, Users
 from schools.models import School
+from projects.models import PastDrupalCourse
 
 
 log = logging.getLogger(__name__)
@@ -16,29 +17,68 @@ COURSE_TYPE = 'course'
 DOCUMENT_TYPE = 'document'
 COMPLETE_STATUS = '30_complete'
 PROJECT_MISSING_IMG = '/images/project-missing.png'
+# Max number of ids in the IN clauses of the history import.
+IMPORT_CHUNK_SIZE = 500
 
 
 def get_past_courses(username):
-    drupal_user = get_user(username)
-    past_courses = []
-    if drupal_user:
-        og_uids = OgUid.objects.using(DRUPAL_DB).filter(uid=drupal_user.uid)
-        for og_uid in og_uids:
-            course = Node.objects.using(DRUPAL_DB).get(type=COURSE_TYPE,
-                nid=og_uid.nid)
-            ct_course = ContentTypeCourse.objects.using(DRUPAL_DB).get(
-                nid=course.nid)
-            if ct_course.field_course_status_value == COMPLETE_STATUS:
-                url = settings.DRUPAL_URL + get_slug(course.nid)
-                image_url = get_image_url(ct_course.field_course_photo_fid)
-                data = {
-                    'name': course.title,
-                    'url': url,
-                    'organizer': og_uid.is_admin,
-                    'image_url': image_url,
-                }
-                past_courses.append(data)
-    return past_courses
+    """Completed courses of the user on the old site.
+
+    Reads the local copy made by the import_drupal_history command."""
+    courses = PastDrupalCourse.objects.filter(username=username).order_by(
+        'id').values('name', 'url', 'organizer', 'image_url')
+    return list(courses)
+
+
+def _chunks(ids):
+    ids = list(ids)
+    for i in xrange(0, len(ids), IMPORT_CHUNK_SIZE):
+        yield ids[i:i + IMPORT_CHUNK_SIZE]
+
+
+def load_past_courses():
+    """Yield ``(username, course data)`` for every member of a completed
+    course on the old site. Uses a few queries per chunk of courses
+    instead of several queries per membership."""
+    courses = ContentTypeCourse.objects.using(DRUPAL_DB).filter(
+        field_course_status_value=COMPLETE_STATUS).values_list(
+        'nid', 'field_course_photo_fid')
+    photos = dict(courses)
+    for nids in _chunks(photos.keys()):
+        titles = dict(Node.objects.using(DRUPAL_DB).filter(
+            type=COURSE_TYPE, nid__in=nids).values_list('nid', 'title'))
+        aliases = UrlAlias.objects.using(DRUPAL_DB).filter(
+            src__in=['node/%s' % nid for nid in titles]).values_list(
+            'src', 'dst')
+        slugs = dict((int(src[len('node/'):]), dst) for src, dst in aliases)
+        fids = [photos[nid] for nid in titles if photos[nid]]
+        files = dict(Files.objects.using(DRUPAL_DB).filter(
+            fid__in=fids).values_list('fid', 'filepath'))
+        members = list(OgUid.objects.using(DRUPAL_DB).filter(
+            nid__in=titles.keys()).values_list('uid', 'nid', 'is_admin'))
+        usernames = dict(Users.objects.using(DRUPAL_DB).filter(
+            uid__in=set(uid for uid, nid, is_admin in members)).values_list(
+            'uid', 'name'))
+        for uid, nid, is_admin in members:
+            if uid not in usernames or nid not in slugs:
+                continue
+            data = {
+                'name': titles[nid],
+                'url': settings.DRUPAL_URL + slugs[nid],
+                'organizer': bool(is_admin),
+                'image_url': get_file_url(files.get(photos[nid])),
+            }
+            yield usernames[uid], data
+
+
+def load_legacy_paths():
+    """Yield the paths of the old site known to the url_alias table: the
+    aliases and the node paths they stand for."""
+    aliases = UrlAlias.objects.using(DRUPAL_DB).values_list('src', 'dst')
+    for src, dst in aliases.iterator():
+        yield src
+        if dst:
+            yield dst
 
 
 def get_slug(nid):
@@ -119,9 +159,14 @@ def get_matching_courses(school=None, term=None):
 def get_image_url(fid):
     if fid:
         f = Files.objects.using(DRUPAL_DB).get(fid=fid)
-        if f.filepath.startswith(settings.FILE_PATH_PREFIX):
-            path = f.filepath[len(settings.FILE_PATH_PREFIX):]
-            return settings.DRUPAL_FILES_URL + path
+        return get_file_url(f.filepath)
+    return get_file_url(None)
+
+
+def get_file_url(filepath):
+    if filepath and filepath.startswith(settings.FILE_PATH_PREFIX):
+        path = filepath[len(settings.FILE_PATH_PREFIX):]
+        return settings.DRUPAL_FILES_URL + path
     return settings.STATIC_URL + PROJECT_MISSING_IMG
 
 
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from projects import drupal
+from projects.models import PastDrupalCourse
+
+
+class Command(BaseCommand):
+    help = ('Copy the completed courses users took part in on the old '
+            'Drupal site into the local PastDrupalCourse table.')
+
+    @transaction.commit_on_success
+    def handle(self, *args, **options):
+        if drupal.DRUPAL_DB not in settings.DATABASES:
+            raise CommandError('The %s database is not configured.' % (
+                drupal.DRUPAL_DB))
+        PastDrupalCourse.objects.all().delete()
+        count = 0
+        for username, data in drupal.load_past_courses():
+            PastDrupalCourse.objects.create(username=username, **data)
+            count += 1
+        self.stdout.write('Imported %d past course(s).\n' % count)
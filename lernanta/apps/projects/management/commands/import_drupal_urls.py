@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from drumbeat.legacy import normalize_path
+from drumbeat.models import LegacyUrl
+from projects import drupal
+
+# Rows inserted per statement.
+INSERT_CHUNK_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = ('Copy the paths of the old Drupal site from its url_alias '
+            'table into the LegacyUrl map used to redirect old URLs.')
+
+    @transaction.commit_on_success
+    def handle(self, *args, **options):
+        if drupal.DRUPAL_DB not in settings.DATABASES:
+            raise CommandError('The %s database is not configured.' % (
+                drupal.DRUPAL_DB))
+        max_length = LegacyUrl._meta.get_field('path').max_length
+        paths = set()
+        for path in drupal.load_legacy_paths():
+            path = normalize_path(path)
+            if path and len(path) <= max_length:
+                paths.add(path)
+        # Paths found by the probe task are kept.
+        paths.difference_update(LegacyUrl.objects.no_cache().values_list(
+            'path', flat=True))
+        paths = sorted(paths)
+        qn = connection.ops.quote_name
+        sql = 'INSERT INTO %s (%s) VALUES (%%s)' % (
+            qn(LegacyUrl._meta.db_table), qn('path'))
+        cursor = connection.cursor()
+        for i in xrange(0, len(paths), INSERT_CHUNK_SIZE):
+            cursor.executemany(sql, [(path,)
+                for path in paths[i:i + INSERT_CHUNK_SIZE]])
+        self.stdout.write('Imported %d legacy path(s).\n' % len(paths))
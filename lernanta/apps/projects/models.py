@@ -12,13 +12,14 @@ from django.template.loader import render_to_string
 from django.contrib.sites.models import Site
 from django.core.mail import send_mail
 from django.contrib.contenttypes.models import ContentType
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 
 from taggit.managers import TaggableManager
 
 from l10n.urlresolvers import reverse
 from drumbeat import storage
 from drumbeat.utils import get_partition_id, safe_filename
+from drumbeat.utils import save_with_unique_slug
 from drumbeat.models import ModelBase
 from relationships.models import Relationship
 from activity.models import Activity, RemoteObject, register_filter
@@ -86,7 +87,8 @@ class Project(ModelBase):
         related_name='desc_project', null=True, blank=True)
 
     image = models.ImageField(upload_to=determine_image_upload_path, null=True,
-                              storage=storage.ImageStorage(), blank=True)
+                              storage=storage.ImageStorage(variants=('card',)),
+                              blank=True)
 
     slug = models.SlugField(unique=True, max_length=110)
 
@@ -286,23 +288,9 @@ class Project(ModelBase):
 
     def save(self):
         """Make sure each project has a unique slug."""
-        count = 1
-        if not self.slug:
-            slug = slugify(self.name)
-            self.slug = slug
-            while True:
-                existing = Project.objects.filter(slug=self.slug)
-                if len(existing) == 0:
-                    break
-                self.slug = "%s-%s" % (slug, count + 1)
-                count += 1
-
-        try:
-            self.update_learn_api()
-        except:
-            log.error('Could not update course info in the learn API')
-        
-        super(Project, self).save()
+        save_with_unique_slug(self, slugify(self.name), Project.objects,
+            super(Project, self).save)
+        queue_learn_sync(self.id)
 
 
     def set_duration(self, value):
@@ -322,10 +310,17 @@ class Project(ModelBase):
         """
         return round(self.duration_hours + (self.duration_minutes / 60.0), 1)
 
-    def get_image_url(self):
-        missing = settings.STATIC_URL + 'images/project-missing.png'
-        image_path = self.image.url if self.image else missing
-        return image_path
+    def get_image_url(self, variant=None):
+        """Return the URL of the project image, of its ``variant``
+        (e.g. 'card') if given, or of the missing image."""
+        if not self.image:
+            return settings.STATIC_URL + 'images/project-missing.png'
+        if variant:
+            return storage.get_variant_url(self.image, variant)
+        return self.image.url
+
+    def get_card_image_url(self):
+        return self.get_image_url('card')
 
     def get_learn_api_data(self):
         """ return data used for learn API """
@@ -436,19 +431,20 @@ LIMIT 56;"""
             logic__submission_style=Logic.SUBMISSION_REQUIRED)
 
     def get_upon_completion_badges(self, user):
-        from badges.models import Badge, Award
+        from badges.models import (Badge, get_awarded_badge_ids,
+            get_prerequisites_map)
         if user.is_authenticated():
             profile = user.get_profile()
-            awarded_badges = Award.objects.filter(
-                user=profile).values('badge_id')
-            self_completion_badges = self.completion_badges.all()
+            awarded_badges = get_awarded_badge_ids(profile)
+            prerequisites = get_prerequisites_map()
+            self_completion_badges = set(self.completion_badges.values_list(
+                'id', flat=True))
             upon_completion_badges = []
-            for badge in self_completion_badges:
-                missing_prerequisites = badge.prerequisites.exclude(
-                    id__in=awarded_badges).exclude(
-                    id__in=self_completion_badges.values('id'))
-                if not missing_prerequisites.exists():
-                    upon_completion_badges.append(badge.id)
+            for badge_id in self_completion_badges:
+                missing_prerequisites = (prerequisites.get(badge_id, set())
+                    - awarded_badges - self_completion_badges)
+                if not missing_prerequisites:
+                    upon_completion_badges.append(badge_id)
             return Badge.objects.filter(id__in=upon_completion_badges)
         else:
             return Badge.objects.none()
@@ -533,6 +529,21 @@ register_filter('default', Project.filter_activities)
 register_filter('learning', Project.filter_learning_activities)
 
 
+# Seconds a project waits before being synced with the learn index, so
+# the saves of a request (and of the next few seconds) end in one sync.
+LEARN_SYNC_DELAY = 10
+LEARN_SYNC_KEY = 'projects_learn_sync_%s'
+
+
+def queue_learn_sync(project_id):
+    """Schedule the learn index update of a project, unless one is
+    already waiting."""
+    if cache.add(LEARN_SYNC_KEY % project_id, True, LEARN_SYNC_DELAY * 6):
+        from projects.tasks import SyncLearnIndex
+        SyncLearnIndex.apply_async(args=(project_id,),
+            countdown=LEARN_SYNC_DELAY)
+
+
 class Participation(ModelBase):
     user = models.ForeignKey('users.UserProfile',
         related_name='participations')
@@ -561,6 +572,69 @@ class PerUserTaskCompletion(ModelBase):
     url = models.URLField(max_length=1023, blank=True, null=True)
 
 
+class PastDrupalCourse(ModelBase):
+    """Completed course a user took part in on the old Drupal site.
+
+    Read-only copy of the legacy data, filled by the import_drupal_history
+    command so profile pages do not query the Drupal database."""
+    username = models.CharField(max_length=180, db_index=True)
+    name = models.CharField(max_length=765)
+    url = models.CharField(max_length=1023)
+    organizer = models.BooleanField(default=False)
+    image_url = models.CharField(max_length=1023)
+
+    def __unicode__(self):
+        return u'%s - %s' % (self.username, self.name)
+
+
+PROJECT_MEMBERS_CACHE_KEY = 'projects_members_%s'
+USER_PROJECTS_CACHE_KEY = 'projects_user_projects_%s'
+MEMBERS_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def get_project_members(project_ids):
+    """Return the members index of the given projects.
+
+    Maps each project id to a dict with the ids of every user who ever
+    participated (``members``) and of the current organizers and adopters
+    (``adopters``). Projects missing from the cache are loaded with a
+    single query."""
+    keys = dict((PROJECT_MEMBERS_CACHE_KEY % project_id, project_id)
+        for project_id in project_ids)
+    index = {}
+    for key, entry in cache.get_many(keys.keys()).iteritems():
+        index[keys[key]] = entry
+    missing = set(keys.values()) - set(index)
+    if missing:
+        loaded = dict((project_id, {'members': set(), 'adopters': set()})
+            for project_id in missing)
+        participations = Participation.objects.no_cache().filter(
+            project__in=missing).values_list('project_id', 'user_id',
+            'organizing', 'adopter', 'left_on')
+        for project_id, user_id, organizing, adopter, left_on in \
+                participations:
+            entry = loaded[project_id]
+            entry['members'].add(user_id)
+            if left_on is None and (organizing or adopter):
+                entry['adopters'].add(user_id)
+        cache.set_many(dict((PROJECT_MEMBERS_CACHE_KEY % project_id, entry)
+            for project_id, entry in loaded.iteritems()),
+            MEMBERS_CACHE_TIMEOUT)
+        index.update(loaded)
+    return index
+
+
+def get_user_project_ids(user_id):
+    """Ids of the projects the user ever participated in."""
+    key = USER_PROJECTS_CACHE_KEY % user_id
+    project_ids = cache.get(key)
+    if project_ids is None:
+        project_ids = set(Participation.objects.no_cache().filter(
+            user=user_id).values_list('project_id', flat=True))
+        cache.set(key, project_ids, MEMBERS_CACHE_TIMEOUT)
+    return project_ids
+
+
 ###########
 # Signals #
 ###########
@@ -575,3 +649,15 @@ def check_tasks_completion(sender, **kwargs):
 
 post_save.connect(check_tasks_completion, sender=PerUserTaskCompletion,
     dispatch_uid='projects_check_tasks_completion')
+
+
+def invalidate_members_index(sender, **kwargs):
+    instance = kwargs.get('instance', None)
+    if isinstance(instance, Participation):
+        cache.delete_many([PROJECT_MEMBERS_CACHE_KEY % instance.project_id,
+            USER_PROJECTS_CACHE_KEY % instance.user_id])
+
+post_save.connect(invalidate_members_index, sender=Participation,
+    dispatch_uid='projects_post_save_invalidate_members_index')
+post_delete.connect(invalidate_members_index, sender=Participation,
+    dispatch_uid='projects_post_delete_invalidate_members_index')
@@ -0,0 +1,23 @@
+from django.core.cache import cache
+
+from celery.task import Task
+
+from projects.models import Project, LEARN_SYNC_KEY
+
+
+class SyncLearnIndex(Task):
+    """Update the learn index listing and lists of a project."""
+    name = 'projects.tasks.SyncLearnIndex'
+
+    def run(self, project_id, **kwargs):
+        log = self.get_logger(**kwargs)
+        # Saves from now on queue another sync.
+        cache.delete(LEARN_SYNC_KEY % project_id)
+        try:
+            project = Project.objects.no_cache().get(id=project_id)
+        except Project.DoesNotExist:
+            return
+        try:
+            project.update_learn_api()
+        except:
+            log.error('Could not update course info in the learn API')
@@ -1,8 +1,23 @@
+import os
+import re
+import shutil
+import datetime
+import tempfile
+import threading
+import BaseHTTPServer
+
+from django.conf import settings
 from django.test import Client
 from django.contrib.auth.models import User
+from django.core.cache import get_cache
+
+from mock import patch
 
 from users.models import create_profile
-from projects.models import Project
+from projects.models import Project, Participation, get_project_members
+from projects.models import get_user_project_ids, LEARN_SYNC_KEY
+from projects.tasks import SyncLearnIndex
+from projects.utils import import_remote_images
 
 from test_utils import TestCase
 
@@ -41,6 +56,22 @@ class ProjectTests(TestCase):
         project2.save()
         self.assertEqual('my-cool-project-2', project2.slug)
 
+    def test_unique_slug_suffixes(self):
+        """Test slugs continue after the largest suffix in use"""
+        for name in ('Suffix Project', 'Suffix Project Advanced',
+                'Suffix Project', 'Suffix Project'):
+            project = Project(name=name,
+                short_description='This project is awesome',
+                long_description='No really, its good')
+            project.save()
+        self.assertEqual('suffix-project-3', project.slug)
+        Project.objects.filter(slug='suffix-project-2').delete()
+        project = Project(name='Suffix Project',
+            short_description='This project is awesome',
+            long_description='No really, its good')
+        project.save()
+        self.assertEqual('suffix-project-4', project.slug)
+
     def test_course_creation(self):
         """Test valid post request to course creation page"""
         data = {
@@ -79,3 +110,122 @@ class ProjectTests(TestCase):
         challenge = Project.objects.get(slug=slug)
         self.assertEqual(challenge.category, Project.CHALLENGE)
         self.assertEqual(challenge.duration_hours, 10)
+
+    def test_members_index(self):
+        """Test the members index follows participation changes"""
+        project = Project(
+            name='Members Index Project',
+            short_description='This project is awesome',
+            long_description='No really, its good',
+        )
+        project.save()
+        participation = Participation(user=self.user, project=project,
+            adopter=True)
+        participation.save()
+        entry = get_project_members([project.id])[project.id]
+        self.assertEqual(set([self.user.id]), entry['members'])
+        self.assertEqual(set([self.user.id]), entry['adopters'])
+        self.assertEqual(set([project.id]),
+            get_user_project_ids(self.user.id))
+        participation.left_on = datetime.datetime.now()
+        participation.save()
+        entry = get_project_members([project.id])[project.id]
+        self.assertEqual(set([self.user.id]), entry['members'])
+        self.assertEqual(set(), entry['adopters'])
+
+
+    def test_learn_sync_is_debounced(self):
+        # The dummy cache backend would not remember the queued sync.
+        cache = get_cache('locmem://')
+        with patch('projects.models.cache', cache), \
+                patch('projects.tasks.cache', cache), \
+                patch.object(SyncLearnIndex, 'apply_async') as apply_async:
+            project = Project(name='Synced Project',
+                short_description='This project is awesome',
+                long_description='No really, its good')
+            project.save()
+            project.save()
+            project.save()
+            self.assertEqual(1, apply_async.call_count)
+            self.assertEqual((project.id,),
+                apply_async.call_args[1]['args'])
+
+            with patch.object(Project, 'update_learn_api') as update:
+                SyncLearnIndex().run(project.id)
+            self.assertTrue(update.called)
+            self.assertEqual(None, cache.get(LEARN_SYNC_KEY % project.id))
+            # Saves after the sync started queue another one.
+            project.save()
+            self.assertEqual(2, apply_async.call_count)
+
+# A 1x1 transparent GIF.
+TEST_GIF = ('GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!'
+    '\xf9\x04\x01\x00\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00\x00'
+    '\x02\x02D\x01\x00;')
+
+
+class StubImageHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.startswith('/missing'):
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/gif')
+        self.send_header('Content-Length', str(len(TEST_GIF)))
+        self.end_headers()
+        self.wfile.write(TEST_GIF)
+
+    def log_message(self, *args):
+        pass
+
+
+class RemoteImagesTests(TestCase):
+
+    def setUp(self):
+        self.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0),
+            StubImageHandler)
+        self.base_url = 'http://127.0.0.1:%d/' % self.server.server_port
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.media_root = settings.MEDIA_ROOT
+        settings.MEDIA_ROOT = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(settings.MEDIA_ROOT)
+        settings.MEDIA_ROOT = self.media_root
+
+    def test_import_remote_images(self):
+        contents = [
+            '<p>One <img src="%sa.gif"> and <img src="%sa.gif"></p>' % (
+                self.base_url, self.base_url),
+            '<p><img src="%sb.gif?x=1&amp;y=2"><img src="%smissing.gif">'
+            '<img src="/static/local.png"></p>' % (
+                self.base_url, self.base_url),
+            '<p>No images</p>',
+        ]
+        new_contents = import_remote_images(contents, 1, threads=2)
+        self.assertEqual(contents[2], new_contents[2])
+        self.assertFalse(self.base_url in new_contents[0])
+        self.assertTrue('src="/static/local.png"' in new_contents[1])
+        self.assertTrue('src=""' in new_contents[1])
+        # Both urls serve the same image, which is stored once.
+        srcs = re.findall(r'src="([^"]+)"', ''.join(new_contents[:2]))
+        local_srcs = set(src for src in srcs if src.startswith(
+            settings.MEDIA_URL))
+        self.assertEqual(1, len(local_srcs))
+        path = local_srcs.pop()[len(settings.MEDIA_URL):]
+        self.assertTrue(os.path.exists(os.path.join(settings.MEDIA_ROOT,
+            path)))
+
+    def test_import_remote_images_keeps_leading_text_escaped(self):
+        content = '&lt;script&gt;alert(1)&lt;/script&gt; <img src="%sa.gif">' % (
+            self.base_url)
+        new_content = import_remote_images([content], 1)[0]
+        self.assertFalse('<script>' in new_content)
+        self.assertTrue(new_content.startswith(
+            '&lt;script&gt;alert(1)&lt;/script&gt; <img src="%s' % (
+            settings.MEDIA_URL)))
@@ -1,10 +1,13 @@
 import os
-import tempfile
+import cgi
+import hashlib
 import urllib2
 import Image
 import logging
 import datetime
 import simplejson
+from cStringIO import StringIO
+from multiprocessing.pool import ThreadPool
 
 from lxml import html
 
@@ -44,108 +47,160 @@ mime_types_extensions = {
 image_mime_types = mime_types_extensions.keys()
 
 
-def copy_image(image_url):
-    """
-    Download an image into a temp file, transcode the image and save it in
-    the project image directory.
-    """
-    try:
-        image_fp = urllib2.urlopen(image_url, timeout=5)
-    except urllib2.URLError:
-        log.warn("Error opening %s. Returning." % (image_url,))
-        return None
+# Concurrent downloads when importing remote images.
+IMAGE_IMPORT_THREADS = 8
+IMAGE_IMPORT_TIMEOUT = 5
+IMAGE_READ_SIZE = 64 * 1024
 
-    if not image_fp:
-        log.warn("Error opening %s. Returning." % (image_url,))
-        return None
-    headers = image_fp.info()
 
+def download_image(image_url):
+    """
+    Download an image and return its data, or None if it could not be
+    fetched, is too large or is not an image.
+    """
     max_image_size = getattr(settings, 'MAX_IMAGE_SIZE', None)
     if not max_image_size:
         log.warn("No MAX_IMAGE_SIZE set")
         return None
 
-    # check that file is not too large and is an image.
-    if 'Content-Length' not in headers:
-        log.warn("No content-length in headers. Returning")
-        return None
-    if int(headers['Content-Length']) > max_image_size:
-        log.warn("Content-length header exceeds max allowable size. Returning")
-        return None
-    if headers['Content-Type'] not in image_mime_types:
-        log.warn("Content-type header not an allowable mime type. Returning")
+    try:
+        image_fp = urllib2.urlopen(image_url, timeout=IMAGE_IMPORT_TIMEOUT)
+    except (urllib2.URLError, ValueError, IOError):
+        log.warn("Error opening %s. Returning." % (image_url,))
         return None
 
-    tmpfile, tmpfile_name = tempfile.mkstemp()
-    tmpfile_fp = os.fdopen(tmpfile, 'w+b')
-
-    downloaded = 0
-    chunk_size = 1024
-    while True:
-        chunk = image_fp.read(chunk_size)
-        if not chunk:
-            break
-        downloaded += chunk_size
-        if downloaded > max_image_size:
-            tmpfile_fp.close()
-            image_fp.close()
-            os.unlink(tmpfile_fp)
+    try:
+        headers = image_fp.info()
+        # check that file is not too large and is an image.
+        if 'Content-Length' not in headers:
+            log.warn("No content-length in headers. Returning")
+            return None
+        if int(headers['Content-Length']) > max_image_size:
+            log.warn("Content-length header exceeds max allowable size. "
+                "Returning")
+            return None
+        if headers['Content-Type'] not in image_mime_types:
+            log.warn("Content-type header not an allowable mime type. "
+                "Returning")
             return None
-        tmpfile_fp.write(chunk)
 
-    tmpfile_fp.close()
-    image_fp.close()
+        chunks = []
+        downloaded = 0
+        while True:
+            chunk = image_fp.read(IMAGE_READ_SIZE)
+            if not chunk:
+                break
+            downloaded += len(chunk)
+            if downloaded > max_image_size:
+                return None
+            chunks.append(chunk)
+    except IOError:
+        log.warn("Error reading %s. Returning." % (image_url,))
+        return None
+    finally:
+        image_fp.close()
 
-    return tmpfile_name
+    return ''.join(chunks)
 
 
-def strip_remote_images(content, pk):
+def save_image(data, pk):
     """
-    Find all img tags in content. Download the image referred to in the src
-    attribute, run it through PIL to strip out any comments, and replace
-    the attribute value with a local url.
+    Run downloaded image data through PIL to strip out any comments and
+    save it in the project image directory. Identical images share one
+    file. Returns the url of the saved image.
     """
-    tree = html.fromstring(content)
-    img_urls = [img.get('src', None) for img in tree.xpath('//img')]
-
     media_root = getattr(settings, 'MEDIA_ROOT', None)
     media_url = getattr(settings, 'MEDIA_URL', None)
+    image = Image.open(StringIO(data))
+    image.load()
+    image_name = '%s.%s' % (hashlib.md5(data).hexdigest(),
+        format_extensions[image.format])
+    image_path = determine_image_upload_path(Mock(pk), image_name)
+    destination = os.path.join(media_root, image_path)
+    if not os.path.exists(destination):
+        directory = os.path.dirname(destination)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        image.save(destination, image.format)
+    return os.path.join(media_url, image_path)
+
+
+def import_remote_images(contents, pk, threads=IMAGE_IMPORT_THREADS):
+    """
+    Replace the remote images of each html document in ``contents`` with
+    local copies. Returns the rewritten documents.
 
+    Each distinct url is downloaded once, by a bounded pool of threads.
+    The src attributes of the images that could not be copied are
+    emptied.
+    """
+    media_root = getattr(settings, 'MEDIA_ROOT', None)
+    media_url = getattr(settings, 'MEDIA_URL', None)
     if not media_root or not media_url:
         return None
 
-    new_urls = []
-    for img_url in img_urls:
-        tmpfile = copy_image(img_url)
-        if tmpfile is None:
-            new_urls.append("")
+    trees = [html.fragment_fromstring(content, create_parent='div')
+        if content and content.strip() else None for content in contents]
+    images = [img for tree in trees if tree is not None
+        for img in tree.iter('img')]
+    img_urls = set()
+    for img in images:
+        src = img.get('src', '')
+        if src.startswith('http://') or src.startswith('https://'):
+            img_urls.add(src)
+    img_urls = list(img_urls)
+
+    if img_urls:
+        pool = ThreadPool(min(threads, len(img_urls)))
+        try:
+            downloads = pool.map(download_image, img_urls)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        downloads = []
+
+    new_urls = {}
+    for img_url, data in zip(img_urls, downloads):
+        new_urls[img_url] = ""
+        if data is None:
             continue
         try:
-            image_basename = img_url.split('/')[-1]
-            image_path = determine_image_upload_path(Mock(pk), image_basename)
-            destination = os.path.join(media_root, image_path)
-
-            image = Image.open(tmpfile)
-            basename, ext = os.path.splitext(destination)
-            if (ext[1:] not in mime_types_extensions.values()):
-                destination = "%s.%s" % (
-                    basename, format_extensions[image.format])
-            image.save(destination, image.format)
-            new_urls.append(os.path.join(media_url, image_path))
+            new_urls[img_url] = save_image(data, pk)
         except Exception, e:
             log.warn("Error stripping out remote image: %s" % (e,))
-            new_urls.append("")
-        finally:
-            os.unlink(tmpfile)
 
-    for i in range(len(img_urls)):
-        # markdown replaces & with &amp; even if it's part of a querystring
-        old = img_urls[i].replace('&', '&amp;')
-        new = new_urls[i]
-        log.debug("replacing %s with %s" % (old, new))
-        content = content.replace(old, new)
+    new_contents = []
+    for content, tree in zip(contents, trees):
+        replaced = False
+        for img in tree.iter('img') if tree is not None else ():
+            src = img.get('src', '')
+            if src in new_urls:
+                log.debug("replacing %s with %s" % (src, new_urls[src]))
+                img.set('src', new_urls[src])
+                replaced = True
+        # Documents without remote images are returned untouched.
+        if not replaced:
+            new_contents.append(content)
+            continue
+        # lxml decoded the entities of the leading text, the children are
+        # serialized escaped.
+        parts = [cgi.escape(tree.text or '')]
+        parts.extend(html.tostring(child, encoding=unicode)
+            for child in tree)
+        new_contents.append(u''.join(parts))
+    return new_contents
+
+
+def strip_remote_images(content, pk):
+    """
+    Find all img tags in content. Download the image referred to in the src
+    attribute, run it through PIL to strip out any comments, and replace
+    the attribute value with a local url.
+    """
+    new_contents = import_remote_images([content], pk)
+    return new_contents[0] if new_contents is not None else None
 
-    return content
 
 def json_date_encoder(obj):
     if isinstance(obj, datetime.date):
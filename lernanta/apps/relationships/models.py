@@ -3,7 +3,7 @@ import logging
 
 from django.core.exceptions import ValidationError
 from django.db import models
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.utils.translation import ugettext_lazy as _
 from django.contrib.sites.models import Site
 from django.contrib.contenttypes.models import ContentType
@@ -39,6 +39,11 @@ class Relationship(ModelBase):
             ('source', 'target_project'),
         )
 
+    def __init__(self, *args, **kwargs):
+        super(Relationship, self).__init__(*args, **kwargs)
+        # Whether the stored row counts as a follower of target_user.
+        self._counted = self.id is not None and not self.deleted
+
     def __unicode__(self):
         return unicode(self.target_user or self.target_project)
 
@@ -101,3 +106,19 @@ def follow_handler(sender, **kwargs):
 
 post_save.connect(follow_handler, sender=Relationship,
     dispatch_uid='relationships_follow_handler')
+
+
+def update_followers_count(sender, **kwargs):
+    rel = kwargs.get('instance', None)
+    if not isinstance(rel, Relationship) or not rel.target_user_id:
+        return
+    from users.models import change_followers_count
+    counted = not rel.deleted and kwargs.get('signal') is post_save
+    if counted != rel._counted:
+        change_followers_count(rel.target_user_id, 1 if counted else -1)
+        rel._counted = counted
+
+post_save.connect(update_followers_count, sender=Relationship,
+    dispatch_uid='relationships_post_save_update_followers_count')
+post_delete.connect(update_followers_count, sender=Relationship,
+    dispatch_uid='relationships_post_delete_update_followers_count')
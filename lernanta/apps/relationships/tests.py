@@ -8,6 +8,7 @@ from activity.models import Activity
 from activity.schema import verbs
 from relationships.models import Relationship
 from users.models import UserProfile, create_profile
+from users.models import reconcile_followers_count
 from projects.models import Project
 
 
@@ -123,3 +124,31 @@ class RelationshipsTests(TestCase):
         self.assertEqual(self.user_one, activity.actor)
         self.assertEqual(self.user_two, activity.target_object.target_user)
         self.assertEqual(verbs['follow'], activity.verb)
+
+    def test_followers_count(self):
+        """Test the followers count follows (un)follows."""
+        stale = UserProfile.objects.no_cache().get(id=self.user_two.id)
+        relationship = Relationship(
+            source=self.user_one,
+            target_user=self.user_two,
+        )
+        relationship.save()
+        # Saving a profile loaded before the follow keeps the count.
+        stale.location = 'Somewhere'
+        stale.save()
+        self.assertEqual(0, stale.followers_count)
+        profile = UserProfile.objects.no_cache().get(id=self.user_two.id)
+        self.assertEqual(1, profile.followers_count)
+        self.assertEqual('Somewhere', profile.location)
+        self.assertEqual([profile], list(UserProfile.objects.get_popular(5)))
+        relationship.deleted = True
+        relationship.save()
+        profile = UserProfile.objects.no_cache().get(id=self.user_two.id)
+        self.assertEqual(0, profile.followers_count)
+        relationship.deleted = False
+        relationship.save()
+        UserProfile.objects.filter(id=self.user_two.id).update(
+            followers_count=5)
+        self.assertEqual(1, reconcile_followers_count())
+        profile = UserProfile.objects.no_cache().get(id=self.user_two.id)
+        self.assertEqual(1, profile.followers_count)
@@ -1,5 +1,11 @@
+import hashlib
+
 import bleach
 
+from django.utils.encoding import smart_str
+
+from drumbeat.utils import LRUCache
+
 
 DEFAULT_CONFIG = {
     'skin': 'v2',
@@ -99,13 +105,70 @@ BLEACH_CLEAN = {
         'styles': RICH_ALLOWED_STYLES,
         'strip': True,
     },
+    # Course content pasted by users, see content2.utils.
+    'user_content': {
+        'tags': ('table', 'tr', 'th', 'td', 'tbody', 'a', 'iframe'),
+        'attributes': {'a': ['href'], 'iframe': ['src', 'width', 'height']},
+        'styles': [],
+        'strip': True,
+    },
+    # Entries of the news feeds, see news.tasks.
+    'feed': {
+        'tags': ('img',),
+        'attributes': {'img': ['src', 'alt']},
+        'styles': [],
+        'strip': True,
+        'strip_comments': True,
+    },
 }
 
+# Cleaned values remembered by each cleaner.
+CLEAN_CACHE_SIZE = 500
+
+
+class HtmlCleaner(object):
+    """Cleans html with one bleach configuration.
+
+    The hashes of recent inputs are mapped to their cleaned value, and the
+    cleaned values to themselves, so cleaning the same or already cleaned
+    html again (a form value saved to a model, an unchanged feed entry)
+    does not parse it again."""
+
+    def __init__(self, **options):
+        self.options = options
+        self.cleaned = LRUCache(CLEAN_CACHE_SIZE)
+
+    def _key(self, value):
+        return hashlib.md5(smart_str(value)).digest()
+
+    def clean(self, value):
+        if not value:
+            return value
+        key = self._key(value)
+        cleaned = self.cleaned.get(key)
+        if cleaned is None:
+            cleaned = bleach.clean(value, **self.options)
+            self.cleaned.set(key, cleaned)
+            self.cleaned.set(self._key(cleaned), cleaned)
+        return cleaned
+
+    def clean_many(self, values):
+        """Clean a sequence of values, for imports and migrations.
+        Repeated values are only cleaned once."""
+        return [self.clean(value) for value in values]
+
+
+CLEANERS = dict((config_name, HtmlCleaner(**options))
+    for config_name, options in BLEACH_CLEAN.items())
+
 
 def clean_html(config_name, value):
     if config_name == 'trusted':
         return value
-    if value:
-        return bleach.clean(value, **BLEACH_CLEAN[config_name])
-    else:
-        return value
+    return CLEANERS[config_name].clean(value)
+
+
+def clean_html_many(config_name, values):
+    if config_name == 'trusted':
+        return list(values)
+    return CLEANERS[config_name].clean_many(values)
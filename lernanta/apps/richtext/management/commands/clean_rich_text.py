@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import get_models
+
+from richtext import clean_html_many
+from richtext.models import RichTextField
+
+CHUNK_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = ('Clean the stored values of every rich text field again, after '
+            'the allowed html changed or rows were imported. Version '
+            'histories are left as stored.')
+
+    def handle(self, *args, **options):
+        changed = 0
+        for model in get_models():
+            if self.is_versioned(model):
+                # Deltas index the snapshot text by token ranges (see
+                # drumbeat.versions), cleaning a snapshot in place would
+                # corrupt the versions built on it.
+                continue
+            for field in model._meta.fields:
+                if isinstance(field, RichTextField) and \
+                        field.config_name != 'trusted':
+                    changed += self.clean_field(model, field)
+        self.stdout.write('Cleaned %d value(s).\n' % changed)
+
+    def is_versioned(self, model):
+        names = [field.name for field in model._meta.fields]
+        return 'base' in names and 'delta' in names
+
+    def clean_field(self, model, field):
+        manager = model._default_manager
+        # The updates below bypass cache-machine, the rows read must too.
+        if hasattr(manager, 'no_cache'):
+            rows = manager.no_cache()
+        else:
+            rows = manager.all()
+        ids = list(rows.values_list('id', flat=True).order_by('id'))
+        changed_ids = []
+        for start in range(0, len(ids), CHUNK_SIZE):
+            chunk = list(rows.filter(id__in=ids[start:start + CHUNK_SIZE]
+                ).values_list('id', field.attname))
+            cleaned = clean_html_many(field.config_name,
+                [value for row_id, value in chunk])
+            for (row_id, value), cleaned_value in zip(chunk, cleaned):
+                if cleaned_value != value:
+                    manager.filter(id=row_id).update(
+                        **{field.attname: cleaned_value})
+                    changed_ids.append(row_id)
+            transaction.commit_unless_managed()
+        if changed_ids and hasattr(manager, 'invalidate'):
+            manager.invalidate(*rows.filter(id__in=changed_ids))
+        return len(changed_ids)
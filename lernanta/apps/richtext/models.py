@@ -1,6 +1,7 @@
 import datetime
 
 from django.db import models
+from django.db.models.signals import post_init
 from django.utils import simplejson as json
 
 from ckeditor.fields import RichTextField as BaseRichTextField
@@ -13,6 +14,24 @@ from richtext import clean_html
 
 
 class RichTextField(BaseRichTextField):
+    """Text field cleaned on save. Values loaded from the database or
+    already cleaned are remembered per instance, so saves that do not
+    change the field skip the cleaning."""
+
+    def contribute_to_class(self, cls, name):
+        super(RichTextField, self).contribute_to_class(cls, name)
+        post_init.connect(self.remember_clean_value, sender=cls,
+            weak=False)
+
+    def remember_clean_value(self, sender, instance, **kwargs):
+        # Only rows loaded from the database have their id set here.
+        if instance.pk is not None:
+            self._set_clean_value(instance, getattr(instance, self.attname))
+
+    def _set_clean_value(self, instance, value):
+        if not hasattr(instance, '_richtext_clean_values'):
+            instance._richtext_clean_values = {}
+        instance._richtext_clean_values[self.attname] = value
 
     def formfield(self, **kwargs):
         return super(RichTextField, self).formfield(
@@ -20,8 +39,11 @@ class RichTextField(BaseRichTextField):
 
     def pre_save(self, model_instance, add):
         value = super(RichTextField, self).pre_save(model_instance, add)
-        setattr(model_instance, self.attname, clean_html(self.config_name,
-            value))
+        clean_values = getattr(model_instance, '_richtext_clean_values', {})
+        if add or clean_values.get(self.attname) != value:
+            value = clean_html(self.config_name, value)
+            setattr(model_instance, self.attname, value)
+            self._set_clean_value(model_instance, value)
         return value
 
 add_introspection_rules([], ["^richtext\.models\.RichTextField"])
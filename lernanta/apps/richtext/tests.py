@@ -0,0 +1,43 @@
+from django.contrib.auth.models import User
+
+from mock import patch
+from test_utils import TestCase
+
+from users.models import UserProfile, create_profile
+from richtext import clean_html
+
+
+class RichTextFieldTests(TestCase):
+
+    def setUp(self):
+        self.profile = create_profile(User(username='testuser',
+            email='test@mail.org'))
+        self.profile.bio = '<p>About me</p>'
+        self.profile.save()
+
+    def get_profile(self):
+        return UserProfile.objects.no_cache().get(id=self.profile.id)
+
+    def test_unchanged_value_is_not_cleaned(self):
+        profile = self.get_profile()
+        profile.location = 'Somewhere'
+        with patch('richtext.models.clean_html') as mock_clean_html:
+            profile.save()
+        self.assertFalse(mock_clean_html.called)
+        self.assertEqual(self.get_profile().bio, '<p>About me</p>')
+
+    def test_changed_value_is_cleaned(self):
+        profile = self.get_profile()
+        profile.bio = '<p onclick="x()">About me</p><script>x()</script>'
+        with patch('richtext.models.clean_html',
+                wraps=clean_html) as mock_clean_html:
+            profile.save()
+            # Saving again does not clean the cleaned value again.
+            profile.save()
+        self.assertEqual(mock_clean_html.call_count, 1)
+        self.assertNotIn('onclick', profile.bio)
+        self.assertNotIn('<script>', profile.bio)
+        # The cleaned value is the one written to the database.
+        stored = UserProfile.objects.no_cache().filter(
+            id=profile.id).values_list('bio', flat=True)[0]
+        self.assertEqual(stored, profile.bio)
@@ -0,0 +1,22 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from schools.statistics import update_statistics
+
+
+class Command(BaseCommand):
+    help = ('Update the statistics of every school with the activity '
+            'since the last update.')
+
+    option_list = BaseCommand.option_list + (
+        make_option('--rebuild', action='store_true', dest='rebuild',
+            default=False, help="Recompute today's statistics from "
+            "scratch, e.g. after projects moved between schools."),
+    )
+
+    @transaction.commit_on_success
+    def handle(self, *args, **options):
+        update_statistics(rebuild=options['rebuild'])
+        self.stdout.write('School statistics updated.\n')
@@ -7,6 +7,7 @@ from django.conf import settings
 
 from drumbeat.models import ModelBase
 from drumbeat.utils import get_partition_id, safe_filename
+from drumbeat.utils import save_with_unique_slug
 from drumbeat import storage
 from richtext.models import RichTextField
 from users.models import UserProfile
@@ -37,7 +38,8 @@ class School(ModelBase):
         related_name='school_featured', null=True, blank=True)
 
     logo = models.ImageField(upload_to=schools_determine_image_upload_path, null=True,
-                              storage=storage.ImageStorage(), blank=True)
+                              storage=storage.ImageStorage(variants=('logo',)),
+                              blank=True)
     groups_icon = models.ImageField(upload_to=schools_determine_image_upload_path,
         null=True, storage=storage.ImageStorage(), blank=True)
     background = models.ImageField(upload_to=schools_determine_image_upload_path,
@@ -77,19 +79,16 @@ class School(ModelBase):
             'slug': self.slug,
         })
 
+    def get_logo_url(self):
+        """Return the URL of the resized school logo, if any."""
+        if self.logo:
+            return storage.get_variant_url(self.logo, 'logo')
+        return None
+
     def save(self):
         """Make sure each school has a unique slug."""
-        count = 1
-        if not self.slug:
-            slug = slugify(self.name)
-            self.slug = slug
-            while True:
-                existing = School.objects.filter(slug=self.slug)
-                if len(existing) == 0:
-                    break
-                self.slug = "%s-%s" % (slug, count + 1)
-                count += 1
-        super(School, self).save()
+        save_with_unique_slug(self, slugify(self.name), School.objects,
+            super(School, self).save)
 
 
 def projectsets_determine_image_upload_path(instance, filename):
@@ -165,3 +164,39 @@ class ProjectSetIndex(ModelBase):
     projectset = models.ForeignKey('schools.ProjectSet')
     project = models.ForeignKey('projects.Project')
     index = models.IntegerField()
+
+
+class SchoolStatistics(ModelBase):
+    """Statistics of the projects of a school as of the end of ``date``
+    (or so far, for today's row). One row is kept per school and day.
+
+    Rows are maintained by schools.statistics.update_statistics."""
+    school = models.ForeignKey(School, related_name='statistics')
+    date = models.DateField()
+    study_groups = models.PositiveIntegerField(default=0)
+    courses = models.PositiveIntegerField(default=0)
+    challenges = models.PositiveIntegerField(default=0)
+    organizers = models.PositiveIntegerField(default=0)
+    participants = models.PositiveIntegerField(default=0)
+    followers = models.PositiveIntegerField(default=0)
+    page_comments = models.PositiveIntegerField(default=0)
+    statuses = models.PositiveIntegerField(default=0)
+    activity_comments = models.PositiveIntegerField(default=0)
+    page_edits = models.PositiveIntegerField(default=0)
+    signup_answers = models.PositiveIntegerField(default=0)
+    signup_comments = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = (('school', 'date'),)
+
+    def __unicode__(self):
+        return u'%s %s' % (self.school, self.date)
+
+
+class StatisticsMark(ModelBase):
+    """Highest id of a table already counted in the school statistics."""
+    name = models.CharField(max_length=30, unique=True)
+    last_id = models.PositiveIntegerField(default=0)
+
+    def __unicode__(self):
+        return u'%s: %s' % (self.name, self.last_id)
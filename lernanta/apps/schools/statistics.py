@@ -0,0 +1,214 @@
+"""
+Incremental per-school statistics.
+
+``update_statistics`` keeps one ``SchoolStatistics`` row per school and
+day. Today's row starts as a copy of the latest previous row. The rows
+added to the counted tables since the last run (tracked with a
+``StatisticsMark`` high-water mark per table) are added to it, and the
+distinct people counts are recomputed only for the schools whose
+participations or followers changed.
+
+Only inserts are tracked: deleted rows and projects moved between
+schools are picked up by a rebuild (``manage.py
+update_school_statistics --rebuild``).
+"""
+import datetime
+import logging
+
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Count, F, Max
+
+from activity.models import Activity
+from activity.schema import verbs
+from content.models import Page
+from projects.models import Participation, Project
+from relationships.models import Relationship
+from replies.models import PageComment
+from signups.models import SignupAnswer
+from statuses.models import Status
+
+from schools.models import School, SchoolStatistics, StatisticsMark
+
+log = logging.getLogger(__name__)
+
+# Days of history shown to the organizers.
+HISTORY_DAYS = 30
+
+# (project category, SchoolStatistics field), in display order.
+CATEGORY_FIELDS = (
+    (Project.STUDY_GROUP, 'study_groups'),
+    (Project.COURSE, 'courses'),
+    (Project.CHALLENGE, 'challenges'),
+)
+
+
+def _comment_counts(first_id, last_id):
+    project_ct = ContentType.objects.get_for_model(Project)
+    fields = {
+        ContentType.objects.get_for_model(Page).id: 'page_comments',
+        ContentType.objects.get_for_model(Activity).id: 'activity_comments',
+        ContentType.objects.get_for_model(SignupAnswer).id:
+            'signup_comments',
+    }
+    rows = list(PageComment.objects.filter(id__gt=first_id,
+        id__lte=last_id, scope_content_type=project_ct,
+        page_content_type__in=fields.keys()).values('scope_id',
+        'page_content_type').annotate(count=Count('id')).order_by())
+    school_ids = dict(Project.objects.filter(
+        id__in=set(row['scope_id'] for row in rows),
+        school__isnull=False).values_list('id', 'school_id'))
+    for row in rows:
+        if row['scope_id'] in school_ids:
+            yield (school_ids[row['scope_id']],
+                fields[row['page_content_type']], row['count'])
+
+
+def _grouped_counts(objects, school_field, field):
+    rows = objects.filter(**{school_field + '__isnull': False}).values(
+        school_field).annotate(count=Count('id')).order_by()
+    for row in rows:
+        yield row[school_field], field, row['count']
+
+
+def _status_counts(first_id, last_id):
+    statuses = Status.objects.filter(id__gt=first_id, id__lte=last_id)
+    return _grouped_counts(statuses, 'project__school', 'statuses')
+
+
+def _page_edit_counts(first_id, last_id):
+    page_ct = ContentType.objects.get_for_model(Page)
+    edits = Activity.objects.filter(id__gt=first_id, id__lte=last_id,
+        target_content_type=page_ct, verb=verbs['update'])
+    return _grouped_counts(edits, 'scope_object__school', 'page_edits')
+
+
+def _signup_answer_counts(first_id, last_id):
+    answers = SignupAnswer.objects.filter(id__gt=first_id, id__lte=last_id)
+    return _grouped_counts(answers, 'sign_up__project__school',
+        'signup_answers')
+
+
+# (mark name, model, function yielding (school id, field, count) for the
+# rows with ids in a range).
+COUNTED_TABLES = (
+    ('comments', PageComment, _comment_counts),
+    ('statuses', Status, _status_counts),
+    ('page_edits', Activity, _page_edit_counts),
+    ('signup_answers', SignupAnswer, _signup_answer_counts),
+)
+
+# (mark name, model, school lookup) of the tables changing who takes part
+# in or follows the projects of a school.
+PEOPLE_TABLES = (
+    ('participations', Participation, 'project__school'),
+    ('relationships', Relationship, 'target_project__school'),
+)
+
+
+def _claim_rows(name, model, rebuild):
+    """Move the high-water mark of ``name`` to the last id of ``model``
+    and return the range of ids to count, or None if there are no new
+    rows or a concurrent run claimed them first."""
+    mark, created = StatisticsMark.objects.get_or_create(name=name)
+    first_id = 0 if rebuild else mark.last_id
+    last_id = model.objects.aggregate(Max('id'))['id__max'] or 0
+    if last_id <= first_id:
+        return None
+    claimed = StatisticsMark.objects.filter(id=mark.id,
+        last_id=mark.last_id).update(last_id=last_id)
+    if not claimed:
+        return None
+    return first_id, last_id
+
+
+def get_people_counts(school):
+    """Return the number of organizers, participants and followers of the
+    projects of ``school``."""
+    project_ids = school.projects.values('id')
+    participations = Participation.objects.filter(project__in=project_ids)
+    organizer_ids = participations.filter(organizing=True).values(
+        'user__id')
+    participant_ids = participations.filter(organizing=False).values(
+        'user__id')
+    follower_ids = Relationship.objects.filter(
+        target_project__in=project_ids).exclude(
+        source__in=organizer_ids).exclude(
+        source__in=participant_ids).values('source_id').distinct()
+    return {
+        'organizers': organizer_ids.distinct().count(),
+        'participants': participant_ids.distinct().count(),
+        'followers': follower_ids.distinct().count(),
+    }
+
+
+def _start_day(school_ids, today, rebuild):
+    """Make sure every school has a row for ``today``."""
+    rows = SchoolStatistics.objects.no_cache().filter(date=today)
+    if rebuild:
+        rows.delete()
+        existing = set()
+    else:
+        existing = set(rows.values_list('school_id', flat=True))
+    for school_id in school_ids:
+        if school_id in existing:
+            continue
+        statistics = SchoolStatistics(school_id=school_id, date=today)
+        if not rebuild:
+            previous = SchoolStatistics.objects.no_cache().filter(
+                school=school_id, date__lt=today).order_by('-date')[:1]
+            for row in previous:
+                for field in row._meta.fields:
+                    if field.name not in ('id', 'school', 'date'):
+                        setattr(statistics, field.attname,
+                            getattr(row, field.attname))
+        statistics.save()
+
+
+def update_statistics(today=None, rebuild=False):
+    """Add the rows created since the last run to today's statistics of
+    every school. With ``rebuild`` today's rows are recomputed from
+    scratch."""
+    today = today or datetime.date.today()
+    school_ids = list(School.objects.values_list('id', flat=True))
+    _start_day(school_ids, today, rebuild)
+    todays_rows = SchoolStatistics.objects.filter(date=today)
+
+    for name, model, get_counts in COUNTED_TABLES:
+        id_range = _claim_rows(name, model, rebuild)
+        if not id_range:
+            continue
+        for school_id, field, count in get_counts(*id_range):
+            todays_rows.filter(school=school_id).update(
+                **{field: F(field) + count})
+
+    changed_school_ids = set(school_ids) if rebuild else set()
+    for name, model, school_field in PEOPLE_TABLES:
+        id_range = _claim_rows(name, model, rebuild)
+        if id_range and not rebuild:
+            changed_school_ids.update(model.objects.filter(
+                id__gt=id_range[0], id__lte=id_range[1]).values_list(
+                school_field, flat=True).distinct())
+    changed_school_ids.discard(None)
+    for school in School.objects.filter(id__in=changed_school_ids):
+        todays_rows.filter(school=school).update(**get_people_counts(school))
+
+    category_fields = dict(CATEGORY_FIELDS)
+    category_counts = dict((school_id, dict.fromkeys(
+        category_fields.values(), 0)) for school_id in school_ids)
+    projects = Project.objects.filter(school__isnull=False,
+        category__in=category_fields.keys()).values('school',
+        'category').annotate(count=Count('id')).order_by()
+    for row in projects:
+        if row['school'] in category_counts:
+            category_counts[row['school']][
+                category_fields[row['category']]] = row['count']
+    for school_id, counts in category_counts.iteritems():
+        todays_rows.filter(school=school_id).update(**counts)
+    log.debug('Updated the statistics of %d school(s).' % len(school_ids))
+
+
+def get_statistics_history(school, days=HISTORY_DAYS):
+    """Return the statistics rows of ``school`` for the last ``days``
+    days with rows, newest first."""
+    return list(SchoolStatistics.objects.no_cache().filter(
+        school=school).order_by('-date')[:days])
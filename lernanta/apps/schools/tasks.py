@@ -0,0 +1,13 @@
+from celery.schedules import crontab
+from celery.decorators import periodic_task
+
+from django.db import transaction
+
+from schools.statistics import update_statistics
+
+
+@periodic_task(run_every=crontab(minute=15),
+    name='schools.tasks.update_statistics')
+def update_statistics_task():
+    """Add the activity of the last hour to the school statistics."""
+    transaction.commit_on_success(update_statistics)()
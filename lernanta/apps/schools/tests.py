@@ -1,8 +1,13 @@
+import datetime
+
 from django.test import Client
 from django.contrib.auth.models import User
 
 from users.models import create_profile
+from projects.models import Participation, Project
+from statuses.models import Status
 from schools.models import School
+from schools.statistics import get_statistics_history, update_statistics
 
 from test_utils import TestCase
 
@@ -38,3 +43,33 @@ class SchoolTests(TestCase):
             school
         )
         
+
+    def test_statistics_are_incremental(self):
+        school = School(name='Statistics School', short_name='stats',
+            description='<p>Counting things.</p>')
+        school.save()
+        project = Project(name='Counted Project',
+            short_description='This project is awesome',
+            long_description='No really, its good', school=school)
+        project.save()
+        Participation(user=self.user, project=project,
+            organizing=True).save()
+        Status(author=self.user, project=project, status='Hello').save()
+        today = datetime.date.today()
+        update_statistics(today)
+        statistics = get_statistics_history(school)[0]
+        self.assertEqual(1, statistics.statuses)
+        self.assertEqual(1, statistics.organizers)
+        self.assertEqual(1, statistics.study_groups)
+        # Rows already counted are not counted again.
+        Status(author=self.user, project=project, status='Again').save()
+        update_statistics(today)
+        update_statistics(today)
+        self.assertEqual(2, get_statistics_history(school)[0].statuses)
+        # The next day starts from the previous totals.
+        update_statistics(today + datetime.timedelta(days=1))
+        history = get_statistics_history(school)
+        self.assertEqual(2, len(history))
+        self.assertEqual(2, history[0].statuses)
+        update_statistics(today, rebuild=True)
+        self.assertEqual(2, get_statistics_history(school)[1].statuses)
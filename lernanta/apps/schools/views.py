@@ -4,29 +4,21 @@ from django.utils.translation import ugettext as _
 from django import http
 from django.utils import simplejson
 from django.views.decorators.http import require_http_methods
-from django.contrib.contenttypes.models import ContentType
 
 from commonware.decorators import xframe_sameorigin
 
 from users.decorators import login_required
 from drumbeat import messages
-from projects.models import Project, Participation
 from users.models import UserProfile
 from l10n.urlresolvers import reverse
-from content.models import Page
-from replies.models import PageComment
-from statuses.models import Status
-from activity.models import Activity
-from activity.schema import verbs
-from relationships.models import Relationship
-from signups.models import SignupAnswer
 from tracker.models import get_google_tracking_context
 from learn.models import add_course_to_list
 from learn.models import remove_course_from_list
 from learn.models import get_courses_by_list
 
 from schools.decorators import school_organizer_required
-from schools.models import School, ProjectSet
+from schools.models import School, ProjectSet, SchoolStatistics
+from schools.statistics import CATEGORY_FIELDS, get_statistics_history
 from schools import forms as school_forms
 from django.views.generic.simple import redirect_to
 
@@ -429,56 +421,26 @@ def edit_membership_delete(request, slug):
 @school_organizer_required
 def edit_statistics(request, slug):
     school = get_object_or_404(School, slug=slug)
-
-    all_projects = school.projects.all()
-    project_counts = {}
-    for category, name in Project.CATEGORY_CHOICES:
-        project_counts[category] = 0
-    for project in all_projects:
-        project_counts[project.category] += 1
-    project_ct = ContentType.objects.get_for_model(Project)
-    project_ids = school.projects.values('id')
-    comments = PageComment.objects.filter(scope_content_type=project_ct,
-        scope_id__in=project_ids)
-    page_ct = ContentType.objects.get_for_model(Page)
-    page_comments_count = comments.filter(page_content_type=page_ct).count()
-    statuses_count = Status.objects.filter(project__in=project_ids).count()
-    status_ct = ContentType.objects.get_for_model(Activity)
-    activity_comments_count = comments.filter(
-        page_content_type=status_ct).count()
-    page_edits_count = Activity.objects.filter(scope_object__in=project_ids,
-       target_content_type=page_ct, verb=verbs['update']).count()
-    participations = Participation.objects.filter(project__in=project_ids)
-    organizer_ids = participations.filter(organizing=True).values(
-        'user__id')
-    participant_ids = participations.filter(organizing=False).values(
-        'user__id')
-    follower_ids = Relationship.objects.filter(
-        target_project__in=project_ids).exclude(
-        source__in=organizer_ids).exclude(
-        source__in=participant_ids).values('source_id').distinct()
-    organizers_count = organizer_ids.distinct().count()
-    participants_count = participant_ids.distinct().count()
-    followers_count = follower_ids.distinct().count()
-    signup_answers_count = SignupAnswer.objects.filter(
-        sign_up__project__in=project_ids).count()
-    signup_answer_ct = ContentType.objects.get_for_model(SignupAnswer)
-    signup_comments_count = comments.filter(
-        page_content_type=signup_answer_ct).count()
+    history = get_statistics_history(school)
+    statistics = history[0] if history else SchoolStatistics(school=school)
+    project_counts = [(category, getattr(statistics, field))
+        for category, field in CATEGORY_FIELDS]
 
     return render_to_response('schools/school_edit_statistics.html', {
         'school': school,
         'statistics_tab': True,
-        'project_counts': project_counts.items(),
-        'page_comments_count': page_comments_count,
-        'statuses_count': statuses_count,
-        'activity_comments_count': activity_comments_count,
-        'page_edits_count': page_edits_count,
-        'organizers_count': organizers_count,
-        'participants_count': participants_count,
-        'followers_count': followers_count,
-        'signup_answers_count': signup_answers_count,
-        'signup_comments_count': signup_comments_count,
+        'statistics_date': statistics.date,
+        'statistics_history': history[::-1],
+        'project_counts': project_counts,
+        'page_comments_count': statistics.page_comments,
+        'statuses_count': statistics.statuses,
+        'activity_comments_count': statistics.activity_comments,
+        'page_edits_count': statistics.page_edits,
+        'organizers_count': statistics.organizers,
+        'participants_count': statistics.participants,
+        'followers_count': statistics.followers,
+        'signup_answers_count': statistics.signup_answers,
+        'signup_comments_count': statistics.signup_comments,
     }, context_instance=RequestContext(request))
 
 
@@ -0,0 +1,25 @@
+import datetime
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from tracker.models import rollup_statistics
+
+
+class Command(BaseCommand):
+    help = ('Recount the daily scoreboard statistics of the last days. '
+            'Run it once after installing the DailyStatistic table.')
+
+    option_list = BaseCommand.option_list + (
+        make_option('--days', action='store', type='int', dest='days',
+            default=62, help='Number of days to recount, today included.'),
+    )
+
+    @transaction.commit_on_success
+    def handle(self, *args, **options):
+        today = datetime.date.today()
+        start = today - datetime.timedelta(days=max(options['days'], 1) - 1)
+        rollup_statistics(start, today)
+        self.stdout.write('Rolled up statistics from %s to %s.\n' % (
+            start, today))
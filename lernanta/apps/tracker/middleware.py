@@ -48,8 +48,6 @@ class PageViewTrackerMiddleware:
             return
 
         if request.user.is_authenticated():
-            now = datetime.datetime.now()
-            profile = request.user.get_profile()
             pageview.user = request.user
 
         try:
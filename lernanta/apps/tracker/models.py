@@ -1,41 +1,65 @@
 import datetime
 
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.db import models
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes import generic
 from django.contrib.sites.models import Site
+from django.db.models.signals import post_save, post_delete
 
 from drumbeat.models import ModelBase
 from content.models import Page
-from projects.models import Project
+from projects.models import Project, Participation
 from activity.schema import verbs
 from activity.models import Activity
 from replies.models import PageComment
 from users.models import UserProfile
+from signups.models import SignupAnswer
 
 from tracker.utils import force_date
 
 
+TRACKING_CODES_CACHE_KEY = 'google_analytics_tracking_codes_map'
+TRACKING_CODES_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def get_tracking_codes_map():
+    """Return the tracking codes and the codes attached to each target.
+
+    The map is built from two queries and cached until a tracking code
+    or a tracking target changes (see signals below)."""
+    codes_map = cache.get(TRACKING_CODES_CACHE_KEY)
+    if codes_map is None:
+        codes = GoogleAnalyticsTrackingCode.objects.no_cache().order_by('id')
+        targets = {}
+        trackings = GoogleAnalyticsTracking.objects.no_cache().values_list(
+            'target_content_type_id', 'target_id', 'tracking_code_id')
+        for content_type_id, target_id, code_id in trackings:
+            targets.setdefault((content_type_id, target_id), set()).add(
+                code_id)
+        codes_map = {
+            'codes': list(codes),
+            'targets': targets,
+        }
+        cache.set(TRACKING_CODES_CACHE_KEY, codes_map,
+            TRACKING_CODES_CACHE_TIMEOUT)
+    return codes_map
+
+
 def get_google_tracking_context(instance=None):
     codes_key = 'google_analytics_tracking_codes'
+    codes_map = get_tracking_codes_map()
+    codes = codes_map['codes']
     if instance:
-        instance_ct = ContentType.objects.get_for_model(
-            instance)
+        targets = codes_map['targets']
+        instance_ct = ContentType.objects.get_for_model(instance)
+        codes_ids = set(targets.get((instance_ct.id, instance.pk), ()))
         site_ct = ContentType.objects.get_for_model(Site)
-        codes_ids = []
         if instance_ct != site_ct:
             site = Site.objects.get_current()
-            codes_ids.extend(get_google_tracking_context(
-                site)[codes_key].values_list(
-                'id', flat=True))
-        codes_ids.extend(GoogleAnalyticsTracking.objects.filter(
-            target_content_type=instance_ct, target_id=instance.pk).values_list(
-            'tracking_code_id', flat=True))
-        codes = GoogleAnalyticsTrackingCode.objects.filter(
-            id__in=codes_ids)
-    else:
-        codes = GoogleAnalyticsTrackingCode.objects.all()
+            codes_ids.update(targets.get((site_ct.id, site.pk), ()))
+        codes = [code for code in codes if code.id in codes_ids]
     return {codes_key: codes}
 
 
@@ -516,3 +540,86 @@ def chronological_unauth_per_page_metrics(project):
         row.append(metric.non_zero_length_pageviews)
         row.append(metric.zero_length_pageviews)
         yield row
+
+
+class DailyStatistic(ModelBase):
+    """Number of objects counted by a scoreboard metric on one day.
+
+    Filled by the tracker.tasks.rollup_statistics periodic task."""
+    metric = models.CharField(max_length=30)
+    date = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = (('metric', 'date'),)
+
+    def __unicode__(self):
+        return u'%s %s: %s' % (self.metric, self.date, self.count)
+
+
+def get_users_statistic():
+    return UserProfile.objects.all(), 'user__date_joined'
+
+
+def get_comments_statistic():
+    ct = ContentType.objects.get_for_model(SignupAnswer)
+    return PageComment.objects.exclude(page_content_type=ct), 'created_on'
+
+
+def get_joins_statistic():
+    joins = Participation.objects.filter(project__test=False,
+        left_on__isnull=True)
+    return joins, 'joined_on'
+
+
+def get_groups_statistic():
+    return Project.objects.filter(test=False), 'created_on'
+
+
+# (metric, function returning the counted objects and their date field),
+# in scoreboard order.
+STATISTICS_METRICS = (
+    ('users', get_users_statistic),
+    ('comments', get_comments_statistic),
+    ('joins', get_joins_statistic),
+    ('groups', get_groups_statistic),
+)
+
+
+def rollup_statistics(start, end=None):
+    """Store the daily count of every metric for the days from ``start``
+    to ``end`` (both included). Days are counted with date range
+    filters, which can use the indexes on the date fields."""
+    end = end or start
+    one_day = datetime.timedelta(days=1)
+    for metric, get_objects in STATISTICS_METRICS:
+        objects, date_field_name = get_objects()
+        day = start
+        while day <= end:
+            next_day = day + one_day
+            count = objects.filter(**{
+                date_field_name + '__gte': day,
+                date_field_name + '__lt': next_day,
+            }).count()
+            statistics = DailyStatistic.objects.filter(metric=metric,
+                date=day)
+            if not statistics.update(count=count):
+                DailyStatistic.objects.create(metric=metric, date=day,
+                    count=count)
+            day = next_day
+
+
+###########
+# Signals #
+###########
+
+
+def invalidate_tracking_codes_map(sender, **kwargs):
+    cache.delete(TRACKING_CODES_CACHE_KEY)
+
+
+for model in (GoogleAnalyticsTrackingCode, GoogleAnalyticsTracking):
+    post_save.connect(invalidate_tracking_codes_map, sender=model,
+        dispatch_uid='tracker_post_save_%s' % model.__name__.lower())
+    post_delete.connect(invalidate_tracking_codes_map, sender=model,
+        dispatch_uid='tracker_post_delete_%s' % model.__name__.lower())
@@ -1,9 +1,11 @@
+import datetime
+
 from celery.task.schedules import crontab
 from celery.decorators import periodic_task
 
 from celery.task import Task
 
-from models import update_metrics_cache
+from models import update_metrics_cache, rollup_statistics as rollup
 #from projects.models import get_active_projects
 
 #TODO celery.decorators module is being deprecated
@@ -17,6 +19,13 @@ def update_metrics():
     pass
 
 
+@periodic_task(name="tracker.tasks.rollup_statistics", run_every=crontab(minute="*/15"))
+def rollup_statistics():
+    # Yesterday is recounted too so late rows of the previous day are kept.
+    today = datetime.date.today()
+    rollup(today - datetime.timedelta(days=1), today)
+
+
 class UpdateCourseMetrics(Task):
     """ Update metrics relevant to a specific project."""
     name = 'notifications.tasks.UpdateCourseMetrics'
@@ -0,0 +1,149 @@
+import datetime
+
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.sites.models import Site
+from django.core.cache import get_cache
+
+from mock import patch
+
+from test_utils import TestCase
+
+from users.models import create_profile
+from tracker.models import DailyStatistic, STATISTICS_METRICS, \
+    rollup_statistics
+from tracker.models import GoogleAnalyticsTracking, \
+    GoogleAnalyticsTrackingCode, get_google_tracking_context
+from tracker.views import get_month_range, get_stats
+
+
+class StatisticsTests(TestCase):
+
+    def create_user(self, username, date_joined):
+        create_profile(User(username=username,
+            email='%s@mail.org' % username, date_joined=date_joined))
+
+    def get_counts(self, metric, start, end):
+        return dict(DailyStatistic.objects.no_cache().filter(metric=metric,
+            date__gte=start, date__lte=end).values_list('date', 'count'))
+
+    def test_rollup_statistics(self):
+        self.create_user('first', datetime.datetime(2012, 2, 28, 0, 0))
+        self.create_user('second', datetime.datetime(2012, 2, 28, 23, 59))
+        self.create_user('third', datetime.datetime(2012, 3, 1, 0, 0))
+        self.create_user('fourth', datetime.datetime(2012, 3, 2, 12, 0))
+        rollup_statistics(datetime.date(2012, 2, 28),
+            datetime.date(2012, 3, 1))
+
+        # One row per metric and day, days without objects included.
+        self.assertEqual(DailyStatistic.objects.count(),
+            3 * len(STATISTICS_METRICS))
+        counts = self.get_counts('users', datetime.date(2012, 2, 1),
+            datetime.date(2012, 3, 31))
+        self.assertEqual(counts, {
+            datetime.date(2012, 2, 28): 2,
+            datetime.date(2012, 2, 29): 0,
+            datetime.date(2012, 3, 1): 1,
+        })
+
+        # Days are recounted in place.
+        self.create_user('fifth', datetime.datetime(2012, 2, 29, 8, 0))
+        rollup_statistics(datetime.date(2012, 2, 28),
+            datetime.date(2012, 3, 2))
+        self.assertEqual(DailyStatistic.objects.count(),
+            4 * len(STATISTICS_METRICS))
+        counts = self.get_counts('users', datetime.date(2012, 2, 28),
+            datetime.date(2012, 3, 2))
+        self.assertEqual([counts[datetime.date(2012, 2, 28) +
+            datetime.timedelta(days=i)] for i in range(4)], [2, 1, 1, 1])
+        self.assertEqual(self.get_counts('groups', datetime.date(2012, 2, 28),
+            datetime.date(2012, 3, 2)).values(), [0] * 4)
+
+    def test_get_stats(self):
+        for day, count in ((datetime.date(2012, 1, 31), 5),
+                (datetime.date(2012, 2, 1), 2),
+                (datetime.date(2012, 2, 29), 4),
+                (datetime.date(2012, 3, 1), 3),
+                (datetime.date(2012, 3, 10), 1),
+                (datetime.date(2012, 3, 11), 7)):
+            DailyStatistic.objects.create(metric='users', date=day,
+                count=count)
+        time_details = {
+            'day': 10,
+            'month': 3,
+            'year': 2012,
+            'number_days_month': 31,
+            'prev_month': 2,
+            'prev_month_year': 2012,
+            'stats_date': datetime.datetime(2012, 3, 10, 18, 0),
+        }
+        stats = get_stats('users', time_details)
+        # January and the days after stats_date are out of the range.
+        self.assertEqual(stats['today'], 1)
+        self.assertEqual(stats['this_month'], 4)
+        self.assertEqual(stats['prev_month'], 6)
+        self.assertEqual(stats['pace'], 4 * 31 / 10)
+        self.assertEqual(stats['status_color'], 'green')
+        self.assertEqual(get_stats('groups', time_details)['this_month'], 0)
+
+    def test_get_month_range(self):
+        self.assertEqual(get_month_range(datetime.datetime(2012, 2, 15, 10)),
+            (datetime.date(2012, 2, 1), datetime.date(2012, 3, 1)))
+        self.assertEqual(get_month_range(datetime.datetime(2011, 12, 31, 23)),
+            (datetime.date(2011, 12, 1), datetime.date(2012, 1, 1)))
+
+
+class TrackingCodesTests(TestCase):
+
+    def setUp(self):
+        # The dummy cache backend would not keep the map.
+        self.cache_patch = patch('tracker.models.cache',
+            get_cache('locmem://'))
+        self.cache_patch.start()
+        self.site = Site.objects.get_current()
+        self.users = [User.objects.create(username=username,
+            email='%s@mail.org' % username) for username in ('one', 'two')]
+        self.site_code = GoogleAnalyticsTrackingCode.objects.create(
+            key='site', code='UA-1')
+        self.user_code = GoogleAnalyticsTrackingCode.objects.create(
+            key='user', code='UA-2')
+        self.track(self.site_code, self.site)
+        self.track(self.user_code, self.users[0])
+
+    def tearDown(self):
+        self.cache_patch.stop()
+
+    def track(self, code, target):
+        return GoogleAnalyticsTracking.objects.create(tracking_code=code,
+            target_content_type=ContentType.objects.get_for_model(target),
+            target_id=target.pk)
+
+    def get_codes(self, instance=None):
+        context = get_google_tracking_context(instance)
+        return [code.code for code in
+            context['google_analytics_tracking_codes']]
+
+    def test_one_lookup_for_many_targets(self):
+        self.assertEqual(self.get_codes(), ['UA-1', 'UA-2'])
+        ContentType.objects.get_for_model(User)
+        ContentType.objects.get_for_model(Site)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_codes(self.site), ['UA-1'])
+            # The site codes apply to every target.
+            self.assertEqual(self.get_codes(self.users[0]),
+                ['UA-1', 'UA-2'])
+            self.assertEqual(self.get_codes(self.users[1]), ['UA-1'])
+
+    def test_changes_refresh_the_map(self):
+        self.assertEqual(self.get_codes(self.users[1]), ['UA-1'])
+        tracking = self.track(self.user_code, self.users[1])
+        self.assertEqual(self.get_codes(self.users[1]), ['UA-1', 'UA-2'])
+        tracking.delete()
+        self.assertEqual(self.get_codes(self.users[1]), ['UA-1'])
+
+        self.site_code.code = 'UA-9'
+        self.site_code.save()
+        self.assertEqual(self.get_codes(self.users[0]), ['UA-9', 'UA-2'])
+        self.user_code.delete()
+        self.assertEqual(self.get_codes(self.users[0]), ['UA-9'])
+        self.assertEqual(self.get_codes(), ['UA-9'])
@@ -13,6 +13,7 @@ from users.models import UserProfile
 from replies.models import PageComment
 from projects.models import Participation, Project
 from signups.models import SignupAnswer
+from tracker.models import DailyStatistic, STATISTICS_METRICS
 
 
 log = logging.getLogger(__name__)
@@ -37,25 +38,38 @@ def get_time_details():
     }
 
 
-def get_stats(name, objects_list, date_field_name, time_details):
-    todays_count = objects_list.filter(**{
-        date_field_name + '__day': time_details['day'],
-        date_field_name + '__month': time_details['month'],
-        date_field_name + '__year': time_details['year']
-        }).count()
-
-    this_month_count = objects_list.filter(**{
-        date_field_name + '__month': time_details['month'],
-        date_field_name + '__year': time_details['year']
-        }).count()
+def get_month_range(stats_date):
+    """Return the first day of the month of ``stats_date`` and of the
+    next month, for range filters."""
+    month_start = stats_date.date().replace(day=1)
+    number_days_month = calendar.monthrange(
+        month_start.year, month_start.month)[1]
+    return month_start, month_start + datetime.timedelta(
+        days=number_days_month)
+
+
+def get_stats(name, time_details):
+    """Compute the scoreboard row of a metric from its daily rollups.
+
+    The previous and current months are read with one range query."""
+    today = time_details['stats_date'].date()
+    month_start = today.replace(day=1)
+    prev_month_start = datetime.date(time_details['prev_month_year'],
+        time_details['prev_month'], 1)
+    counts = DailyStatistic.objects.no_cache().filter(metric=name,
+        date__gte=prev_month_start, date__lte=today).values_list(
+        'date', 'count')
+    todays_count = this_month_count = prev_month_count = 0
+    for date, count in counts:
+        if date < month_start:
+            prev_month_count += count
+        else:
+            this_month_count += count
+            if date == today:
+                todays_count = count
 
     pace = this_month_count * time_details['number_days_month'] / time_details['day']
 
-    prev_month_count = objects_list.filter(**{
-        date_field_name + '__month': time_details['prev_month'],
-        date_field_name + '__year': time_details['prev_month_year']
-        }).count()
-
     green_threshold = prev_month_count * 105 / 100
     red_threshold = prev_month_count * 95 / 100
 
@@ -80,20 +94,10 @@ def scoreboard(request):
     if not request.user.is_authenticated() or not request.user.is_staff:
         raise http.Http404
     time_details = get_time_details()
-    users_stats = get_stats('users', UserProfile.objects.all(),
-        'user__date_joined', time_details)
-    ct = ContentType.objects.get_for_model(SignupAnswer)
-    comments = PageComment.objects.exclude(page_content_type=ct)
-    comments_stats = get_stats('comments', comments, 'created_on', time_details)
-    joins = Participation.objects.filter(
-        project__test=False, left_on__isnull=True)
-    joins_stats = get_stats('joins', joins,
-        'joined_on', time_details)
-    groups = Project.objects.filter(test=False)
-    groups_stats = get_stats('groups', groups,
-        'created_on', time_details)
+    stats = [get_stats(name, time_details)
+        for name, get_objects in STATISTICS_METRICS]
     context = {
-        'stats': [users_stats, comments_stats, joins_stats, groups_stats],
+        'stats': stats,
         'stats_date': time_details['stats_date'],
     }
     return render_to_response(
@@ -105,9 +109,10 @@ def scoreboard(request):
 def scoreboard_users(request):
     if not request.user.is_authenticated() or not request.user.is_staff:
         raise http.Http404
-    stats_date = datetime.datetime.now()
-    users = UserProfile.objects.filter(user__date_joined__month=stats_date.month,
-        user__date_joined__year=stats_date.year)
+    month_start, next_month_start = get_month_range(datetime.datetime.now())
+    users = UserProfile.objects.filter(
+        user__date_joined__gte=month_start,
+        user__date_joined__lt=next_month_start)
     users_ids = users.values('id')
     ct = ContentType.objects.get_for_model(SignupAnswer)
     comments_count = dict(PageComment.objects.exclude(
@@ -126,14 +131,18 @@ def scoreboard_users(request):
 def scoreboard_top_groups_by_comments(request):
     if not request.user.is_authenticated() or not request.user.is_staff:
         raise http.Http404
-    stats_date = datetime.datetime.now()
+    month_start, next_month_start = get_month_range(datetime.datetime.now())
     ct = ContentType.objects.get_for_model(SignupAnswer)
     p_ct = ContentType.objects.get_for_model(Project)
-    commented_projects = PageComment.objects.exclude(page_content_type=ct).filter(
-        created_on__month=stats_date.month, created_on__year=stats_date.year,
-        scope_content_type=p_ct).values('scope_id').annotate(
-        comments_count=Count('id'))
-    aaData = [[Project.objects.get(id=p['scope_id']).slug, p['comments_count']] for p in commented_projects]
+    commented_projects = list(PageComment.objects.exclude(
+        page_content_type=ct).filter(created_on__gte=month_start,
+        created_on__lt=next_month_start, scope_content_type=p_ct).values(
+        'scope_id').annotate(comments_count=Count('id')).order_by())
+    slugs = dict(Project.objects.filter(
+        id__in=[p['scope_id'] for p in commented_projects]).values_list(
+        'id', 'slug'))
+    aaData = [[slugs[p['scope_id']], p['comments_count']]
+        for p in commented_projects if p['scope_id'] in slugs]
     data = {'aaData': aaData}
     json = simplejson.dumps(data)
     return http.HttpResponse(json, mimetype="application/json")
@@ -142,10 +151,10 @@ def scoreboard_top_groups_by_comments(request):
 def scoreboard_top_groups_by_joins(request):
     if not request.user.is_authenticated() or not request.user.is_staff:
         raise http.Http404
-    stats_date = datetime.datetime.now()
+    month_start, next_month_start = get_month_range(datetime.datetime.now())
     aaData = list(Participation.objects.filter(
-        joined_on__month=stats_date.month,
-        joined_on__year=stats_date.year,
+        joined_on__gte=month_start,
+        joined_on__lt=next_month_start,
         project__test=False,
         left_on__isnull=True
     ).values('project__slug').annotate(
@@ -159,9 +168,9 @@ def scoreboard_top_groups_by_joins(request):
 def scoreboard_groups(request):
     if not request.user.is_authenticated() or not request.user.is_staff:
         raise http.Http404
-    stats_date = datetime.datetime.now()
-    groups = Project.objects.filter(created_on__month=stats_date.month,
-        created_on__year=stats_date.year, test=False)
+    month_start, next_month_start = get_month_range(datetime.datetime.now())
+    groups = Project.objects.filter(created_on__gte=month_start,
+        created_on__lt=next_month_start, test=False)
     groups_ids = groups.values('id')
     ct = ContentType.objects.get_for_model(SignupAnswer)
     p_ct = ContentType.objects.get_for_model(Project)
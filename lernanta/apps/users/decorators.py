@@ -27,6 +27,15 @@ def anonymous_only(func):
     return decorator
 
 
+def _has_profile(user):
+    # get_profile() reuses the profile loaded by ProfileExistMiddleware.
+    try:
+        user.get_profile()
+    except UserProfile.DoesNotExist:
+        return False
+    return True
+
+
 def login_required(func=None, profile_required=True):
     """
     Custom implementation of ``django.contrib.auth.decorators.login_required``.
@@ -36,8 +45,7 @@ def login_required(func=None, profile_required=True):
     will still be locked out of other views.
     """
     if profile_required:
-        test = lambda u: (u.is_authenticated() and
-                          UserProfile.objects.filter(user=u).count() > 0)
+        test = lambda u: u.is_authenticated() and _has_profile(u)
     else:
         test = lambda u: u.is_authenticated()
     actual_decorator = user_passes_test(test)
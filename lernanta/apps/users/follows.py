@@ -0,0 +1,108 @@
+"""
+Cached adjacency lists of the follow graph.
+
+For each user the cache holds sorted arrays with the ids of the users
+and projects they follow, the lowercased names of the followed users
+for autocomplete, and a sorted array with the ids of their followers.
+Membership tests bisect the arrays. The entries are dropped when a
+relationship of the user changes (see the signals in users.models).
+"""
+from array import array
+from bisect import bisect_left
+
+from django.core.cache import cache
+
+FOLLOWING_KEY = 'users_following_%s'
+FOLLOWERS_KEY = 'users_followers_%s'
+FOLLOWS_TIMEOUT = 60 * 60 * 24
+
+
+def _contains(ids, value):
+    i = bisect_left(ids, value)
+    return i < len(ids) and ids[i] == value
+
+
+def _load_following(user_id):
+    from relationships.models import Relationship
+    relationships = Relationship.objects.filter(source=user_id,
+        deleted=False)
+    user_rows = relationships.filter(target_user__isnull=False,
+        target_user__deleted=False).values_list('target_user_id',
+        'target_user__username', 'target_user__full_name')
+    project_ids = relationships.filter(target_project__isnull=False,
+        target_project__archived=False).values_list('target_project_id',
+        flat=True)
+    names = []
+    user_ids = []
+    for target_id, username, full_name in user_rows:
+        user_ids.append(target_id)
+        names.append((username.lower(), username))
+        if full_name:
+            names.append((full_name.lower(), username))
+    return {
+        'users': array('l', sorted(user_ids)),
+        'projects': array('l', sorted(project_ids)),
+        'names': sorted(names),
+    }
+
+
+def get_following(user_id):
+    key = FOLLOWING_KEY % user_id
+    following = cache.get(key)
+    if following is None:
+        following = _load_following(user_id)
+        cache.set(key, following, FOLLOWS_TIMEOUT)
+    return following
+
+
+def get_followers(user_id):
+    """Sorted ids of the users following ``user_id``."""
+    key = FOLLOWERS_KEY % user_id
+    followers = cache.get(key)
+    if followers is None:
+        from relationships.models import Relationship
+        follower_ids = Relationship.objects.filter(target_user=user_id,
+            deleted=False, source__deleted=False).values_list('source_id',
+            flat=True)
+        followers = array('l', sorted(follower_ids))
+        cache.set(key, followers, FOLLOWS_TIMEOUT)
+    return followers
+
+
+def is_following_user(user_id, target_id):
+    return _contains(get_following(user_id)['users'], target_id)
+
+
+def is_following_project(user_id, project_id):
+    return _contains(get_following(user_id)['projects'], project_id)
+
+
+def get_page(ids, page, per_page):
+    """Return the ids in the 1-based ``page``."""
+    start = (page - 1) * per_page
+    return list(ids[start:start + per_page])
+
+
+def match_following(user_id, term, limit=None):
+    """Usernames of the followed users whose username or full name start
+    with ``term``, sorted by the matching name."""
+    names = get_following(user_id)['names']
+    term = term.lower()
+    usernames = []
+    i = bisect_left(names, (term,))
+    while i < len(names) and names[i][0].startswith(term):
+        username = names[i][1]
+        if username not in usernames:
+            usernames.append(username)
+            if limit and len(usernames) == limit:
+                break
+        i += 1
+    return usernames
+
+
+def invalidate_following(user_ids):
+    cache.delete_many([FOLLOWING_KEY % user_id for user_id in user_ids])
+
+
+def invalidate_followers(user_ids):
+    cache.delete_many([FOLLOWERS_KEY % user_id for user_id in user_ids])
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from users.models import reconcile_followers_count
+
+
+class Command(BaseCommand):
+    help = ('Fill UserProfile.followers_count from the relationships. '
+            'Safe to run again, only the profiles that differ are updated.')
+
+    def handle(self, *args, **options):
+        fixed = reconcile_followers_count()
+        self.stdout.write('Updated %d profile(s).\n' % fixed)
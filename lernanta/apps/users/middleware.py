@@ -1,11 +1,12 @@
-import datetime
 import logging
 
 from django.http import HttpResponseRedirect
 from django.conf import settings
 from django.contrib.auth import logout
+from django.core.urlresolvers import reverse as django_reverse
 
-from users.models import UserProfile
+from users.models import get_request_profile
+from users import presence
 from l10n.urlresolvers import reverse
 
 log = logging.getLogger(__name__)
@@ -13,37 +14,37 @@ log = logging.getLogger(__name__)
 
 class ProfileExistMiddleware(object):
 
+    # Views a user without a profile can reach. Paths are stored without
+    # the locale prefix and compared against request.path_info, which
+    # l10n.middleware.LocaleURLRewriter has already stripped.
+    valid_url_names = ('dashboard', 'users_profile_create', 'users_logout',
+        'users_check_username')
+
+    def __init__(self):
+        self.valid_paths = frozenset(
+            django_reverse(name) for name in self.valid_url_names)
+
     def process_request(self, request):
         if not request.user.is_authenticated():
             return
-        try:
-            profile = request.user.get_profile()
-            if profile.deleted == True:
-                logout(request)
-                return HttpResponseRedirect(reverse('splash'))
-        except UserProfile.DoesNotExist:
-            dashboard_url = reverse('dashboard')
-            profile_create_url = reverse('users_profile_create')
-            logout_url = reverse('users_logout')
-            check_username_url = reverse('users_check_username')
-            valid_urls = (dashboard_url, profile_create_url, logout_url, check_username_url)
-            if request.path in valid_urls:
+        profile = get_request_profile(request)
+        if profile is None:
+            if request.path_info in self.valid_paths:
                 return None
             for prefix in settings.NO_PROFILE_URLS:
                 if request.path.startswith(prefix):
                     return None
-            return HttpResponseRedirect(dashboard_url)
+            return HttpResponseRedirect(reverse('dashboard'))
+        if profile.deleted == True:
+            logout(request)
+            return HttpResponseRedirect(reverse('splash'))
 
 
 class UserActivityMiddleware:
     def process_request(self, request):
         if request.user.is_authenticated():
-            now = datetime.datetime.now()
             try:
-                profile = request.user.get_profile()
-                profile.last_active = now
-                profile.save()
+                presence.record_activity(request.user.id)
             except Exception, error:
-                msg = 'An error occurred saving user record: %s'
+                msg = 'An error occurred recording user activity: %s'
                 log.error(msg % error)
-
@@ -7,14 +7,16 @@ import os
 
 
 from django.conf import settings
+from django.core.cache import cache
 from django.db import models
+from django.db.models import Max
 from django.contrib.auth.models import User
 from django.utils.encoding import smart_str
 from django.utils.http import urlquote_plus
 from django.utils.translation import ugettext_lazy as _
 from django.utils.translation import ugettext
 from django.utils.safestring import mark_safe
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 
 from taggit.models import GenericTaggedItemBase, Tag
 from south.modelsinspector import add_ignored_fields
@@ -22,11 +24,15 @@ from south.modelsinspector import add_ignored_fields
 from drumbeat import storage
 from drumbeat.utils import get_partition_id, safe_filename
 from drumbeat.models import ModelBase
+from l10n.urlresolvers import reverse
 from relationships.models import Relationship
 from projects.models import Project, Participation
+from courses import db as courses_db
 from notifications.models import send_notifications_i18n
 from activity.schema import object_types
 from users.managers import CategoryTaggableManager
+from users import presence
+from users import follows
 from richtext.models import RichTextField
 from tracker import statsd
 
@@ -82,11 +88,8 @@ class TaggedProfile(GenericTaggedItemBase):
 class UserProfileManager(caching.base.CachingManager):
 
     def get_popular(self, limit=0):
-        users = Relationship.objects.values('target_user_id').annotate(
-            models.Count('id')).filter(target_user__featured=False,
-            target_user__deleted=False).order_by('-id__count')[:limit]
-        user_ids = [u['target_user_id'] for u in users]
-        return UserProfile.objects.filter(id__in=user_ids)
+        return self.filter(featured=False, deleted=False,
+            followers_count__gt=0).order_by('-followers_count')[:limit]
 
 
 class UserProfile(ModelBase):
@@ -101,7 +104,7 @@ class UserProfile(ModelBase):
     bio = RichTextField(blank=True)
     image = models.ImageField(
         upload_to=determine_upload_path, default='', blank=True, null=True,
-        storage=storage.ImageStorage())
+        storage=storage.ImageStorage(variants=('avatar48', 'avatar240')))
     confirmation_code = models.CharField(
         max_length=255, default='', blank=True)
     location = models.CharField(max_length=255, blank=True, default='')
@@ -115,6 +118,8 @@ class UserProfile(ModelBase):
         default=settings.LANGUAGE_CODE)
     deleted = models.BooleanField(default=False)
     last_active = models.DateTimeField(null=True, blank=True)
+    # Maintained by the relationships signals with F() updates.
+    followers_count = models.PositiveIntegerField(default=0, db_index=True)
 
     user = models.ForeignKey(User, null=True, editable=False, blank=True)
 
@@ -130,84 +135,105 @@ class UserProfile(ModelBase):
             return ugettext('Anonym')
         return self.full_name or self.username
 
+    def save(self, *args, **kwargs):
+        followers_count = self.followers_count
+        if not self._state.adding:
+            # Write the column back as it is, so follows counted since the
+            # profile was loaded are not overwritten. create_profile sets
+            # the id before the row exists, so new rows are still added.
+            self.followers_count = models.F('followers_count')
+        try:
+            super(UserProfile, self).save(*args, **kwargs)
+        finally:
+            self.followers_count = followers_count
+
     def following(self, model=None):
         """
         Return a list of objects this user is following. All objects returned
         will be ```Project``` or ```UserProfile``` instances. Optionally filter
-        by type by including a ```model``` parameter.
+        by type by including a ```model``` parameter. The objects are in id
+        order.
         """
+        ids = self.get_following_ids(model=model)
+        if not ids:
+            return []
+        if (model == 'Project' or isinstance(model, Project) or
+            model == Project):
+            return list(Project.objects.filter(id__in=ids))
+        return list(UserProfile.objects.filter(id__in=ids))
+
+    def get_following_ids(self, model=None):
+        """Sorted ids of the users (or projects if ```model``` is
+        ```Project```) this user is following."""
+        following = follows.get_following(self.id)
         if (model == 'Project' or isinstance(model, Project) or
             model == Project):
-            relationships = Relationship.objects.select_related(
-                'target_project').filter(source=self, deleted=False).exclude(
-                target_project__isnull=True)
-            return [rel.target_project for rel in relationships
-                    if not rel.target_project.archived]
-        relationships = Relationship.objects.select_related(
-            'target_user').filter(source=self,
-            target_user__deleted=False, deleted=False).exclude(
-            target_user__isnull=True)
-        return [rel.target_user for rel in relationships]
+            return list(following['projects'])
+        return list(following['users'])
+
+    def get_follower_ids(self):
+        return list(follows.get_followers(self.id))
 
     def followers(self):
         """Return a list of this users followers."""
-        relationships = Relationship.objects.select_related(
-            'source').filter(target_user=self, source__deleted=False,
-            deleted=False)
-        return [rel.source for rel in relationships]
+        follower_ids = self.get_follower_ids()
+        if not follower_ids:
+            return []
+        return list(UserProfile.objects.filter(id__in=follower_ids))
 
     def is_following(self, model):
         """Determine whether this user is following ```model```."""
-        return model in self.following(model=model)
+        if isinstance(model, Project):
+            return follows.is_following_project(self.id, model.id)
+        if isinstance(model, UserProfile):
+            return follows.is_following_user(self.id, model.id)
+        return False
 
     def get_current_projects(self, only_public=False):
-        def to_dict(course):
-            course_dict = {
-                'id': course.slug,
-                'title': course.name,
-                'url': course.get_absolute_url(),
-                'image_url': course.get_image_url(),
-                'user_role': course.relation_text
-            }
-            return course_dict
-            
-        projects = self.following(model=Project)
+        key = CURRENT_PROJECTS_CACHE_KEY % self.id
+        data = cache.get(key)
+        if data is None:
+            data = load_current_projects(self)
+            cache.set(key, data, CURRENT_PROJECTS_CACHE_TIMEOUT)
+
         projects_organizing = []
         projects_participating = []
         projects_following = []
-        count = len(projects)
-        for project in projects:
-            if only_public and project.not_listed:
+        count = len(data['projects'])
+        for project in data['projects']:
+            if only_public and project['not_listed']:
                 count -= 1
                 continue
-            is_challenge = (project.category == Project.CHALLENGE)
-            if is_challenge:
-                organizers = project.adopters()
-                participants = project.non_adopter_participants()
+            if not project['role']:
+                continue
+            course_dict = {
+                'id': project['slug'],
+                'title': project['title'],
+                'url': project['url'],
+                'image_url': project['image_url'],
+                'user_role': RELATION_TEXTS[project['role']],
+            }
+            if project['role'] in ('organizing', 'adopted'):
+                projects_organizing.append(course_dict)
+            elif project['role'] == 'participating':
+                projects_participating.append(course_dict)
             else:
-                organizers = project.organizers()
-                participants = project.non_organizer_participants()
-            if organizers.filter(user=self).exists():
-                if is_challenge:
-                    project.relation_text = _('(adopted)')
-                else:
-                    project.relation_text = _('(organizing)')
-                projects_organizing.append(to_dict(project))
-            elif participants.filter(user=self).exists():
-                project.relation_text = _('(participating)')
-                projects_participating.append(to_dict(project))
-            elif not is_challenge:
-                project.relation_text = _('(following)')
-                projects_following.append(to_dict(project))
-
-        from courses.models import get_user_courses
-        courses = get_user_courses(u'/uri/user/{0}'.format(self.username))
-        for course in courses:
-            if course["user_role"] == "ORGANIZER":
-                course["user_role"] = _('(organizing)')
+                projects_following.append(course_dict)
+
+        for signup in data['courses']:
+            course = {
+                'id': signup['id'],
+                'title': signup['title'],
+                'url': reverse('courses_show', kwargs={
+                    'course_id': signup['id'], 'slug': signup['slug']}),
+            }
+            if 'image_url' in signup:
+                course['image_url'] = signup['image_url']
+            if signup['user_role'] == 'ORGANIZER':
+                course['user_role'] = _('(organizing)')
                 projects_organizing.append(course)
             else:
-                course["user_role"] = _('(participating)')
+                course['user_role'] = _('(participating)')
                 projects_participating.append(course)
 
         data = {
@@ -224,18 +250,21 @@ class UserProfile(ModelBase):
             left_on__isnull=True)
         participations = participations.exclude(
             project__id__in=current.values('project_id'))
-        past_projects = {}
-        for p in participations:
-            if p.project.slug in past_projects:
-                past_projects[p.project.slug]['organizer'] |= p.organizing
-            elif not only_public or not p.project.not_listed:
-                past_projects[p.project.slug] = {
-                    'title': p.project.name,
-                    'url': p.project.get_absolute_url(),
-                    'organizer': p.organizing,
-                    'image_url': p.project.get_image_url(),
-                }
-        return past_projects.values()
+        # One row per project, organizer if any participation was.
+        organizer = dict(participations.values_list('project_id').annotate(
+            organizer=Max('organizing')).order_by())
+        projects = Project.objects.filter(id__in=organizer.keys())
+        if only_public:
+            projects = projects.filter(not_listed=False)
+        past_projects = []
+        for project in projects:
+            past_projects.append({
+                'title': project.name,
+                'url': project.get_absolute_url(),
+                'organizer': bool(organizer[project.id]),
+                'image_url': project.get_image_url(),
+            })
+        return past_projects
 
     @models.permalink
     def get_absolute_url(self):
@@ -253,17 +282,23 @@ class UserProfile(ModelBase):
             context, notification_category='account'
         )
 
-    def image_or_default(self):
-        """Return user profile image or a default."""
+    def image_or_default(self, size=240):
+        """Return user profile image or a default.
+
+        The smallest avatar variant of at least ``size`` pixels is used."""
         avatar = '%s%s' % (settings.STATIC_URL, '/images/member-missing.png')
         if not self.deleted:
-            gravatarUrl = self.gravatar(240)
             if self.image:
-                avatar = '%s%s' % (settings.MEDIA_URL, self.image)
-            elif gravatarUrl:
-                avatar = gravatarUrl
+                variant = 'avatar48' if size <= 48 else 'avatar240'
+                avatar = storage.get_variant_url(self.image, variant)
+            else:
+                avatar = self.gravatar(size)
         return mark_safe(avatar)
 
+    def thumbnail_or_default(self):
+        """Return the small (48px) user profile image or a default."""
+        return self.image_or_default(48)
+
     def gravatar(self, size=240):
         hash = hashlib.md5(self.email.lower()).hexdigest()
         default = urlquote_plus(settings.DEFAULT_PROFILE_IMAGE)
@@ -296,6 +331,13 @@ class UserProfile(ModelBase):
         algo, salt, hsh = self.password.split('$')
         return hsh == get_hexdigest(algo, salt, raw_password)
 
+    def get_last_active(self):
+        """Return last_active including activity not flushed yet."""
+        cached = presence.get_cached_last_active(self.user_id)
+        if cached and (not self.last_active or cached > self.last_active):
+            return cached
+        return self.last_active
+
     def can_post(self):
         return len(self.confirmation_code) == 0 and self.deleted == False
 
@@ -329,6 +371,116 @@ def delete_spammer(spammer):
         pc.save()
 
 
+def get_request_profile(request):
+    """Return the profile of the authenticated user or None.
+
+    The lookup happens at most once per request, also for users without
+    a profile, and the profile is shared with ``request.user.get_profile``.
+    """
+    if not hasattr(request, '_profile'):
+        profile = None
+        if request.user.is_authenticated():
+            try:
+                profile = request.user.get_profile()
+            except UserProfile.DoesNotExist:
+                pass
+        request._profile = profile
+    return request._profile
+
+
+CURRENT_PROJECTS_CACHE_KEY = 'users_current_projects_%s'
+CURRENT_PROJECTS_CACHE_TIMEOUT = 60 * 60
+
+RELATION_TEXTS = {
+    'organizing': _('(organizing)'),
+    'adopted': _('(adopted)'),
+    'participating': _('(participating)'),
+    'following': _('(following)'),
+}
+
+
+def load_current_projects(profile):
+    """Resolve the user's role in the projects they follow and the courses
+    they signed up to.
+
+    Uses one Relationship query, one Participation query and one
+    CohortSignup join. The result does not depend on the active locale,
+    UserProfile.get_current_projects caches it per user."""
+    from courses.models import get_user_signups
+    relationships = Relationship.objects.select_related(
+        'target_project').filter(source=profile, deleted=False).exclude(
+        target_project__isnull=True)
+    projects = [rel.target_project for rel in relationships
+        if not rel.target_project.archived]
+    roles = {}
+    if projects and not profile.deleted:
+        participations = Participation.objects.filter(user=profile,
+            left_on__isnull=True, project__in=[p.id for p in projects])
+        for project_id, organizing, adopter in participations.values_list(
+                'project_id', 'organizing', 'adopter'):
+            was_organizing, was_adopter = roles.get(project_id,
+                (False, False))
+            roles[project_id] = (was_organizing or organizing,
+                was_adopter or adopter)
+    entries = []
+    for project in projects:
+        is_challenge = (project.category == Project.CHALLENGE)
+        if project.id not in roles:
+            # Challenges are only listed once adopted or joined.
+            role = None if is_challenge else 'following'
+        else:
+            organizing, adopter = roles[project.id]
+            if is_challenge:
+                role = 'adopted' if organizing or adopter else 'participating'
+            else:
+                role = 'organizing' if organizing else 'participating'
+        entries.append({
+            'slug': project.slug,
+            'title': project.name,
+            'url': project.get_absolute_url(),
+            'image_url': project.get_image_url(),
+            'not_listed': project.not_listed,
+            'role': role,
+        })
+    courses = get_user_signups(u'/uri/user/{0}'.format(profile.username))
+    return {
+        'projects': entries,
+        'courses': courses,
+    }
+
+
+def invalidate_current_projects(profile_ids):
+    cache.delete_many([CURRENT_PROJECTS_CACHE_KEY % profile_id
+        for profile_id in profile_ids])
+
+
+def change_followers_count(profile_id, delta):
+    profiles = UserProfile.objects.filter(id=profile_id)
+    if delta < 0:
+        profiles = profiles.filter(followers_count__gte=-delta)
+    profiles.update(followers_count=models.F('followers_count') + delta)
+
+
+def reconcile_followers_count():
+    """Recompute the followers count of every profile from the
+    relationships and fix the ones that drifted. Returns the number of
+    profiles fixed."""
+    counts = dict(Relationship.objects.filter(deleted=False,
+        target_user__isnull=False).values_list('target_user_id').annotate(
+        models.Count('id')).order_by())
+    fixed = 0
+    profiles = UserProfile.objects.no_cache().values_list('id',
+        'followers_count')
+    for profile_id, followers_count in profiles.iterator():
+        expected = counts.get(profile_id, 0)
+        if followers_count != expected:
+            UserProfile.objects.filter(id=profile_id).update(
+                followers_count=expected)
+            fixed += 1
+    log.debug('Fixed the followers count of %d profile(s).' % fixed)
+    return fixed
+
+
 def get_user_profile_image_url( user_uri ):
     """ user_uri should look like /uri/user/username """
     username = user_uri.strip('/').split('/')[-1]
@@ -350,7 +502,102 @@ def post_save_userprofile(sender, **kwargs):
         instance.user.save()
     if created and is_profile:
         statsd.Statsd.increment('users')
+    if is_profile and instance.deleted:
+        invalidate_current_projects([instance.id])
+    if created and is_profile:
+        follows.invalidate_following([instance.id])
+        follows.invalidate_followers([instance.id])
+    elif is_profile:
+        # Names and the deleted flag are part of the follow lists.
+        follows.invalidate_following(Relationship.objects.filter(
+            target_user=instance).values_list('source_id', flat=True))
+        if instance.deleted:
+            follows.invalidate_followers(Relationship.objects.filter(
+                source=instance, target_user__isnull=False).values_list(
+                'target_user_id', flat=True))
 
 
 post_save.connect(post_save_userprofile, sender=UserProfile,
     dispatch_uid='users_post_save_userprofile')
+
+
+def current_projects_relationship_changed(sender, **kwargs):
+    instance = kwargs.get('instance', None)
+    if isinstance(instance, Relationship) and instance.target_project_id:
+        invalidate_current_projects([instance.source_id])
+
+post_save.connect(current_projects_relationship_changed, sender=Relationship,
+    dispatch_uid='users_post_save_relationship_current_projects')
+post_delete.connect(current_projects_relationship_changed,
+    sender=Relationship,
+    dispatch_uid='users_post_delete_relationship_current_projects')
+
+
+def current_projects_participation_changed(sender, **kwargs):
+    instance = kwargs.get('instance', None)
+    if isinstance(instance, Participation):
+        invalidate_current_projects([instance.user_id])
+
+post_save.connect(current_projects_participation_changed,
+    sender=Participation,
+    dispatch_uid='users_post_save_participation_current_projects')
+post_delete.connect(current_projects_participation_changed,
+    sender=Participation,
+    dispatch_uid='users_post_delete_participation_current_projects')
+
+
+def project_followers_changed(sender, **kwargs):
+    instance = kwargs.get('instance', None)
+    if isinstance(instance, Project) and not kwargs.get('created', False):
+        # Name, image, listing or archiving changes show up in the
+        # followers' lists.
+        follower_ids = list(Relationship.objects.filter(
+            target_project=instance).values_list('source_id', flat=True))
+        invalidate_current_projects(follower_ids)
+        follows.invalidate_following(follower_ids)
+
+post_save.connect(project_followers_changed, sender=Project,
+    dispatch_uid='users_post_save_project_current_projects')
+
+
+def follows_relationship_changed(sender, **kwargs):
+    instance = kwargs.get('instance', None)
+    if isinstance(instance, Relationship):
+        follows.invalidate_following([instance.source_id])
+        if instance.target_user_id:
+            follows.invalidate_followers([instance.target_user_id])
+
+post_save.connect(follows_relationship_changed, sender=Relationship,
+    dispatch_uid='users_post_save_relationship_follows')
+post_delete.connect(follows_relationship_changed, sender=Relationship,
+    dispatch_uid='users_post_delete_relationship_follows')
+
+
+def current_projects_signup_changed(sender, **kwargs):
+    instance = kwargs.get('instance', None)
+    if isinstance(instance, courses_db.CohortSignup):
+        username = instance.user_uri.strip('/').split('/')[-1]
+        invalidate_current_projects(UserProfile.objects.filter(
+            username=username).values_list('id', flat=True))
+
+post_save.connect(current_projects_signup_changed,
+    sender=courses_db.CohortSignup,
+    dispatch_uid='users_post_save_cohortsignup_current_projects')
+post_delete.connect(current_projects_signup_changed,
+    sender=courses_db.CohortSignup,
+    dispatch_uid='users_post_delete_cohortsignup_current_projects')
+
+
+def current_projects_course_changed(sender, **kwargs):
+    instance = kwargs.get('instance', None)
+    if isinstance(instance, courses_db.Course) and \
+            not kwargs.get('created', False):
+        user_uris = courses_db.CohortSignup.objects.filter(
+            cohort__course=instance, leave_date__isnull=True).values_list(
+            'user_uri', flat=True)
+        usernames = [uri.strip('/').split('/')[-1] for uri in user_uris]
+        invalidate_current_projects(UserProfile.objects.filter(
+            username__in=usernames).values_list('id', flat=True))
+
+post_save.connect(current_projects_course_changed, sender=courses_db.Course,
+    dispatch_uid='users_post_save_course_current_projects')
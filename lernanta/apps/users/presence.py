@@ -0,0 +1,86 @@
+"""
+Coalesced tracking of ``UserProfile.last_active``.
+
+Requests only record the user's last activity in the cache. The timestamp
+is refreshed at most once every ``LAST_ACTIVE_UPDATE_INTERVAL`` minutes
+per user, and the pending timestamps are written to the database by the
+``users.tasks.flush_last_active`` periodic task with one UPDATE statement
+per chunk of users.
+"""
+import datetime
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+log = logging.getLogger(__name__)
+
+LAST_ACTIVE_KEY = 'users_last_active_%s'
+PENDING_KEY = 'users_last_active_pending'
+# Must outlive several flush periods so readers can still merge timestamps
+# the task has not written yet.
+LAST_ACTIVE_TIMEOUT = 60 * 60 * 24
+FLUSH_CHUNK_SIZE = 500
+
+
+def _update_interval():
+    return datetime.timedelta(minutes=settings.LAST_ACTIVE_UPDATE_INTERVAL)
+
+
+def record_activity(user_id, now=None):
+    """Remember that the user was active at ``now``.
+
+    Returns True if the timestamp was refreshed and queued to be written,
+    False if it was coalesced with a recent one."""
+    now = now or datetime.datetime.now()
+    key = LAST_ACTIVE_KEY % user_id
+    last_active = cache.get(key)
+    if last_active and now - last_active < _update_interval():
+        return False
+    cache.set(key, now, LAST_ACTIVE_TIMEOUT)
+    # Racing writers may drop an id here. That user will be queued again
+    # once the interval passes, and readers merge the cached value anyway.
+    pending = cache.get(PENDING_KEY) or set()
+    pending.add(user_id)
+    cache.set(PENDING_KEY, pending, LAST_ACTIVE_TIMEOUT)
+    return True
+
+
+def get_cached_last_active(user_id):
+    """Return the last activity recorded in the cache, if any."""
+    return cache.get(LAST_ACTIVE_KEY % user_id)
+
+
+def _bulk_update(updates):
+    """Write ``(user_id, last_active)`` pairs with a single UPDATE."""
+    from users.models import UserProfile
+    qn = connection.ops.quote_name
+    params = []
+    for user_id, last_active in updates:
+        params.extend([user_id, last_active])
+    user_ids = [user_id for user_id, last_active in updates]
+    params.extend(user_ids)
+    sql = 'UPDATE %s SET %s = CASE %s %s END WHERE %s IN (%s)' % (
+        qn(UserProfile._meta.db_table), qn('last_active'), qn('user_id'),
+        ' '.join(['WHEN %s THEN %s'] * len(updates)), qn('user_id'),
+        ', '.join(['%s'] * len(user_ids)))
+    cursor = connection.cursor()
+    cursor.execute(sql, params)
+    transaction.commit_unless_managed()
+
+
+def flush_last_active():
+    """Write the pending last activity timestamps to the database."""
+    pending = cache.get(PENDING_KEY)
+    if not pending:
+        return 0
+    cache.delete(PENDING_KEY)
+    keys = dict((LAST_ACTIVE_KEY % user_id, user_id) for user_id in pending)
+    cached = cache.get_many(keys.keys())
+    updates = [(keys[key], last_active)
+        for key, last_active in cached.iteritems()]
+    for i in xrange(0, len(updates), FLUSH_CHUNK_SIZE):
+        _bulk_update(updates[i:i + FLUSH_CHUNK_SIZE])
+    log.debug('Flushed last_active for %d user(s).' % len(updates))
+    return len(updates)
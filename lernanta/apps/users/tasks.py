@@ -1,9 +1,15 @@
 import datetime
 
 from celery.task import Task
+from celery.schedules import crontab
+from celery.decorators import periodic_task
 
 from messages.models import Message
 
+from users.presence import flush_last_active
+from users.models import reconcile_followers_count
+
+
 class SendPrivateMessages(Task):
     """
     Send a private message to multiple users. ``messages`` should be a sequence
@@ -23,3 +29,17 @@ class SendPrivateMessages(Task):
                 parent.replied_at = datetime.datetime.now()
                 parent.save()
             msg.save()
+
+
+@periodic_task(run_every=crontab(minute='*/5'),
+    name='users.tasks.flush_last_active')
+def flush_last_active_task():
+    """Write the last activity timestamps recorded in the cache."""
+    flush_last_active()
+
+
+@periodic_task(run_every=crontab(hour=4, minute=30),
+    name='users.tasks.reconcile_followers_count')
+def reconcile_followers_count_task():
+    """Fix the followers counts that drifted from the relationships."""
+    reconcile_followers_count()
@@ -27,8 +27,9 @@ def profile_info(context):
     profile = context['profile']
 
     current_projects = profile.get_current_projects(only_public=True)
-    users_following = profile.following()
-    users_followers = profile.followers()
+    # Only the counts are shown.
+    users_following = profile.get_following_ids()
+    users_followers = profile.get_follower_ids()
 
     interests = profile.tags.filter(category='interest').exclude(
         slug='').order_by('name')
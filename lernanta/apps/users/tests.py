@@ -1,11 +1,21 @@
+import datetime
+
 from django.conf import settings
+from django.core.cache import cache
 from django.test import Client
+from django.test.client import RequestFactory
 from django.contrib.auth import REDIRECT_FIELD_NAME
 from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse as django_reverse
 
 from l10n.urlresolvers import reverse
 from drumbeat.utils import get_partition_id
-from users.models import create_profile
+from users.models import create_profile, get_request_profile, UserProfile
+from users.middleware import ProfileExistMiddleware
+from users import presence
+from users import follows
+from projects.models import Project, Participation
+from relationships.models import Relationship
 
 from test_utils import TestCase
 
@@ -136,3 +146,144 @@ class TestLogins(TestCase):
             'username': 'butterfly',
         })
         self.assertEqual(404, notfound.status_code)
+
+
+class TestLastActive(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_profile(User(username='activeuser',
+            email='active@mozillafoundation.org'))
+
+    def test_activity_writes_are_coalesced(self):
+        now = datetime.datetime.now()
+        self.assertTrue(presence.record_activity(self.user.user_id, now))
+        later = now + datetime.timedelta(minutes=1)
+        self.assertFalse(presence.record_activity(self.user.user_id, later))
+        profile = UserProfile.objects.get(id=self.user.id)
+        self.assertEqual(None, profile.last_active)
+        self.assertEqual(now, profile.get_last_active())
+
+    def test_flush_last_active(self):
+        now = datetime.datetime.now().replace(microsecond=0)
+        presence.record_activity(self.user.user_id, now)
+        self.assertEqual(1, presence.flush_last_active())
+        self.assertEqual(0, presence.flush_last_active())
+        last_active = UserProfile.objects.filter(
+            id=self.user.id).values_list('last_active', flat=True)[0]
+        self.assertEqual(now, last_active)
+
+
+class TestCurrentProjects(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_profile(User(username='currentuser',
+            email='current@mozillafoundation.org'))
+        self.project = Project(name='Current Project',
+            short_description='This project is awesome',
+            long_description='No really, its good')
+        self.project.save()
+        Relationship(source=self.user, target_project=self.project).save()
+
+    def test_roles_follow_membership_changes(self):
+        current = self.user.get_current_projects()
+        self.assertEqual(['current-project'],
+            [project['id'] for project in current['following']])
+        self.assertEqual([], current['organizing'])
+        participation = Participation(user=self.user, project=self.project,
+            organizing=True)
+        participation.save()
+        current = self.user.get_current_projects()
+        self.assertEqual(['current-project'],
+            [project['id'] for project in current['organizing']])
+        self.assertEqual([], current['following'])
+        self.assertEqual(1, current['count'])
+
+    def test_current_projects_are_cached(self):
+        self.user.get_current_projects()
+        self.assertNumQueries(0, self.user.get_current_projects)
+
+    def test_past_projects_organizer_flag(self):
+        now = datetime.datetime.now()
+        Participation(user=self.user, project=self.project,
+            left_on=now).save()
+        Participation(user=self.user, project=self.project,
+            organizing=True, left_on=now).save()
+        past = self.user.get_past_projects()
+        self.assertEqual(1, len(past))
+        self.assertEqual('Current Project', past[0]['title'])
+        self.assertTrue(past[0]['organizer'])
+
+
+class TestFollows(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_profile(User(username='follower',
+            email='follower@mozillafoundation.org'))
+        self.followed = create_profile(User(username='followed',
+            email='followed@mozillafoundation.org'))
+        self.followed.full_name = 'Ada Lovelace'
+        self.followed.save()
+        Relationship(source=self.user, target_user=self.followed).save()
+
+    def test_is_following(self):
+        self.assertTrue(self.user.is_following(self.followed))
+        # Auth users never match, see Activity.can_comment.
+        self.assertFalse(self.user.is_following(self.followed.user))
+        self.assertFalse(self.followed.is_following(self.user))
+        self.assertEqual([self.user.id], self.followed.get_follower_ids())
+
+    def test_match_following(self):
+        self.assertEqual(['followed'],
+            follows.match_following(self.user.id, 'FOLL'))
+        self.assertEqual(['followed'],
+            follows.match_following(self.user.id, 'ada'))
+        self.assertEqual([], follows.match_following(self.user.id, 'love'))
+        self.assertNumQueries(0, follows.match_following, self.user.id, 'a')
+
+    def test_unfollow_updates_lists(self):
+        relationship = Relationship.objects.get(source=self.user,
+            target_user=self.followed)
+        relationship.deleted = True
+        relationship.save()
+        self.assertFalse(self.user.is_following(self.followed))
+        self.assertEqual([], self.user.following())
+
+
+class TestProfileExistMiddleware(TestCase):
+
+    def setUp(self):
+        self.middleware = ProfileExistMiddleware()
+        self.factory = RequestFactory()
+        self.profile = create_profile(User(username='withprofile',
+            email='withprofile@mozillafoundation.org'))
+        self.no_profile = User.objects.create(username='noprofile',
+            email='noprofile@mozillafoundation.org')
+
+    def get_request(self, user, path):
+        # Paths without the locale prefix, as LocaleURLRewriter leaves them.
+        request = self.factory.get(path)
+        request.user = user
+        return request
+
+    def test_user_without_profile_is_redirected(self):
+        request = self.get_request(self.no_profile, '/groups/')
+        response = self.middleware.process_request(request)
+        self.assertEqual(302, response.status_code)
+        # The missing profile is remembered too.
+        self.assertNumQueries(0, get_request_profile, request)
+
+    def test_allowed_paths(self):
+        for name in ProfileExistMiddleware.valid_url_names:
+            request = self.get_request(self.no_profile, django_reverse(name))
+            self.assertEqual(None, self.middleware.process_request(request))
+
+    def test_one_profile_lookup_per_request(self):
+        request = self.get_request(self.profile.user, '/groups/')
+        self.assertEqual(None, self.middleware.process_request(request))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.profile, get_request_profile(request))
+            self.assertEqual(self.profile, request.user.get_profile())
+            self.middleware.process_request(request)
@@ -39,6 +39,7 @@ from users.models import UserProfile, create_profile, ProfileTag
 from users.fields import UsernameField
 from users.decorators import anonymous_only, login_required, secure_required
 from users import drupal
+from users import follows
 
 
 log = logging.getLogger(__name__)
@@ -722,9 +723,7 @@ def check_username(request):
 @login_required
 def following(request):
     user = request.user.get_profile()
-    term = request.GET.get('term', '').lower()
-    usernames = [u.username for u in user.following()
-                 if term in u.username.lower() or
-                 term in u.full_name.lower()]
+    term = request.GET.get('term', '')
+    usernames = follows.match_following(user.id, term)
     return http.HttpResponse(simplejson.dumps(usernames),
                              mimetype='application/json')
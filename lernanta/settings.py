@@ -328,6 +328,9 @@ BOT_NAMES =['Googlebot', 'Slurp', 'Twiceler', 'msnbot',
     'Speedy Spider', 'DotBot', 'Sogou', 'YoudaoBot',
     'YandexBot', 'rogerbot']
 
+# Minimum number of minutes between two last_active updates for a user.
+LAST_ACTIVE_UPDATE_INTERVAL = 5
+
 HELP_URL = 'http://community.p2pu.org/t/user-support-help-p2pu-org/18'
 
 ##################################################################